@@ -0,0 +1,191 @@
+"""Simulation throughput benchmarks.
+
+Every case builds a market, simulates a number of days and records days per
+second and the peak memory of the process. Cases run one at a time in fresh
+processes so their memory use does not add up. Results are written as JSON
+and can be compared against a stored baseline::
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.1
+
+The second run exits with status 1 when any case got slower or used more
+memory than the threshold allows.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+HISTORIES = ("memory", "sqlite-memory", "sqlite-file")
+
+# Object agents get too slow to be worth timing beyond this
+POOL_FROM = 10000
+
+
+def _peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_case(agents, history, days, seed=0):
+    """Time one benchmark case in the current process and return its result."""
+    from economy import goods
+    from economy.market.history import MarketHistory, SQLiteHistory
+    from economy.market.market import Market
+
+    random.seed(seed)
+    pool = agents >= POOL_FROM
+    with tempfile.TemporaryDirectory() as directory:
+        if history == "memory":
+            backend = MarketHistory()
+        elif history == "sqlite-memory":
+            backend = SQLiteHistory(":memory:")
+        elif history == "sqlite-file":
+            backend = SQLiteHistory(os.path.join(directory, "bench.db"))
+        else:
+            raise ValueError("Unknown history backend {!r}".format(history))
+
+        baseline = _peak_memory_mb()
+        try:
+            market = Market(num_agents=agents, history=backend, pool=pool)
+            start = time.perf_counter()
+            market.simulate(days)
+            backend.flush()
+            seconds = time.perf_counter() - start
+        finally:
+            backend.close()
+
+    peak = _peak_memory_mb()
+    return {
+        "name": case_name(agents, history),
+        "agents": agents,
+        "goods": goods.count(),
+        "history": history,
+        "pool": pool,
+        "days": days,
+        "seconds": seconds,
+        "days_per_second": days / seconds,
+        "peak_memory_mb": peak,
+        "memory_growth_mb": peak - baseline,
+    }
+
+
+def _quiet_logging():
+    # Keep the simulation's own logging out of the timings
+    logging.getLogger("economy").setLevel(logging.ERROR)
+
+
+def case_name(agents, history):
+    return "agents={},history={}".format(agents, history)
+
+
+def run_suite(agent_counts, histories, days, seed=0):
+    """Run every combination of agent count and history backend.
+
+    Each case runs in a freshly spawned process.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for agents, history in itertools.product(agent_counts, histories):
+        with concurrent.futures.ProcessPoolExecutor(
+            1, mp_context=context, initializer=_quiet_logging
+        ) as executor:
+            result = executor.submit(run_case, agents, history, days, seed).result()
+        logger.info(
+            "%s: %.1f days/s, %.0f MB peak",
+            result["name"],
+            result["days_per_second"],
+            result["peak_memory_mb"],
+        )
+        results.append(result)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    """Return the regressions of ``report`` against ``baseline``.
+
+    A case regresses when its days per second dropped, or its peak memory
+    grew, by more than ``threshold`` (a fraction). Cases missing from either
+    side are ignored.
+    """
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        speed = result["days_per_second"] / old["days_per_second"] - 1
+        memory = result["peak_memory_mb"] / old["peak_memory_mb"] - 1
+        if speed < -threshold:
+            regressions.append("{}: {:.1%} slower".format(result["name"], -speed))
+        if memory > threshold:
+            regressions.append("{}: {:.1%} more memory".format(result["name"], memory))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulation throughput")
+    parser.add_argument(
+        "--agents",
+        type=int,
+        nargs="+",
+        default=[10, 1000, 100000],
+        help="Agent counts to run; from %s up agents are pooled" % POOL_FROM,
+    )
+    parser.add_argument(
+        "--history",
+        choices=HISTORIES,
+        nargs="+",
+        default=list(HISTORIES),
+        help="History backends to run (default: all)",
+    )
+    parser.add_argument("--days", type=int, default=10, help="Days per case")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for every case")
+    parser.add_argument(
+        "--output", default="benchmark.json", help="JSON file for the results"
+    )
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown or memory growth (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    report = run_suite(args.agents, args.history, args.days, args.seed)
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    logger.info("Wrote %s cases to %s.", len(report["results"]), args.output)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(report, json.load(fh), args.threshold)
+        for regression in regressions:
+            logger.error("Regression: %s", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,3 +5,9 @@ INITIAL_INVENTORY = int(os.environ.get("STAR_TRADER_INITIAL_INV", "10"))
 INITIAL_MONEY = int(os.environ.get("STAR_TRADER_INITIAL_MONEY", "100"))
 INVENTORY_SIZE = int(os.environ.get("STAR_TRADER_INVENTORY_SIZE", "15"))
 DAILY_TAX = int(os.environ.get("STAR_TRADER_DAILY_TAX", "1"))
+HISTORY_FIDELITY = os.environ.get("STAR_TRADER_HISTORY_FIDELITY", "full")
+DB_SYNCHRONOUS = os.environ.get("STAR_TRADER_DB_SYNCHRONOUS")
+DB_JOURNAL_MODE = os.environ.get("STAR_TRADER_DB_JOURNAL_MODE")
+CHECKPOINT_EVERY = int(os.environ.get("STAR_TRADER_CHECKPOINT_EVERY", "10"))
+TASK_WORKERS = int(os.environ.get("STAR_TRADER_TASK_WORKERS", "2"))
+TASK_MAX_SECONDS = float(os.environ.get("STAR_TRADER_TASK_MAX_SECONDS", "600"))
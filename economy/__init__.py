@@ -11,7 +11,7 @@ else:
 
 # try:
 from .market import Market
-from .db import rebuild_database
+from .catalog import rebuild_database
 
 # except Exception:
 #     # Importing Market pulls in optional dependencies such as PyYAML
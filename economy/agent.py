@@ -1,10 +1,12 @@
+import bisect
+import math
 import random
 import logging
 
 from .beliefs import Beliefs
 from .offer import Ask, Bid, MIN_PRICE
 from .inventory import Inventory
-from .names import FIRST_NAMES, LAST_NAMES
+from .names import random_name
 from config import (
     INVENTORY_SIZE as DEFAULT_INVENTORY_SIZE,
     INITIAL_INVENTORY,
@@ -15,19 +17,24 @@ logger = logging.getLogger(__name__)
 
 
 def dump_agent(agent):
+    """Log an agent's job, inventory and money at debug level.
+
+    Use a :class:`~economy.trace.TraceRecorder` to capture agent state in
+    bulk; this is only meant for looking at individual agents.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
     inv = ""
-    for item in agent._inventory._items:
-        inv += ",{item},{qty}".format(
-            item=item,
-            qty=agent._inventory.query_inventory(item),
-        )
+    for item, qty in agent._inventory.items().items():
+        inv += ",{item},{qty}".format(item=item, qty=qty)
 
     logger.debug(
         "{agent},{job}{inv},{money}¤".format(
-            agent=agent._name,
+            agent=agent.name,
             job=agent.job,
             inv=inv,
-            money=agent._money,
+            money=agent.money,
         )
     )
 
@@ -43,6 +50,7 @@ class Agent(object):
     _initial_money = 0
     _trade_stats = None
     _age = 0
+    _random = random
     beliefs = None
 
     def __init__(
@@ -53,12 +61,16 @@ class Agent(object):
         self._money = initial_money
         self._money_last_round = initial_money
         self._initial_money = initial_money
-        self._name = f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
+        # Draw from the market's generator so runs do not depend on who
+        # else uses the random module
+        self._random = getattr(market, "random", random)
+        self._name = random_name(self._random)
 
         self._trade_stats = {}
         self._age = 0
 
-        self.beliefs = Beliefs()
+        # Share the market's belief matrix so beliefs can be updated in bulk
+        self.beliefs = Beliefs(getattr(market, "belief_matrix", None))
 
         # Initialize inventory
         self._inventory = Inventory(self.INVENTORY_SIZE)
@@ -105,22 +117,73 @@ class Agent(object):
         return self._money <= 0
 
     def do_production(self):
-        for run in self._recipe.runs:
-            if not self._can_produce():
-                return
+        if not self._can_produce():
+            return
+
+        # Work out how many runs the recipe limit and our inputs allow
+        runs = math.inf if self._recipe.limit is None else self._recipe.limit
+        for step in self._recipe.inputs:
+            runs = min(runs, self._inventory.query_inventory(step.good) // step.qty)
 
-            for step in self._recipe.inputs:
-                # Deduct any required input
-                self._inventory.remove_item(step.good, step.qty)
+        # Draw the runs at which each tool breaks; we stop after the run that
+        # leaves us short of a tool
+        schedules = []
+        for tool in self._recipe.tools:
+            spare = self._inventory.query_inventory(tool.tool) - tool.qty
+            schedule = self._break_schedule(tool.break_chance, spare + 1, self._random)
+            schedules.append(schedule)
+            if len(schedule) > spare:
+                runs = min(runs, schedule[spare])
+
+        growth = sum(step.qty for step in self._recipe.outputs) - sum(
+            step.qty for step in self._recipe.inputs
+        )
+        if growth > 0:
+            # Each run needs room for its output; a broken tool frees up room
+            # for the runs after it
+            space = self._inventory.available_space()
+            room = space // growth
+            freed = 0
+            for run in sorted(run for schedule in schedules for run in schedule):
+                if run > room:
+                    break
+                freed += 1
+                room = (space + freed) // growth
+            runs = min(runs, room)
+
+        if runs == math.inf:
+            raise ValueError("{} has nothing to stop its production".format(self.job))
 
-            for step in self._recipe.outputs:
-                # Add any output
-                self._inventory.add_item(step.good, step.qty)
+        for step in self._recipe.inputs:
+            # Deduct any required input
+            self._inventory.remove_item(step.good, step.qty * runs)
 
-            for tool in self._recipe.tools:
-                # Check for tool breakage
-                if random.random() < tool.break_chance:
-                    self._inventory.remove_item(tool.tool, 1)
+        for tool, schedule in zip(self._recipe.tools, schedules):
+            # Remove any tools that broke
+            broken = bisect.bisect_right(schedule, runs)
+            if broken:
+                self._inventory.remove_item(tool.tool, broken)
+
+        for step in self._recipe.outputs:
+            # Add any output
+            self._inventory.add_item(step.good, step.qty * runs)
+
+    @staticmethod
+    def _break_schedule(chance, count, rng=random):
+        """Return the runs at which a tool breaks for the first ``count`` times."""
+        if chance <= 0:
+            return []
+        if chance >= 1:
+            return list(range(1, count + 1))
+
+        schedule = []
+        run = 0
+        keep = math.log(1 - chance)
+        for _ in range(count):
+            # The number of runs until the next break is geometric
+            run += 1 + int(math.log(1 - rng.random()) / keep)
+            schedule.append(run)
+        return schedule
 
     def make_offers(self):
         # From an Agent's perspective, making offers is the start of a round
@@ -167,6 +230,14 @@ class Agent(object):
                     self,
                 )
 
+    def holding(self, good):
+        """Return how many units of ``good`` the agent currently holds."""
+        return self._inventory.query_inventory(good)
+
+    def free_space(self):
+        """Return how many more units fit in the agent's inventory."""
+        return self._inventory.available_space()
+
     def give_money(self, amt, other):
         self._money -= amt
         other._money += amt
@@ -187,6 +258,20 @@ class Agent(object):
         stats = self._trade_stats.setdefault(good, {"bought": 0, "sold": 0})
         stats["sold"] += qty
 
+    def settle_trades(self, money, bought, sold):
+        """Apply a day's worth of netted trades in one go.
+
+        ``bought`` and ``sold`` map goods to units. Goods sold leave the
+        inventory before goods bought arrive.
+        """
+        self._money += money
+        for good, qty in sold.items():
+            self._inventory.remove_item(good, qty)
+            self.record_sale(good, qty)
+        for good, qty in bought.items():
+            self._inventory.add_item(good, qty)
+            self.record_purchase(good, qty)
+
     @property
     def trade_stats(self):
         return self._trade_stats
@@ -202,6 +287,33 @@ class Agent(object):
         """Increment the agent's age by one day."""
         self._age += 1
 
+    def restore(
+        self,
+        name,
+        money,
+        money_last_round,
+        initial_money,
+        age,
+        holdings,
+        trade_stats,
+        beliefs,
+    ):
+        """Overwrite the agent's state, e.g. when loading a market snapshot.
+
+        ``holdings`` maps items to quantities and replaces the inventory.
+        """
+        self._name = name
+        self._money = money
+        self._money_last_round = money_last_round
+        self._initial_money = initial_money
+        self._age = age
+        self._trade_stats = trade_stats
+        self.beliefs = beliefs
+
+        self._inventory = Inventory(self.INVENTORY_SIZE)
+        for item, qty in holdings.items():
+            self._inventory.set_qty(item, qty)
+
     def _determine_trade_quantity(self, good, base_qty, buying=False, default=0.75):
         if base_qty <= 0:
             return 0
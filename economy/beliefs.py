@@ -1,12 +1,227 @@
 import random
 
+import numpy as np
 
+from . import goods
 from .offer import MIN_PRICE
 
 
+class BeliefMatrix(object):
+    """Shared agents x goods store of price beliefs and confidences.
+
+    Each agent owns a row and each good a column. Like :class:`Beliefs`,
+    cells start out unknown and are given a random belief and confidence the
+    first time they are read. Rows of agents that have left the market can
+    be released and are reused for newcomers.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows in use from the start.
+    capacity : int
+        Number of rows allocated up front; the arrays double in size
+        whenever they fill up.
+    source : random.Random, optional
+        Generator that seeds the matrix's own generator and serves the
+        prices agents pick one at a time. Defaults to the random module.
+    """
+
+    def __init__(self, rows=0, capacity=16, source=None):
+        self._columns = {}
+        self._goods = []
+        for good in goods.all():
+            self._columns[good] = len(self._goods)
+            self._goods.append(good)
+
+        capacity = max(rows, capacity, 1)
+        shape = (capacity, len(self._goods))
+        self.belief = np.zeros(shape, dtype=np.float64)
+        self.confidence = np.zeros(shape, dtype=np.float64)
+        self.known = np.zeros(shape, dtype=bool)
+        self._size = rows
+        self._free = []
+        self.random = random if source is None else source
+        self._rng = np.random.default_rng(self.random.getrandbits(64))
+
+    def __len__(self):
+        return self._size
+
+    def column(self, good):
+        """Return the column of ``good``, adding one for unknown goods."""
+        try:
+            return self._columns[good]
+        except KeyError:
+            pass
+
+        col = self._columns[good] = len(self._goods)
+        self._goods.append(good)
+        pad = ((0, 0), (0, 1))
+        self.belief = np.pad(self.belief, pad)
+        self.confidence = np.pad(self.confidence, pad)
+        self.known = np.pad(self.known, pad)
+        return col
+
+    def add_row(self):
+        """Allocate a row for a new agent and return its index."""
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._size
+            self._size += 1
+            if row == len(self.belief):
+                extra = ((0, len(self.belief)), (0, 0))
+                self.belief = np.pad(self.belief, extra)
+                self.confidence = np.pad(self.confidence, extra)
+                self.known = np.pad(self.known, extra)
+        self.known[row] = False
+        return row
+
+    def release(self, row):
+        """Hand ``row`` back for reuse by a future agent."""
+        self._free.append(row)
+
+    def get_state(self):
+        """Return the contents of the matrix as arrays and plain values."""
+        n = self._size
+        return {
+            "goods": [str(good) for good in self._goods],
+            "belief": self.belief[:n],
+            "confidence": self.confidence[:n],
+            "known": self.known[:n],
+            "free": np.array(self._free, dtype=np.int64),
+            "rng": self._rng.bit_generator.state,
+        }
+
+    def set_state(self, state):
+        """Replace the contents of the matrix with a :meth:`get_state` result."""
+        self._columns = {}
+        self._goods = []
+        for name in state["goods"]:
+            self._columns[goods.by_name(name)] = len(self._goods)
+            self._goods.append(goods.by_name(name))
+
+        n = len(state["belief"])
+        shape = (max(n, 16), len(self._goods))
+        self.belief = np.zeros(shape, dtype=np.float64)
+        self.confidence = np.zeros(shape, dtype=np.float64)
+        self.known = np.zeros(shape, dtype=bool)
+        self.belief[:n] = state["belief"]
+        self.confidence[:n] = state["confidence"]
+        self.known[:n] = state["known"]
+        self._size = n
+        self._free = state["free"].tolist()
+        self._rng.bit_generator.state = state["rng"]
+
+    def reset(self, rows):
+        """Forget everything the agents in ``rows`` believe."""
+        self.known[rows] = False
+
+    def get(self, row, good):
+        """Return ``[belief, confidence]`` for a single cell."""
+        col = self.column(good)
+        if not self.known[row, col]:
+            # Same draws as _ensure_known, whichever path reads the cell first
+            belief = self._rng.integers(10, 21)
+            confidence = self._rng.integers(5, 11)
+            self.set(row, good, belief, confidence)
+        return [int(self.belief[row, col]), int(self.confidence[row, col])]
+
+    def set(self, row, good, belief, confidence):
+        col = self.column(good)
+        self.belief[row, col] = belief
+        self.confidence[row, col] = confidence
+        self.known[row, col] = True
+
+    def _ensure_known(self, rows, cols):
+        unknown = ~self.known[rows, cols]
+        if unknown.any():
+            rows, cols = rows[unknown], cols[unknown]
+            self.belief[rows, cols] = self._rng.integers(10, 21, size=len(rows))
+            self.confidence[rows, cols] = self._rng.integers(5, 11, size=len(rows))
+            self.known[rows, cols] = True
+
+    def choose_prices(self, rows, cols):
+        """Pick a price for every ``(row, col)`` pair, as ``choose_price`` does.
+
+        ``cols`` may be a single column shared by all rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.broadcast_to(np.asarray(cols, dtype=np.int64), rows.shape)
+        self._ensure_known(rows, cols)
+
+        belief = self.belief[rows, cols]
+        confidence = self.confidence[rows, cols]
+        factor = self._rng.random(len(rows)) * 2 - 1
+        return np.rint(belief + confidence * factor).astype(np.int64)
+
+    def update(self, rows, col, prices, successful=True):
+        """Apply ``Beliefs.update`` to column ``col`` for every row in order.
+
+        ``prices`` and ``successful`` may be scalars or per-row arrays. A row
+        may appear several times; its updates are applied one round at a
+        time so each sees the result of the previous one.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        n = len(rows)
+        if not n:
+            return
+        prices = np.broadcast_to(np.asarray(prices, dtype=np.float64), rows.shape)
+        successful = np.broadcast_to(np.asarray(successful, dtype=bool), rows.shape)
+        self._ensure_known(rows, np.full(n, col))
+
+        # Rank every occurrence of a row so round r holds its r-th update
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        first = np.r_[True, sorted_rows[1:] != sorted_rows[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n) - group_start
+
+        for r in range(int(rank.max()) + 1):
+            chosen = rank == r
+            cells = rows[chosen]
+            success = successful[chosen]
+            belief = self.belief[cells, col]
+            confidence = self.confidence[cells, col]
+
+            # A successful trade means we're more confident now in our
+            # beliefs; a failed one shifts our belief and shakes confidence
+            belief = np.where(success, belief, (belief + prices[chosen]) / 2)
+            confidence = np.where(success, confidence * 0.9, confidence / 0.9)
+
+            # Ensure our beliefs won't result in too-low prices
+            low = belief - confidence < MIN_PRICE
+            top = belief + confidence
+            belief = np.where(low, (top + MIN_PRICE) / 2, belief)
+            confidence = np.where(low, top - belief, confidence)
+
+            self.belief[cells, col] = np.rint(belief)
+            self.confidence[cells, col] = np.rint(confidence)
+
+
 class Beliefs(object):
-    def __init__(self):
-        self._beliefs = {}
+    """One agent's price beliefs, stored as a row of a :class:`BeliefMatrix`.
+
+    Without a ``matrix`` the beliefs get a private single-row matrix.
+    """
+
+    def __init__(self, matrix=None, row=None):
+        if matrix is None:
+            matrix = BeliefMatrix(capacity=1)
+        self._matrix = matrix
+        self._row = matrix.add_row() if row is None else row
+
+    @property
+    def matrix(self):
+        return self._matrix
+
+    @property
+    def row(self):
+        return self._row
+
+    def release(self):
+        """Give this agent's row back to the matrix."""
+        self._matrix.release(self._row)
 
     def choose_price(self, good):
         belief, confidence = self.get_belief(good)
@@ -14,15 +229,7 @@ class Beliefs(object):
         return round(belief + confidence * self.interval_factor())
 
     def get_belief(self, good):
-        try:
-            return self._beliefs[good]
-        except KeyError:
-            belief = random.randint(10, 20)
-            confidence = random.randint(5, 10)
-
-            self._beliefs[good] = [belief, confidence]
-
-            return [belief, confidence]
+        return self._matrix.get(self._row, good)
 
     def update(self, good, clearing_price, successful=True):
         belief, confidence = self.get_belief(good)
@@ -45,7 +252,7 @@ class Beliefs(object):
             # And now fix our confidence so the top of our range doesn't move
             confidence = top - belief
 
-        self._beliefs[good] = [round(belief), round(confidence)]
+        self._matrix.set(self._row, good, round(belief), round(confidence))
 
     def interval_factor(self):
-        return random.random() * 2 - 1
+        return self._matrix.random.random() * 2 - 1
@@ -0,0 +1,284 @@
+"""Lazy loading of the goods, jobs and names catalog.
+
+Nothing is read when :mod:`economy` is imported. The first call to
+``goods.all()``, ``jobs.by_name()`` and friends loads the whole catalog. The
+catalog comes from a compiled snapshot file kept next to the database when
+one matches the current database and YAML files. Otherwise it is loaded from
+the database with one bulk query per table and written back to the snapshot.
+SQLAlchemy and PyYAML are only imported in that second case.
+
+Loading is guarded by a lock, so threads (GUI requests, background tasks)
+that ask for the catalog while another one loads it wait until it is
+complete.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from pathlib import Path
+
+from config import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+_YAML_FILES = ("goods.yml", "jobs.yml", "names.yml")
+_TABLES = ("goods", "jobs", "job_inputs", "job_outputs", "job_tools")
+
+_loaded = False
+_installing = False
+_lock = threading.RLock()
+_names = None
+
+
+def load():
+    """Load the catalog if that has not happened yet."""
+    if _loaded:
+        return
+    with _lock:
+        # Creating jobs looks goods up again from within _install
+        if _loaded or _installing:
+            return
+        db_path = _database_path()
+        fingerprint = _fingerprint(db_path)
+        catalog = _read_snapshot(db_path, fingerprint)
+        if catalog is None:
+            catalog = _build()
+            _write_snapshot(db_path, catalog)
+        _install(catalog)
+
+
+def reload():
+    """Forget the loaded catalog and load it again from the database."""
+    global _loaded
+    from . import goods, jobs
+
+    with _lock:
+        _loaded = False
+        goods._goods.clear()
+        goods._by_name.clear()
+        jobs._jobs.clear()
+        jobs._by_name.clear()
+        jobs._consumers.clear()
+        jobs._producers.clear()
+
+        catalog = _build()
+        _write_snapshot(_database_path(), catalog)
+        _install(catalog)
+
+
+def names():
+    """Return ``{"first_names": [...], "last_names": [...]}``."""
+    load()
+    return _names
+
+
+def rebuild_database():
+    """Recreate goods and jobs tables from YAML files."""
+    from . import db
+
+    db.rebuild_database()
+
+
+def _database_path():
+    # Follow the engine if economy.db has been imported (and possibly
+    # rebound to a Flask app's database)
+    db = sys.modules.get("economy.db")
+    if db is not None:
+        return db.engine.url.database
+    return DB_PATH
+
+
+def _snapshot_path(db_path):
+    if not db_path or db_path == ":memory:":
+        return None
+    return Path(str(db_path) + ".catalog")
+
+
+def _fingerprint(db_path):
+    """Describe the YAML files and catalog tables the snapshot was built from.
+
+    Returns ``None`` when the database still has to be created or seeded.
+    """
+    parts = [SNAPSHOT_VERSION]
+    for filename in _YAML_FILES:
+        stat = os.stat(os.path.join("data", filename))
+        parts.append((filename, stat.st_mtime_ns, stat.st_size))
+
+    path = Path(db_path)
+    if not path.exists():
+        return None
+
+    digest = hashlib.sha1()
+    try:
+        conn = sqlite3.connect(path.resolve().as_uri() + "?mode=ro", uri=True)
+        with closing(conn):
+            for table in _TABLES:
+                rows = conn.execute(
+                    "SELECT * FROM {} ORDER BY rowid".format(table)
+                ).fetchall()
+                if not rows and table in ("goods", "jobs"):
+                    return None
+                digest.update(repr(rows).encode())
+    except sqlite3.Error:
+        return None
+
+    parts.append(digest.hexdigest())
+    return tuple(parts)
+
+
+def _read_snapshot(db_path, fingerprint):
+    path = _snapshot_path(db_path)
+    if fingerprint is None or path is None:
+        return None
+    try:
+        with open(path, "rb") as fh:
+            catalog = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if catalog.get("fingerprint") != fingerprint:
+        return None
+    return catalog
+
+
+def _write_snapshot(db_path, catalog):
+    path = _snapshot_path(db_path)
+    if path is None:
+        return
+    catalog["fingerprint"] = _fingerprint(db_path)
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp, "wb") as fh:
+            pickle.dump(catalog, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError as exc:
+        logger.debug("Could not write catalog snapshot %s: %s", path, exc)
+
+
+def _build():
+    """Read the catalog from the database, seeding it from YAML if needed."""
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+
+    from . import db
+    from .utils import load_yaml_file, seed_if_empty
+
+    db.Base.metadata.create_all(bind=db.engine)
+    try:
+        with db.session_scope() as session:
+            goods_rows = seed_if_empty(
+                session,
+                select(db.GoodsTable.name, db.GoodsTable.size),
+                "goods.yml",
+                _seed_goods,
+            )
+            job_rows = seed_if_empty(
+                session,
+                select(db.JobsTable.name, db.JobsTable.job_limit),
+                "jobs.yml",
+                _seed_jobs,
+            )
+
+            # One query per table rather than per job
+            steps = {name: ([], [], []) for name, _ in job_rows}
+            for slot, query in enumerate(
+                (
+                    select(db.JobInput.job, db.JobInput.good, db.JobInput.qty),
+                    select(db.JobOutput.job, db.JobOutput.good, db.JobOutput.qty),
+                    select(
+                        db.JobTool.job,
+                        db.JobTool.tool,
+                        db.JobTool.qty,
+                        db.JobTool.break_chance,
+                    ),
+                )
+            ):
+                for job, *step in session.execute(query).all():
+                    if job in steps:
+                        steps[job][slot].append(tuple(step))
+    except OperationalError as exc:
+        if "no such column" not in str(exc):
+            raise
+        # Detected an outdated schema - recreate the tables and try again
+        db.Base.metadata.drop_all(bind=db.engine)
+        return _build()
+
+    name_lists = load_yaml_file("names.yml")
+    return {
+        "version": SNAPSHOT_VERSION,
+        "goods": [tuple(row) for row in goods_rows],
+        "jobs": [(name, limit) + steps[name] for name, limit in job_rows],
+        "names": {
+            "first_names": name_lists.get("first_names", []),
+            "last_names": name_lists.get("last_names", []),
+        },
+    }
+
+
+def _seed_goods(session, data):
+    from . import db
+
+    session.add_all([db.GoodsTable(name=g["name"], size=g["size"]) for g in data])
+
+
+def _seed_jobs(session, data):
+    from . import db
+
+    for job in data:
+        session.add(db.JobsTable(name=job["name"], job_limit=job.get("limit")))
+        for step in job.get("inputs", []):
+            session.add(
+                db.JobInput(job=job["name"], good=step["good"], qty=step["qty"])
+            )
+        for step in job.get("outputs", []):
+            session.add(
+                db.JobOutput(job=job["name"], good=step["good"], qty=step["qty"])
+            )
+        for tool in job.get("tools", []):
+            session.add(
+                db.JobTool(
+                    job=job["name"],
+                    tool=tool["tool"],
+                    qty=tool["qty"],
+                    break_chance=tool["break_chance"],
+                )
+            )
+
+
+def _install(catalog):
+    """Register the goods and jobs of ``catalog``; call with the lock held.
+
+    The catalog only counts as loaded once everything is in place.
+    """
+    global _installing, _loaded, _names
+    from .goods import Good
+    from .jobs import Job
+
+    _installing = True
+    try:
+        for name, size in catalog["goods"]:
+            Good(name=name, size=size)
+
+        for name, limit, inputs, outputs, tools in catalog["jobs"]:
+            Job(
+                name=name,
+                inputs=[{"good": good, "qty": qty} for good, qty in inputs],
+                outputs=[{"good": good, "qty": qty} for good, qty in outputs],
+                tools=[
+                    {"tool": tool, "qty": qty, "break_chance": chance}
+                    for tool, qty, chance in tools
+                ],
+                limit=limit,
+            )
+    finally:
+        _installing = False
+
+    _names = catalog["names"]
+    _loaded = True
@@ -53,12 +53,6 @@ def rebuild_database():
     Base.metadata.create_all(bind=engine)
 
     # Clear any cached data and reload from YAML
-    from . import goods as goods_mod, jobs as jobs_mod
+    from . import catalog
 
-    goods_mod._goods.clear()
-    goods_mod._by_name.clear()
-    jobs_mod._jobs.clear()
-    jobs_mod._by_name.clear()
-
-    goods_mod._load_goods()
-    jobs_mod._load_jobs()
+    catalog.reload()
@@ -0,0 +1,228 @@
+"""Monte Carlo ensembles of independently seeded market runs.
+
+:func:`run_ensemble` runs the same market configuration many times with
+different seeds, spreading the runs over a process pool. Every run only
+sends back a small ``days x columns`` array of daily summaries (mean price
+and volume of every good, the number of active agents and the average
+lifespan so far), which is folded into an :class:`Ensemble` as soon as it
+arrives.
+"""
+
+import concurrent.futures
+import logging
+import os
+import random
+import warnings
+
+import numpy as np
+
+from . import goods
+from .market.history import MarketHistory
+
+logger = logging.getLogger(__name__)
+
+
+def summary_columns():
+    """Return the names of the columns of a replicate's daily summary."""
+    names = [str(good) for good in goods.all()]
+    return (
+        ["{}.price".format(name) for name in names]
+        + ["{}.volume".format(name) for name in names]
+        + ["agents", "average_lifespan"]
+    )
+
+
+def run_replicate(seed, days, market_kwargs=None):
+    """Simulate one seeded market and return its daily summaries.
+
+    The global ``random`` state is restored afterwards, so replicates can
+    also be run in the calling process.
+    """
+    from .market.market import Market
+
+    saved = random.getstate()
+    random.seed(seed)
+    try:
+        kwargs = dict(market_kwargs or {})
+        kwargs.setdefault("history", MarketHistory())
+        market = Market(**kwargs)
+
+        count = goods.count()
+        summary = np.empty((days, 2 * count + 2))
+        for day in range(days):
+            market.simulate(1)
+            latest = np.array([view.array[-1] for view in market.history(1).values()])
+            overview = market.overview_stats()
+            summary[day, :count] = latest[:, 3]
+            summary[day, count : 2 * count] = np.nan_to_num(latest[:, 0])
+            summary[day, -2] = overview["active_agents"]
+            summary[day, -1] = overview["average_lifespan"]
+    finally:
+        random.setstate(saved)
+    return summary
+
+
+class Ensemble(object):
+    """Running statistics over the daily summaries of many replicates.
+
+    Means are updated incrementally and percentiles are taken from a
+    reservoir sample of at most ``reservoir`` replicates, so memory does not
+    grow with the number of replicates. Percentiles are exact as long as no
+    more than ``reservoir`` replicates have been added. Days on which a good
+    did not trade (NaN price) are left out of that good's statistics.
+
+    Parameters
+    ----------
+    days : int
+        Number of days in every replicate.
+    columns : list of str
+        Names of the summary columns.
+    percentiles : sequence of float
+        Percentiles to report, between 0 and 100.
+    reservoir : int
+        Maximum number of replicates kept for percentile estimates.
+    seed : int, optional
+        Seed for the reservoir sampling.
+    """
+
+    def __init__(
+        self, days, columns, percentiles=(5, 50, 95), reservoir=1000, seed=None
+    ):
+        if reservoir < 1:
+            raise ValueError("The reservoir must hold at least one replicate")
+        self.days = days
+        self.columns = list(columns)
+        self.percentile_levels = tuple(percentiles)
+        self._count = 0
+        self._samples = np.zeros((days, len(self.columns)), dtype=np.int64)
+        self._mean = np.zeros((days, len(self.columns)))
+        self._reservoir = np.empty((reservoir, days, len(self.columns)))
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def count(self):
+        """Number of replicates added so far."""
+        return self._count
+
+    def add(self, summary):
+        """Fold one replicate's ``days x columns`` summary into the ensemble."""
+        summary = np.asarray(summary, dtype=np.float64)
+        if summary.shape != self._mean.shape:
+            raise ValueError(
+                "Expected a summary of shape {}, got {}".format(
+                    self._mean.shape, summary.shape
+                )
+            )
+
+        # Per-cell running mean that skips missing values
+        present = ~np.isnan(summary)
+        self._samples += present
+        delta = np.where(present, summary - self._mean, 0.0)
+        self._mean += delta / np.maximum(self._samples, 1)
+
+        # Reservoir sampling (algorithm R)
+        size = len(self._reservoir)
+        if self._count < size:
+            self._reservoir[self._count] = summary
+        else:
+            slot = self._rng.integers(self._count + 1)
+            if slot < size:
+                self._reservoir[slot] = summary
+        self._count += 1
+
+    def mean(self):
+        """Return the ``days x columns`` mean, NaN where nothing was seen."""
+        return np.where(self._samples > 0, self._mean, np.nan)
+
+    def percentiles(self):
+        """Return ``{percentile: days x columns array}``."""
+        if not self._count:
+            raise ValueError("The ensemble is empty")
+        sample = self._reservoir[: min(self._count, len(self._reservoir))]
+        with warnings.catch_warnings():
+            # Goods that never traded on a day have no percentiles
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return {
+                level: np.nanpercentile(sample, level, axis=0)
+                for level in self.percentile_levels
+            }
+
+    def to_dict(self):
+        """Return the statistics as plain lists, e.g. for JSON output."""
+
+        def plain(array):
+            return [[None if v != v else v for v in row] for row in array.tolist()]
+
+        return {
+            "replicates": self._count,
+            "days": self.days,
+            "columns": self.columns,
+            "mean": plain(self.mean()),
+            "percentiles": {
+                str(level): plain(values)
+                for level, values in self.percentiles().items()
+            },
+        }
+
+
+def run_ensemble(
+    replicates,
+    days,
+    seed=0,
+    workers=None,
+    percentiles=(5, 50, 95),
+    reservoir=1000,
+    **market_kwargs
+):
+    """Run ``replicates`` seeded markets and aggregate their daily summaries.
+
+    Replicate ``i`` is seeded with ``seed + i``, so an ensemble is
+    reproducible whatever the number of workers, apart from which
+    replicates end up in the percentile reservoir once it is full.
+
+    Parameters
+    ----------
+    replicates : int
+        Number of markets to run.
+    days : int
+        Number of days to simulate in each market.
+    seed : int
+        Seed of the first replicate.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs; ``0``
+        runs every replicate in the calling process.
+    percentiles, reservoir
+        Passed on to :class:`Ensemble`.
+    **market_kwargs
+        Passed on to :class:`Market`, e.g. ``num_agents`` or ``pool``.
+    """
+    ensemble = Ensemble(
+        days, summary_columns(), percentiles, reservoir=reservoir, seed=seed
+    )
+    seeds = range(seed, seed + replicates)
+
+    if workers == 0:
+        for replicate_seed in seeds:
+            ensemble.add(run_replicate(replicate_seed, days, market_kwargs))
+        return ensemble
+
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        # Keep only a few runs in flight so finished summaries never pile up
+        in_flight = 2 * workers
+        pending = set()
+        for replicate_seed in seeds:
+            if len(pending) >= in_flight:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    ensemble.add(future.result())
+            pending.add(
+                executor.submit(run_replicate, replicate_seed, days, market_kwargs)
+            )
+        for future in concurrent.futures.as_completed(pending):
+            ensemble.add(future.result())
+        logger.info("Ran %s replicates of %s days", ensemble.count, days)
+
+    return ensemble
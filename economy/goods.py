@@ -1,17 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, Iterator, List
 
-from sqlalchemy import select
-
-from . import db
-from .utils import seed_if_empty
-
-
+from . import catalog
 
 _by_name: Dict[str, "Good"] = {}
 
 
 def by_name(name: str) -> "Good":
+    catalog.load()
     return _by_name[name.lower()]
 
 
@@ -19,38 +15,32 @@ _goods: List["Good"] = []
 
 
 def all() -> Iterator["Good"]:
+    catalog.load()
     for good in _goods:
         yield good
 
 
+def by_id(good_id: int) -> "Good":
+    catalog.load()
+    return _goods[good_id]
+
+
+def count() -> int:
+    catalog.load()
+    return len(_goods)
+
+
 @dataclass(slots=True, frozen=True)
 class Good:
     name: str
     size: float
+    # Dense index into the catalog, used to address per-good arrays
+    id: int = field(init=False, compare=False, repr=False)
 
     def __post_init__(self) -> None:
+        object.__setattr__(self, "id", len(_goods))
         _by_name[self.name.lower()] = self
         _goods.append(self)
 
     def __str__(self):
         return self.name
-
-
-def _load_goods():
-    """Load goods from the database, populating tables from YAML if needed."""
-    db.Base.metadata.create_all(bind=db.engine, tables=[db.GoodsTable.__table__])
-    with db.session_scope() as session:
-        rows = seed_if_empty(
-            session,
-            select(db.GoodsTable.name, db.GoodsTable.size),
-            "goods.yml",
-            lambda s, data: s.add_all(
-                [db.GoodsTable(name=g["name"], size=g["size"]) for g in data]
-            ),
-        )
-
-        for name, size in rows:
-            Good(name=name, size=size)
-
-
-_load_goods()
@@ -1,31 +1,57 @@
+from . import goods
+
+
 class Inventory(object):
-    """Simple fixed-capacity inventory for agents."""
+    """Simple fixed-capacity inventory for agents.
+
+    Quantities of goods are kept in a list indexed by ``Good.id`` alongside a
+    running total, so every query and capacity check is O(1). Items that are
+    not goods are kept in a dictionary instead.
+    """
 
     def __init__(self, capacity):
         self._capacity = capacity
-        self._items = {}
+        self._total = 0
+        self._qty = [0] * goods.count()
+        self._other = {}
+
+    @property
+    def _items(self):
+        return self.items()
+
+    def items(self):
+        """Return a mapping of every item held to its quantity."""
+        items = {goods.by_id(i): qty for i, qty in enumerate(self._qty) if qty}
+        items.update(self._other)
+        return items
 
     def query_inventory(self, item=None):
         if item is None:
-            return sum(self._items.values())
-        else:
-            return self._items.get(item, 0)
+            return self._total
+        try:
+            return self._qty[item.id]
+        except AttributeError:
+            return self._other.get(item, 0)
+        except IndexError:
+            return 0
 
     def available_space(self):
-        return self._capacity - self.query_inventory()
+        return self._capacity - self._total
 
     def add_item(self, item, qty=1):
-        if self.query_inventory() + qty > self._capacity:
+        if self._total + qty > self._capacity:
             raise ValueError(
                 "Not enough room in inventory; have {inv_qty}, tried to add {qty}".format(
-                    inv_qty=self.query_inventory(),
+                    inv_qty=self._total,
                     qty=qty,
                 )
             )
-        if self.query_inventory(item) + qty < 0:
+        have = self.query_inventory(item)
+        if have + qty < 0:
             raise ValueError("Not enough items in inventory")
 
-        self._items[item] = self.query_inventory(item) + qty
+        self._store(item, have + qty)
+        self._total += qty
 
     def remove_item(self, item, qty=1):
         # Simply "add" the negative quantity
@@ -34,8 +60,22 @@ class Inventory(object):
     def set_qty(self, item, qty):
         old_qty = self.query_inventory(item)
         try:
-            self._items[item] = 0
+            self._store(item, 0)
+            self._total -= old_qty
             self.add_item(item, qty)
         except Exception:
-            self._items[item] = old_qty
+            self._store(item, old_qty)
+            self._total += old_qty
             raise
+
+    def _store(self, item, qty):
+        try:
+            slot = item.id
+        except AttributeError:
+            self._other[item] = qty
+            return
+
+        if slot >= len(self._qty):
+            # Goods added after this inventory was created
+            self._qty.extend([0] * (slot + 1 - len(self._qty)))
+        self._qty[slot] = qty
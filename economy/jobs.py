@@ -1,31 +1,41 @@
 from dataclasses import dataclass
 from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.exc import OperationalError
-
-from . import db
-from .utils import seed_if_empty
-
-
-from . import goods
-
+from . import catalog, goods
 
 _by_name: Dict[str, "Job"] = {}
 
 
 def by_name(name: str) -> "Job":
+    catalog.load()
     return _by_name[name.lower()]
 
 
 _jobs: List["Job"] = []
 
+# Jobs using or making each good, filled in as jobs are created
+_consumers: Dict[goods.Good, List["Job"]] = {}
+_producers: Dict[goods.Good, List["Job"]] = {}
+
 
 def all() -> Iterator["Job"]:
+    catalog.load()
     for job in _jobs:
         yield job
 
 
+def consumers(good: goods.Good) -> List["Job"]:
+    """Return the jobs that take ``good`` as an input."""
+    catalog.load()
+    return _consumers.get(good, [])
+
+
+def producers(good: goods.Good) -> List["Job"]:
+    """Return the jobs that have ``good`` as an output."""
+    catalog.load()
+    return _producers.get(good, [])
+
+
 @dataclass(slots=True)
 class JobStep:
     good: goods.Good
@@ -75,6 +85,11 @@ class Job(object):
         _by_name[name.lower()] = self
         _jobs.append(self)
 
+        for good in dict.fromkeys(step.good for step in self.__inputs):
+            _consumers.setdefault(good, []).append(self)
+        for good in dict.fromkeys(step.good for step in self.__outputs):
+            _producers.setdefault(good, []).append(self)
+
     @property
     def inputs(self) -> Tuple[JobStep, ...]:
         return self.__inputs
@@ -102,74 +117,3 @@ class Job(object):
 
     def __str__(self):
         return self.__name
-
-
-def _load_jobs() -> None:
-    """Load job definitions from the database, using YAML as a seed if empty."""
-    db.Base.metadata.create_all(
-        bind=db.engine,
-        tables=[
-            db.JobsTable.__table__,
-            db.JobInput.__table__,
-            db.JobOutput.__table__,
-            db.JobTool.__table__,
-        ],
-    )
-
-    def seed_jobs(session, data):
-        for job in data:
-            session.add(db.JobsTable(name=job["name"], job_limit=job.get("limit")))
-            for step in job.get("inputs", []):
-                session.add(db.JobInput(job=job["name"], good=step["good"], qty=step["qty"]))
-            for step in job.get("outputs", []):
-                session.add(
-                    db.JobOutput(job=job["name"], good=step["good"], qty=step["qty"])
-                )
-            for tool in job.get("tools", []):
-                session.add(
-                    db.JobTool(
-                        job=job["name"],
-                        tool=tool["tool"],
-                        qty=tool["qty"],
-                        break_chance=tool["break_chance"],
-                    )
-                )
-
-    try:
-        with db.session_scope() as session:
-            rows = seed_if_empty(
-                session,
-                select(db.JobsTable.name, db.JobsTable.job_limit),
-                "jobs.yml",
-                seed_jobs,
-            )
-
-            for name, job_limit in rows:
-                inputs = [
-                    {"good": r.good, "qty": r.qty}
-                    for r in session.query(db.JobInput).filter_by(job=name).all()
-                ]
-                outputs = [
-                    {"good": r.good, "qty": r.qty}
-                    for r in session.query(db.JobOutput).filter_by(job=name).all()
-                ]
-                tools = [
-                    {"tool": r.tool, "qty": r.qty, "break_chance": r.break_chance}
-                    for r in session.query(db.JobTool).filter_by(job=name).all()
-                ]
-                Job(
-                    name=name,
-                    inputs=inputs,
-                    outputs=outputs,
-                    tools=tools,
-                    limit=job_limit,
-                )
-    except OperationalError as exc:
-        if "no such column" in str(exc):
-            # Detected an outdated schema - rebuild the database and reload
-            db.rebuild_database()
-            return
-        raise
-
-
-_load_jobs()
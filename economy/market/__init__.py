@@ -1,7 +1,11 @@
 try:
     from .market import Market
+    from .numpy_book import NumpyOrderBook
+    from .checkpoints import Checkpoints
 except Exception:
     # Import errors here are likely due to optional dependencies used by
     # the market implementation (e.g. PyYAML when loading goods). To allow
     # package import without these extras during tests, ignore failures.
     Market = None
+    NumpyOrderBook = None
+    Checkpoints = None
@@ -9,6 +9,11 @@ logger = logging.getLogger(__name__)
 
 
 class OrderBook(object):
+    # Optional TraceRecorder that fills are reported to
+    trace = None
+    # Generator for the random parts of matching; markets hand theirs in
+    random = random
+
     def __init__(self):
         self.clear_books()
 
@@ -16,6 +21,20 @@ class OrderBook(object):
         self._asks = {}
         self._bids = {}
 
+    def open_day(self):
+        """Prepare the book for a new trading day.
+
+        Orders only live for a single day, so the book is simply cleared.
+        """
+        self.clear_books()
+
+    def cancel_orders(self, agent):
+        """Withdraw every order placed by ``agent``.
+
+        Nothing outlives the day it was placed on, so there is nothing to do.
+        """
+        pass
+
     def add_order(self, order):
         if isinstance(order, Ask):
             if order.good not in self._asks:
@@ -32,10 +51,21 @@ class OrderBook(object):
         for order in orders:
             self.add_order(order)
 
-    def resolve_orders(self, good, record_trade=None, day=None):
+    def order_count(self, good):
+        """Return the number of orders for ``good`` in the book."""
+        return len(self._asks.get(good, ())) + len(self._bids.get(good, ()))
+
+    def resolve_orders(self, good, record_trade=None, day=None, ledger=None):
+        """Match the orders for ``good`` and return the day's ``Trades``.
+
+        Fills are applied to the agents straight away unless a ``ledger`` is
+        given, in which case they are only appended to it for the market to
+        settle later.
+        """
         asks = self._asks.get(good, [])
         bids = self._bids.get(good, [])
 
+        trace = self.trace
         units_sold = 0
         total_value = 0
 
@@ -46,8 +76,8 @@ class OrderBook(object):
         demand = sum([bid.units for bid in bids])
 
         # First shuffle the orders to ensure Agent ordering not a factor
-        random.shuffle(asks)
-        random.shuffle(bids)
+        self.random.shuffle(asks)
+        self.random.shuffle(bids)
 
         # Now sort by price
         asks.sort(key=lambda o: o.unit_price, reverse=True)
@@ -73,31 +103,27 @@ class OrderBook(object):
             units_sold += qty
             total_value += qty * price
 
-            bid.agent.give_money(qty * price, ask.agent)
-            ask.agent.give_items(good, qty, bid.agent)
-            bid.agent.record_purchase(good, qty)
-            ask.agent.record_sale(good, qty)
+            if ledger is not None:
+                ledger.append(bid.agent, ask.agent, good, qty, price)
+            else:
+                bid.agent.give_money(qty * price, ask.agent)
+                ask.agent.give_items(good, qty, bid.agent)
+                bid.agent.record_purchase(good, qty)
+                ask.agent.record_sale(good, qty)
 
-            if record_trade:
-                if day is not None:
-                    record_trade(day, bid.agent.name, ask.agent.name, good, qty, price)
-                else:
-                    record_trade(bid.agent.name, ask.agent.name, good, qty, price)
-
-            bid.agent.beliefs.update(good, price)
-            ask.agent.beliefs.update(good, price)
-
-            logger.debug(
-                "Bid: %s units of %s for %s; Ask: %s units of %s for %s; Cleared %s units for %s",
-                bid.units,
-                bid.good,
-                bid.unit_price,
-                ask.units,
-                ask.good,
-                ask.unit_price,
-                qty,
-                price,
-            )
+                if record_trade:
+                    if day is not None:
+                        record_trade(
+                            day, bid.agent.name, ask.agent.name, good, qty, price
+                        )
+                    else:
+                        record_trade(bid.agent.name, ask.agent.name, good, qty, price)
+
+                bid.agent.beliefs.update(good, price)
+                ask.agent.beliefs.update(good, price)
+
+            if trace is not None:
+                trace.fill(day, good, bid.agent, ask.agent, qty, price)
 
             ask.units -= qty
             bid.units -= qty
@@ -114,12 +140,18 @@ class OrderBook(object):
             while asks:
                 # Unsuccessful Asks
                 ask = asks.pop()
-                ask.agent.beliefs.update(good, unit_price, False)
+                if ledger is not None:
+                    ledger.append_miss(ask.agent, good, unit_price)
+                else:
+                    ask.agent.beliefs.update(good, unit_price, False)
 
             while bids:
                 # Unsuccessful Bids
                 bid = bids.pop()
-                bid.agent.beliefs.update(good, unit_price, False)
+                if ledger is not None:
+                    ledger.append_miss(bid.agent, good, unit_price)
+                else:
+                    bid.agent.beliefs.update(good, unit_price, False)
 
             logger.info(
                 "Sold %s %s at an average price of %s",
@@ -0,0 +1,78 @@
+"""Periodic market snapshots used to look at past days."""
+
+from bisect import bisect_right, insort
+from pathlib import Path
+
+
+class Checkpoints(object):
+    """Directory of market snapshots taken every ``every`` days.
+
+    A market created with ``checkpoints=`` saves a snapshot whenever a day
+    divisible by ``every`` closes, and when it starts simulating without an
+    earlier checkpoint. :meth:`Market.state_at` loads the nearest earlier
+    snapshot and replays the remaining days, so it never replays more than
+    ``every - 1`` days.
+
+    The days with a checkpoint are listed from the directory once and then
+    kept up to date by :meth:`save` and :meth:`clear`, so snapshots should
+    not be added or removed behind their back.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory holding the snapshot files. Created when first needed.
+    every : int
+        Number of days between checkpoints.
+    """
+
+    def __init__(self, directory, every=10):
+        if every < 1:
+            raise ValueError("Checkpoints must be at least one day apart")
+        self._directory = Path(directory)
+        self._every = every
+        self._days = None
+
+    @property
+    def every(self):
+        return self._every
+
+    def path(self, day):
+        """Return the snapshot file for ``day``."""
+        return self._directory / "day-{:08d}.snap".format(day)
+
+    def _known_days(self):
+        if self._days is None:
+            if self._directory.is_dir():
+                paths = self._directory.glob("day-*.snap")
+                self._days = sorted(int(path.stem[len("day-") :]) for path in paths)
+            else:
+                self._days = []
+        return self._days
+
+    def days(self):
+        """Return the days with a checkpoint, oldest first."""
+        return list(self._known_days())
+
+    def nearest(self, day):
+        """Return the last checkpointed day up to ``day``, or ``None``."""
+        days = self._known_days()
+        index = bisect_right(days, day)
+        return days[index - 1] if index else None
+
+    def is_due(self, day):
+        return day % self._every == 0
+
+    def save(self, market):
+        """Snapshot ``market`` as of its current day."""
+        self._directory.mkdir(parents=True, exist_ok=True)
+        day = market.day_number
+        market.save_snapshot(str(self.path(day)))
+        days = self._known_days()
+        if day not in days:
+            insort(days, day)
+
+    def clear(self):
+        """Delete every checkpoint, e.g. when the simulation is reset."""
+        for day in self.days():
+            self.path(day).unlink()
+        self._days = []
@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import logging
+
+from economy.market.book import OrderBook
+from economy.market.history import Trades
+from economy.offer import Ask, Bid
+
+logger = logging.getLogger(__name__)
+
+
+class _RestingOrder(object):
+    """An order resting in the book, amended in place by its agent."""
+
+    __slots__ = ("agent", "price", "units", "placed", "seq")
+
+    def __init__(self, agent, price, units, placed, seq):
+        self.agent = agent
+        self.price = price
+        self.units = units
+        self.placed = placed
+        self.seq = seq
+
+
+class _BookSide(object):
+    """One side of the book for one good, kept in price-time priority.
+
+    Orders sit in a heap keyed on ``(sign * price, seq)``. Amending the price
+    of an order pushes a fresh heap entry and leaves the old one behind; stale
+    entries are recognised by their sequence number and skipped lazily.
+    """
+
+    __slots__ = ("sign", "heap", "orders", "units")
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.heap = []
+        self.orders = {}
+        self.units = 0
+
+    def place(self, agent, price, units, day, seq):
+        order = self.orders.get(agent)
+        if order is None:
+            order = _RestingOrder(agent, price, units, day, seq)
+            self.orders[agent] = order
+            heapq.heappush(self.heap, (self.sign * price, seq, order))
+        else:
+            self.units -= order.units
+            order.units = units
+            order.placed = day
+            if order.price != price:
+                # A new price loses the order its place in the queue
+                order.price = price
+                order.seq = seq
+                heapq.heappush(self.heap, (self.sign * price, seq, order))
+        self.units += units
+
+    def remove(self, order):
+        if self.orders.get(order.agent) is order:
+            del self.orders[order.agent]
+            self.units -= order.units
+
+    def best(self):
+        """Return the order at the front of the queue, if any."""
+        heap = self.heap
+        while heap:
+            _, seq, order = heap[0]
+            if seq == order.seq and self.orders.get(order.agent) is order:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def expire(self, cutoff):
+        """Drop orders last placed or amended on or before ``cutoff``."""
+        for order in [o for o in self.orders.values() if o.placed <= cutoff]:
+            self.remove(order)
+
+        if len(self.heap) > 2 * len(self.orders) + 16:
+            # Too many stale entries; rebuild from the live orders
+            self.heap = [(self.sign * o.price, o.seq, o) for o in self.orders.values()]
+            heapq.heapify(self.heap)
+
+
+class ContinuousOrderBook(OrderBook):
+    """Continuous double-auction book whose orders rest across days.
+
+    Each agent has at most one ask and one bid per good. Placing another
+    order for the same good and side amends the resting one instead of
+    adding a second order. Orders that are not amended for ``ttl`` days
+    expire when a new day opens.
+
+    Unlike the daily books, a bid only trades with an ask it crosses
+    (``bid price >= ask price``); everything else keeps resting. Fills are
+    priced at the midpoint of the two orders and are capped at what the
+    seller still holds and what the buyer still has room for, since a
+    resting order may be several days old.
+    """
+
+    def __init__(self, ttl=5):
+        if ttl < 1:
+            raise ValueError("Orders must live for at least one day")
+        self._ttl = ttl
+        self._day = 0
+        self._seq = itertools.count()
+        super().__init__()
+
+    def clear_books(self):
+        self._asks = {}
+        self._bids = {}
+        self._pending_sold = {}
+        self._pending_space = {}
+
+    def open_day(self):
+        """Expire orders that have outlived their time-to-live."""
+        self._pending_sold = {}
+        self._pending_space = {}
+        self._day += 1
+        cutoff = self._day - self._ttl
+        for side in list(self._asks.values()) + list(self._bids.values()):
+            side.expire(cutoff)
+
+    def add_order(self, order):
+        if isinstance(order, Ask):
+            sides, sign = self._asks, 1
+        elif isinstance(order, Bid):
+            sides, sign = self._bids, -1
+        else:
+            raise ValueError("Order is not an Ask or a Bid")
+
+        if order.good not in sides:
+            sides[order.good] = _BookSide(sign)
+        sides[order.good].place(
+            order.agent,
+            order.unit_price,
+            order.units,
+            self._day,
+            next(self._seq),
+        )
+
+    def cancel_orders(self, agent):
+        for side in list(self._asks.values()) + list(self._bids.values()):
+            order = side.orders.get(agent)
+            if order is not None:
+                side.remove(order)
+
+    def resting_orders(self, good):
+        """Return the number of asks and bids resting for ``good``."""
+        asks = self._asks.get(good)
+        bids = self._bids.get(good)
+        return (
+            len(asks.orders) if asks else 0,
+            len(bids.orders) if bids else 0,
+        )
+
+    def order_count(self, good):
+        return sum(self.resting_orders(good))
+
+    def _holding(self, agent, good):
+        # Fills recorded in a ledger have not left the inventory yet
+        return agent.holding(good) - self._pending_sold.get((agent, good), 0)
+
+    def _free_space(self, agent):
+        return agent.free_space() - self._pending_space.get(agent, 0)
+
+    def resolve_orders(self, good, record_trade=None, day=None, ledger=None):
+        asks = self._asks.get(good) or _BookSide(1)
+        bids = self._bids.get(good) or _BookSide(-1)
+
+        units_sold = 0
+        total_value = 0
+
+        low = None
+        high = None
+
+        supply = asks.units
+        demand = bids.units
+
+        while True:
+            ask = asks.best()
+            bid = bids.best()
+            if ask is None or bid is None or bid.price < ask.price:
+                break
+
+            qty = min(
+                ask.units,
+                bid.units,
+                self._holding(ask.agent, good),
+                self._free_space(bid.agent),
+            )
+            if qty <= 0:
+                # The resting order can no longer be honoured
+                if self._holding(ask.agent, good) <= 0:
+                    asks.remove(ask)
+                if self._free_space(bid.agent) <= 0:
+                    bids.remove(bid)
+                continue
+
+            price = round((ask.price + bid.price) / 2)
+
+            low = price if low is None else min(low, price)
+            high = price if high is None else max(high, price)
+
+            units_sold += qty
+            total_value += qty * price
+
+            if ledger is not None:
+                ledger.append(bid.agent, ask.agent, good, qty, price)
+                key = (ask.agent, good)
+                self._pending_sold[key] = self._pending_sold.get(key, 0) + qty
+                self._pending_space[bid.agent] = (
+                    self._pending_space.get(bid.agent, 0) + qty
+                )
+            else:
+                bid.agent.give_money(qty * price, ask.agent)
+                ask.agent.give_items(good, qty, bid.agent)
+                bid.agent.record_purchase(good, qty)
+                ask.agent.record_sale(good, qty)
+
+                if record_trade:
+                    if day is not None:
+                        record_trade(
+                            day, bid.agent.name, ask.agent.name, good, qty, price
+                        )
+                    else:
+                        record_trade(bid.agent.name, ask.agent.name, good, qty, price)
+
+                bid.agent.beliefs.update(good, price)
+                ask.agent.beliefs.update(good, price)
+
+            if self.trace is not None:
+                self.trace.fill(day, good, bid.agent, ask.agent, qty, price)
+
+            for side, order in ((asks, ask), (bids, bid)):
+                if order.units == qty:
+                    side.remove(order)
+                else:
+                    side.units -= qty
+                    order.units -= qty
+
+        if units_sold > 0:
+            unit_price = round(total_value / units_sold)
+
+            # Orders still resting were not good enough today
+            for order in list(asks.orders.values()) + list(bids.orders.values()):
+                if ledger is not None:
+                    ledger.append_miss(order.agent, good, unit_price)
+                else:
+                    order.agent.beliefs.update(good, unit_price, False)
+
+            logger.info(
+                "Sold %s %s at an average price of %s",
+                units_sold,
+                good,
+                unit_price,
+            )
+        else:
+            unit_price = None
+            logger.info("0 units of %s were traded today", good)
+
+        return Trades(
+            low=low,
+            high=high,
+            volume=units_sold,
+            mean=unit_price,
+            supply=supply,
+            demand=demand,
+        )
@@ -1,11 +1,15 @@
 from collections import namedtuple
-from functools import lru_cache
+from collections.abc import Sequence
 import logging
+import queue
 import sqlite3
 import threading
+import time
 
+import numpy as np
 
 from economy import goods
+from config import DB_JOURNAL_MODE, DB_SYNCHRONOUS, HISTORY_FIDELITY
 
 
 logger = logging.getLogger(__name__)
@@ -14,15 +18,109 @@ logger = logging.getLogger(__name__)
 Trades = namedtuple("Trades", ["volume", "low", "high", "mean", "supply", "demand"])
 
 
+def _ratio(low, high, current):
+    try:
+        return (current - low) / (high - low)
+    except TypeError:
+        return None
+    except ZeroDivisionError:
+        # Special case to handle high and low being the same
+        return 0.5
+
+
+def _to_trades(row):
+    values = row.tolist()
+    if values[0] != values[0]:
+        # NaN volume marks a day on which nothing was recorded for this good
+        return None
+    return Trades(*[None if v != v else int(v) for v in values])
+
+
+class TradesView(Sequence):
+    """Read-only sequence of :class:`Trades` backed by a NumPy array.
+
+    ``array`` is a ``days x fields`` view straight into the history's
+    buffer, with ``None`` stored as NaN; ``Trades`` tuples are only built
+    as items are read. The view follows the live buffer, so copy it (or
+    convert it to a list) to keep it across days.
+    """
+
+    __slots__ = ("array",)
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TradesView(self.array[index])
+        return _to_trades(self.array[index])
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "TradesView({!r})".format(list(self))
+
+
 class MarketHistory(object):
+    """In-memory record of the daily ``Trades`` of every good.
+
+    The last ``max_depth`` days live in a fixed ``goods x days x fields``
+    NumPy ring buffer, so memory does not grow however long a run lasts.
+    """
+
     def __init__(self, max_depth=30):
         self._max_depth = max_depth
-        self._history = {}
         self._day = None
         self._day_number = 0
+        self._warned_day = None
+
+        self._reset_storage()
+
+    def _reset_storage(self):
+        # Every day is written twice, max_depth columns apart, so the most
+        # recent days are always one contiguous (and viewable) slice
+        shape = (goods.count(), 2 * self._max_depth, len(Trades._fields))
+        self._buffer = np.full(shape, np.nan)
+        self._days = 0
+        self._aggregate_cache = {}
+        self._latest = self._aggregate_window(self._window(self._max_depth))
+
+    def get_state(self):
+        """Return the in-memory history as arrays and plain values."""
+        return {
+            "max_depth": self._max_depth,
+            "buffer": self._buffer,
+            "days": self._days,
+            "day_number": self._day_number,
+        }
+
+    def set_state(self, state):
+        """Replace the in-memory history with a :meth:`get_state` result."""
+        if state["buffer"].shape != self._buffer.shape:
+            raise ValueError("History state does not fit this history's depth")
+        self._buffer = np.array(state["buffer"])
+        self._days = state["days"]
+        self._day_number = state["day_number"]
+        self._day = None
+        self._aggregate_cache = {}
+        self._latest = self._aggregate_window(self._window(self._max_depth))
 
-        for good in goods.all():
-            self._history[good] = []
+    def _window(self, depth):
+        depth = min(depth, self._days, self._max_depth)
+        end = self._days % self._max_depth + self._max_depth
+        return self._buffer[:, end - depth : end]
+
+    def _push_day(self, values):
+        slot = self._days % self._max_depth
+        self._buffer[:, slot] = values
+        self._buffer[:, slot + self._max_depth] = values
+        self._days += 1
 
     def open_day(self):
         if self._day is not None:
@@ -45,28 +143,34 @@ class MarketHistory(object):
         self._day[good] = trades
 
     def close_day(self):
-        for good in self._day.keys():
-            self._history[good].append(self._day[good])
-
-            # Be lazy about our garbage collection
-            if len(self._history[good]) > 1.5 * self._max_depth:
-                self._history[good] = self._history[good][-self._max_depth :]
+        values = np.full(self._buffer[:, 0].shape, np.nan)
+        for good, trades in self._day.items():
+            if trades is not None:
+                values[good.id] = [np.nan if v is None else v for v in trades]
+        self._push_day(values)
 
         self._day = None
 
-        # Clear our cached aggregate data
-        self.aggregate.cache_clear()
+        # Refresh our aggregate data
+        self._latest = self._aggregate_window(self._window(self._max_depth))
+        self._aggregate_cache = {}
 
-    def history(self, depth=None):
-        if self._day is not None:
+    def _warn_open_day(self):
+        # Agents read aggregates all through the day; say so once per day
+        if self._day is not None and self._warned_day != self._day_number:
+            self._warned_day = self._day_number
             logger.warning("Day has been left open. It will not appear in the history.")
 
-        if depth is None or depth > self._max_depth:
+    def history(self, depth=None):
+        self._warn_open_day()
+
+        if not depth or depth > self._max_depth:
             depth = self._max_depth
 
+        window = self._window(depth)
         hist = {}
         for good in goods.all():
-            hist[good] = self._history[good][-depth:]
+            hist[good] = TradesView(window[good.id])
 
         return hist
 
@@ -74,45 +178,54 @@ class MarketHistory(object):
         """Record a single trade. Base implementation is a no-op."""
         pass
 
-    @lru_cache(maxsize=64)
-    def aggregate(self, good, depth=None):
-        if self._day is not None:
-            logger.warning("Day has been left open. It will not appear in the history.")
-
-        if depth is None or depth > self._max_depth:
-            depth = self._max_depth
-
-        hist = self._history[good][-depth:]
-        low = None
-        high = None
-        current = None
+    def record_trades(self, day, ledger):
+        """Record every fill in a ``TradeLedger``. Base implementation is a no-op."""
+        pass
 
-        for trades in hist:
-            if trades.volume == 0:
-                # No trades on this day, ignore it
-                continue
+    def flush(self):
+        """Store anything still buffered. Base implementation is a no-op."""
+        pass
 
-            try:
-                low = min(low, trades.low)
-            except TypeError:
-                low = trades.low
+    def close(self):
+        """Flush and release any resources. Base implementation is a no-op."""
+        pass
 
-            try:
-                high = max(high, trades.high)
-            except TypeError:
-                high = trades.high
+    def aggregate(self, good, depth=None):
+        self._warn_open_day()
 
-            current = trades.mean
+        if not depth or depth >= self._max_depth:
+            return self._latest[good.id]
 
         try:
-            ratio = (current - low) / (high - low)
-        except TypeError:
-            ratio = None
-        except ZeroDivisionError:
-            # Special case to handle high and low being the same
-            ratio = 0.5
-
-        return (low, high, current, ratio)
+            latest = self._aggregate_cache[depth]
+        except KeyError:
+            latest = self._aggregate_window(self._window(depth))
+            self._aggregate_cache[depth] = latest
+        return latest[good.id]
+
+    @staticmethod
+    def _aggregate_window(window):
+        """Return ``(low, high, current, ratio)`` for every good in ``window``."""
+        n_goods, n_days = window.shape[:2]
+        traded = window[:, :, 0] > 0
+        seen = traded.any(axis=1)
+        if not seen.any():
+            return [(None, None, None, None)] * n_goods
+
+        # Days without trades are ignored
+        low = np.where(traded, window[:, :, 1], np.inf).min(axis=1)
+        high = np.where(traded, window[:, :, 2], -np.inf).max(axis=1)
+        last = n_days - 1 - np.argmax(traded[:, ::-1], axis=1)
+        current = window[np.arange(n_goods), last, 3]
+
+        latest = []
+        for row in zip(seen.tolist(), low.tolist(), high.tolist(), current.tolist()):
+            if row[0]:
+                low_, high_, current_ = int(row[1]), int(row[2]), int(row[3])
+                latest.append((low_, high_, current_, _ratio(low_, high_, current_)))
+            else:
+                latest.append((None, None, None, None))
+        return latest
 
     @property
     def day_number(self):
@@ -120,14 +233,74 @@ class MarketHistory(object):
 
 
 class SQLiteHistory(MarketHistory):
-    """Persist market history to a SQLite database."""
+    """Persist market history to a SQLite database.
+
+    Trades are buffered in memory during a day and written, together with
+    the day's summaries, in a single transaction when the day closes.
+
+    Parameters
+    ----------
+    db_path : str
+        SQLite database file.
+    max_depth : int
+        Number of days kept in memory.
+    fidelity : str
+        ``"full"`` stores every trade and the daily summaries, ``"summary"``
+        only the daily summaries and ``"none"`` writes nothing.
+    synchronous : str, optional
+        SQLite ``synchronous`` setting, e.g. ``"NORMAL"`` or ``"OFF"``.
+    journal_mode : str, optional
+        SQLite ``journal_mode`` setting, e.g. ``"WAL"``.
+    write_behind : bool
+        Write each closed day from a background thread so the simulation
+        can carry on with the next day in the meantime. Call :meth:`flush`
+        or :meth:`close` to make sure everything has reached the disk.
+    queue_size : int
+        Number of closed days that may wait for the background writer
+        before ``close_day`` blocks.
+    write_observer : callable, optional
+        Called with the duration in seconds of every day written to the
+        database, e.g. to feed a metrics histogram. With ``write_behind`` it
+        is called from the writer thread.
+    """
+
+    FIDELITY_LEVELS = ("full", "summary", "none")
+    SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+
+    def __init__(
+        self,
+        db_path="sim.db",
+        max_depth=30,
+        fidelity=HISTORY_FIDELITY,
+        synchronous=DB_SYNCHRONOUS,
+        journal_mode=DB_JOURNAL_MODE,
+        write_behind=False,
+        queue_size=4,
+        write_observer=None,
+    ):
+        if fidelity not in self.FIDELITY_LEVELS:
+            raise ValueError("Unknown history fidelity {!r}".format(fidelity))
+        pragmas = []
+        if synchronous is not None:
+            pragmas.append(
+                ("synchronous", self._setting(synchronous, self.SYNCHRONOUS_MODES))
+            )
+        if journal_mode is not None:
+            pragmas.append(
+                ("journal_mode", self._setting(journal_mode, self.JOURNAL_MODES))
+            )
 
-    def __init__(self, db_path="sim.db", max_depth=30):
         self._db_path = db_path
+        self._fidelity = fidelity
+        self._pending = []
+        self.write_observer = write_observer
         # Allow usage across threads but guard with a lock
         self._conn = sqlite3.connect(db_path, check_same_thread=False)
         self._lock = threading.Lock()
         with self._lock:
+            for name, value in pragmas:
+                self._conn.execute("PRAGMA {}={}".format(name, value))
             self._conn.execute(
                 """CREATE TABLE IF NOT EXISTS trades(
                     day INTEGER,
@@ -151,6 +324,18 @@ class SQLiteHistory(MarketHistory):
                     seller TEXT
                 )"""
             )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS trades_good_day ON trades(good, day)"
+            )
+            # Serves day ranges as well as pages ordered by day and good,
+            # superseding the older index on day alone
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS trades_day_good ON trades(day, good)"
+            )
+            self._conn.execute("DROP INDEX IF EXISTS trades_day")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS trade_log_day ON trade_log(day)"
+            )
             self._conn.commit()
 
         super().__init__(max_depth=max_depth)
@@ -161,25 +346,61 @@ class SQLiteHistory(MarketHistory):
             row = cur.fetchone()
         self._day_number = row[0] or 0
 
-        for good in goods.all():
-            self._history[good] = []
-            with self._lock:
-                cur = self._conn.execute(
-                    "SELECT volume, low, high, mean, supply, demand FROM trades WHERE good=? ORDER BY day",
-                    (str(good),),
-                )
-                for r in cur.fetchall():
-                    self._history[good].append(Trades(*r))
+        # Only the last max_depth days are kept in memory; anything older is
+        # read on demand by fetch_history()
+        first_day = max(self._day_number - max_depth, 0)
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT day, good, volume, low, high, mean, supply, demand FROM trades WHERE day > ?",
+                (first_day,),
+            )
+            rows = cur.fetchall()
+
+        values = np.full(
+            (self._day_number - first_day,) + self._buffer[:, 0].shape, np.nan
+        )
+        for day, name, *trades in rows:
+            try:
+                good = goods.by_name(name)
+            except KeyError:
+                continue
+            values[day - first_day - 1, good.id] = [
+                np.nan if v is None else v for v in trades
+            ]
+        for day_values in values:
+            self._push_day(day_values)
+        self._latest = self._aggregate_window(self._window(max_depth))
+
+        self._writer = None
+        self._writer_error = None
+        if write_behind:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._writer = threading.Thread(
+                target=self._drain, name="SQLiteHistory writer", daemon=True
+            )
+            self._writer.start()
+
+    @staticmethod
+    def _setting(value, allowed):
+        value = str(value).upper()
+        if value not in allowed:
+            raise ValueError("Unsupported SQLite setting {!r}".format(value))
+        return value
+
+    @property
+    def fidelity(self):
+        return self._fidelity
 
     def close_day(self):
+        closing = self._day
         super().close_day()
         day = self._day_number
-        with self._lock:
-            cur = self._conn.cursor()
+
+        summaries = []
+        if self._fidelity != "none":
             for good in goods.all():
-                trades = self._history[good][-1]
-                cur.execute(
-                    "INSERT INTO trades(day, good, volume, low, high, mean, supply, demand) VALUES (?,?,?,?,?,?,?,?)",
+                trades = closing[good]
+                summaries.append(
                     (
                         day,
                         str(good),
@@ -189,30 +410,171 @@ class SQLiteHistory(MarketHistory):
                         trades.mean,
                         trades.supply,
                         trades.demand,
-                    ),
+                    )
                 )
-            self._conn.commit()
+        log, self._pending = self._pending, []
+
+        if not summaries and not log:
+            return
+
+        if self._writer is None:
+            self._write(summaries, log)
+        else:
+            self._check_writer()
+            # Blocks while the queue is full, so a slow disk holds the
+            # simulation back rather than letting days pile up in memory
+            self._queue.put((summaries, log))
+
+    def _write(self, summaries, log):
+        start = time.perf_counter()
+        # Everything for the day goes in one transaction
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO trades(day, good, volume, low, high, mean, supply, demand) VALUES (?,?,?,?,?,?,?,?)",
+                summaries,
+            )
+            self._conn.executemany(
+                "INSERT INTO trade_log(day, good, qty, price, buyer, seller) VALUES (?,?,?,?,?,?)",
+                log,
+            )
+        if self.write_observer is not None:
+            self.write_observer(time.perf_counter() - start)
+
+    def fetch_history(self, start=1, end=None, good=None):
+        """Read the daily ``Trades`` of days ``start`` to ``end`` from disk.
+
+        Unlike :meth:`history` this is not limited to the days held in
+        memory. Returns ``{good: [(day, Trades), ...]}`` in day order, for
+        every good or just ``good``.
+        """
+        self.flush()
+        if end is None:
+            end = self._day_number
+        query = "SELECT day, good, volume, low, high, mean, supply, demand FROM trades WHERE day BETWEEN ? AND ?"
+        params = [start, end]
+        if good is not None:
+            query += " AND good = ?"
+            params.append(str(good))
+        query += " ORDER BY day"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
 
-    def record_trade(self, day, buyer, seller, good, qty, price):
+        hist = {g: [] for g in goods.all()} if good is None else {good: []}
+        for day, name, *trades in rows:
+            try:
+                hist[goods.by_name(name)].append((day, Trades(*trades)))
+            except KeyError:
+                continue
+        return hist
+
+    def fetch_page(self, start=1, end=None, only=None, after=None, limit=1000):
+        """Read up to ``limit`` daily summaries from disk, ordered by day and good.
+
+        Parameters
+        ----------
+        start, end : int, optional
+            First and last day to read, both included. ``end`` defaults to
+            the current day.
+        only : list of Good, optional
+            Only read these goods instead of every good in the catalog.
+        after : tuple, optional
+            ``(day, good name)`` of the last summary of the previous page;
+            reading resumes right after it.
+        limit : int
+            Maximum number of summaries returned.
+
+        Returns
+        -------
+        list
+            ``(day, good, Trades)`` tuples. Fewer than ``limit`` means there
+            is nothing more in the range.
+        """
+        if limit < 1:
+            raise ValueError("A page must hold at least one summary")
+        self.flush()
+        if end is None:
+            end = self._day_number
+        query = "SELECT day, good, volume, low, high, mean, supply, demand FROM trades WHERE day BETWEEN ? AND ?"
+        params = [start, end]
+        names = [str(good) for good in (goods.all() if only is None else only)]
+        query += " AND good IN ({})".format(",".join("?" * len(names)))
+        params.extend(names)
+        if after is not None:
+            # Keyset pagination: seek in the (day, good) index, no OFFSET scan
+            query += " AND (day, good) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY day, good LIMIT ?"
+        params.append(limit)
         with self._lock:
-            self._conn.execute(
-                "INSERT INTO trade_log(day, good, qty, price, buyer, seller) VALUES (?,?,?,?,?,?)",
-                (
-                    day,
-                    str(good),
-                    qty,
-                    price,
-                    buyer,
-                    seller,
-                ),
+            rows = self._conn.execute(query, params).fetchall()
+
+        return [
+            (day, goods.by_name(name), Trades(*trades)) for day, name, *trades in rows
+        ]
+
+    def _drain(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._writer_error is None:
+                    self._write(*batch)
+            except Exception as exc:
+                logger.exception("Failed to write market history")
+                self._writer_error = exc
+            finally:
+                self._queue.task_done()
+
+    def _check_writer(self):
+        if self._writer_error is not None:
+            raise RuntimeError("Writing market history failed") from self._writer_error
+
+    def flush(self):
+        """Block until every closed day has been written to the database."""
+        if self._writer is not None:
+            self._queue.join()
+            self._check_writer()
+
+    def close(self):
+        """Flush outstanding writes, stop the writer and close the database."""
+        if self._conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            if self._writer is not None:
+                self._queue.put(None)
+                self._writer.join()
+                self._writer = None
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record_trade(self, day, buyer, seller, good, qty, price):
+        if self._fidelity == "full":
+            self._pending.append((day, str(good), qty, price, buyer, seller))
+
+    def record_trades(self, day, ledger):
+        if self._fidelity == "full":
+            self._pending.extend(
+                (day, str(good), qty, price, buyer.name, seller.name)
+                for buyer, seller, good, qty, price in ledger.trades()
             )
-            self._conn.commit()
 
     def reset(self):
         """Clear all data from the database and memory."""
+        self.flush()
         with self._lock:
             self._conn.execute("DELETE FROM trades")
             self._conn.execute("DELETE FROM trade_log")
             self._conn.commit()
-        self._history = {good: [] for good in goods.all()}
+        self._pending = []
         self._day_number = 0
+        self._reset_storage()
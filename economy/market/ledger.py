@@ -0,0 +1,153 @@
+from array import array
+
+import numpy as np
+
+
+class TradeLedger(object):
+    """Compact record of one day's fills, settled in a single pass.
+
+    Fills are stored as parallel integer columns (``buyer``, ``seller``,
+    ``good``, ``qty`` and ``price``). Agents and goods are stored once in the
+    ``agents`` and ``goods`` tables and referenced by index. Orders left
+    unfilled are kept in a second set of columns (``miss_agent``,
+    ``miss_good`` and ``miss_price``) so their belief updates can be
+    deferred too.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget every recorded fill, ready for a new day."""
+        self.agents = []
+        self.goods = []
+        self._agent_ids = {}
+        self._good_ids = {}
+        self._tables = {}
+
+        self.buyer = array("q")
+        self.seller = array("q")
+        self.good = array("q")
+        self.qty = array("q")
+        self.price = array("q")
+
+        self.miss_agent = array("q")
+        self.miss_good = array("q")
+        self.miss_price = array("q")
+
+    def __len__(self):
+        return len(self.qty)
+
+    def agent_id(self, agent):
+        try:
+            return self._agent_ids[agent]
+        except KeyError:
+            agent_id = self._agent_ids[agent] = len(self.agents)
+            self.agents.append(agent)
+            return agent_id
+
+    def good_id(self, good):
+        try:
+            return self._good_ids[good]
+        except KeyError:
+            good_id = self._good_ids[good] = len(self.goods)
+            self.goods.append(good)
+            return good_id
+
+    def append(self, buyer, seller, good, qty, price):
+        """Record a single fill between two agents."""
+        self.buyer.append(self.agent_id(buyer))
+        self.seller.append(self.agent_id(seller))
+        self.good.append(self.good_id(good))
+        self.qty.append(qty)
+        self.price.append(price)
+
+    def append_miss(self, agent, good, price):
+        """Record an order that was left unfilled at ``price``."""
+        self.miss_agent.append(self.agent_id(agent))
+        self.miss_good.append(self.good_id(good))
+        self.miss_price.append(price)
+
+    def extend(self, good, agents, buyer, seller, qty, price, unfilled, mean):
+        """Record a batch of fills for ``good`` given as NumPy arrays.
+
+        ``buyer``, ``seller`` and ``unfilled`` index into ``agents``; any
+        unfilled orders are recorded as misses at the clearing price
+        ``mean``.
+        """
+        ids = self._table(agents)
+        good_id = self.good_id(good)
+
+        self.buyer.frombytes(ids[buyer].tobytes())
+        self.seller.frombytes(ids[seller].tobytes())
+        self.good.frombytes(np.full(len(qty), good_id, dtype=np.int64).tobytes())
+        self.qty.frombytes(qty.astype(np.int64).tobytes())
+        self.price.frombytes(price.astype(np.int64).tobytes())
+
+        if len(unfilled):
+            self.miss_agent.frombytes(ids[unfilled].tobytes())
+            self.miss_good.frombytes(
+                np.full(len(unfilled), good_id, dtype=np.int64).tobytes()
+            )
+            self.miss_price.frombytes(
+                np.full(len(unfilled), mean, dtype=np.int64).tobytes()
+            )
+
+    def _table(self, agents):
+        # Map another agent table onto ours, reusing the mapping while that
+        # table is unchanged (a book's table is fixed once orders are in)
+        key = id(agents)
+        cached = self._tables.get(key)
+        if cached is None or len(cached) != len(agents):
+            cached = np.fromiter(
+                (self.agent_id(agent) for agent in agents),
+                dtype=np.int64,
+                count=len(agents),
+            )
+            self._tables[key] = cached
+        return cached
+
+    def columns(self):
+        """Return the fill columns as NumPy arrays without copying."""
+        return tuple(
+            np.frombuffer(column, dtype=np.int64)
+            for column in (self.buyer, self.seller, self.good, self.qty, self.price)
+        )
+
+    def totals(self):
+        """Net the day's fills per agent.
+
+        Returns ``{agent_id: (money, bought, sold)}`` where ``money`` is the
+        agent's net cash flow and ``bought``/``sold`` map good ids to units.
+        """
+        totals = {}
+        if not len(self):
+            return totals
+
+        buyer, seller, good, qty, price = self.columns()
+        value = qty * price
+        n_goods = len(self.goods)
+
+        money = np.zeros(len(self.agents), dtype=np.int64)
+        np.add.at(money, seller, value)
+        np.subtract.at(money, buyer, value)
+        for agent_id in np.union1d(buyer, seller).tolist():
+            totals[agent_id] = (int(money[agent_id]), {}, {})
+
+        for agents, slot in ((buyer, 1), (seller, 2)):
+            keys, index = np.unique(agents * n_goods + good, return_inverse=True)
+            units = np.bincount(index, weights=qty).astype(np.int64)
+            for key, count in zip(keys.tolist(), units.tolist()):
+                agent_id, good_id = divmod(key, n_goods)
+                totals[agent_id][slot][good_id] = count
+
+        return totals
+
+    def trades(self):
+        """Yield ``(buyer, seller, good, qty, price)`` for every fill."""
+        agents = self.agents
+        goods = self.goods
+        for buyer, seller, good, qty, price in zip(
+            self.buyer, self.seller, self.good, self.qty, self.price
+        ):
+            yield agents[buyer], agents[seller], goods[good], qty, price
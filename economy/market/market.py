@@ -1,13 +1,22 @@
 import random
+import time
 
+import numpy as np
 
-from economy.agent import Agent, dump_agent
+
+from economy.agent import Agent
+from economy.beliefs import BeliefMatrix, Beliefs
 from economy import goods, jobs
 from economy.plugins import load_plugins, agent_for_job
+from economy.pool import AgentPool
 
 from config import INITIAL_INVENTORY, INITIAL_MONEY, DAILY_TAX
 from economy.market.book import OrderBook
+from economy.market.numpy_book import NumpyOrderBook
 from economy.market.history import SQLiteHistory, MarketHistory
+from economy.market.ledger import TradeLedger
+from economy.market import snapshot
+from economy.market.perf import PerfStats
 
 
 class Market(object):
@@ -24,6 +33,14 @@ class Market(object):
         initial_inv=INITIAL_INVENTORY,
         initial_money=INITIAL_MONEY,
         daily_tax=DAILY_TAX,
+        book=None,
+        executor=None,
+        deferred_settlement=False,
+        pool=False,
+        checkpoints=None,
+        instrument=False,
+        trace=None,
+        seed=None,
     ):
         """Create a new market instance.
 
@@ -45,22 +62,110 @@ class Market(object):
             Starting money for each agent.
         daily_tax : int
             Flat amount of money deducted from each agent every day.
+        book : OrderBook, optional
+            Order book used to match orders. Defaults to the pure-Python
+            ``OrderBook``; pass a ``NumpyOrderBook`` to use the vectorized
+            matching engine or a ``ContinuousOrderBook`` to let unfilled
+            orders rest across days.
+        executor : concurrent.futures.Executor, optional
+            Thread or process pool used to match every good in parallel.
+            Fills are still applied to agents one good at a time in catalog
+            order, so results do not depend on the number of workers.
+            Requires a book supporting ``match_all``; a ``NumpyOrderBook``
+            is used when no ``book`` is given.
+        deferred_settlement : bool
+            When true the book only appends fills to a ``TradeLedger`` and
+            the market applies money, inventory, trade stats and belief
+            changes for the whole day in a single settlement pass. The
+            ledger is then handed to the history backend in one batch.
+        pool : bool
+            Store the population in a struct-of-arrays ``AgentPool`` instead
+            of individual ``Agent`` objects, so offers, production, tax and
+            bankruptcy run as array operations. ``agents`` then returns
+            read-only ``AgentView`` objects. Requires a ``NumpyOrderBook``,
+            which is used when no ``book`` is given.
+        checkpoints : Checkpoints, optional
+            Save a snapshot every few days so :meth:`state_at` can look at
+            past days without re-running the whole simulation.
+        instrument : bool
+            Time every phase of the day loop and count orders, fills,
+            bankruptcies and spawns; see :meth:`perf_stats`. Without it the
+            day loop is not instrumented at all.
+        trace : TraceRecorder, optional
+            Record every fill, and the state of every agent before and
+            after each call to :meth:`simulate`, as structured events.
+        seed : int, optional
+            Seed of the market's ``random`` generator, which agents, beliefs
+            and the order book draw from. By default it is drawn from the
+            :mod:`random` module, so seeding that keeps runs reproducible;
+            after that the market never touches the module's state.
         """
 
+        self.random = random.Random(random.getrandbits(64) if seed is None else seed)
         self._agents = []
-        self._book = OrderBook()
+        self._pool = None
+        if book is None:
+            use_numpy = executor is not None or pool
+            book = NumpyOrderBook() if use_numpy else OrderBook()
+        if executor is not None and not hasattr(book, "match_all"):
+            raise ValueError("Parallel matching requires a NumpyOrderBook")
+        if pool and not hasattr(book, "add_arrays"):
+            raise ValueError("An agent pool requires a NumpyOrderBook")
+        self._book = book
+        self._book.trace = trace
+        self._book.random = self.random
+        self._trace = trace
+        self._executor = executor
+        use_ledger = deferred_settlement or pool
+        self._ledger = TradeLedger() if use_ledger else None
         # Store trade history in SQLite by default
         self._history = history if history is not None else SQLiteHistory()
         self._lifespans = []
         self._daily_tax = daily_tax
+        self._beliefs = BeliefMatrix(source=self.random)
+        self._rng = np.random.default_rng(self.random.getrandbits(64))
+        self._checkpoints = checkpoints
+        self._perf = None
+        self._record_trade = self._history.record_trade
+        if instrument:
+            self._perf = PerfStats()
+            self._record_trade = self._counting_record_trade
 
         # Load any external plugins before creating agents
         load_plugins()
 
+        recipes = self._initial_recipes(num_agents, job_counts)
+
+        if pool:
+            self._pool = AgentPool(
+                recipes,
+                self,
+                initial_inv=initial_inv,
+                initial_money=initial_money,
+            )
+            self._beliefs = self._pool.beliefs
+            self._agents = list(self._pool.views)
+            return
+
+        for recipe in recipes:
+            agent_cls = agent_for_job(str(recipe))
+            self._agents.append(
+                agent_cls(
+                    recipe,
+                    self,
+                    initial_inv=initial_inv,
+                    initial_money=initial_money,
+                )
+            )
+
+    @staticmethod
+    def _initial_recipes(num_agents, job_counts):
+        """Return the job recipe of every agent the market starts with."""
         job_list = list(jobs.all())
         if not job_list:
-            return
+            return []
 
+        recipes = []
         if job_counts:
             for job_name, count in job_counts.items():
                 try:
@@ -68,93 +173,273 @@ class Market(object):
                 except KeyError:
                     continue
 
-                for _ in range(int(count)):
-                    agent_cls = agent_for_job(str(recipe))
-                    self._agents.append(
-                        agent_cls(
-                            recipe,
-                            self,
-                            initial_inv=initial_inv,
-                            initial_money=initial_money,
-                        )
-                    )
+                recipes.extend([recipe] * int(count))
 
             # if no valid agents were added, fall back to uniform distribution
-            if not self._agents:
-                job_counts = None
-
-        if not job_counts:
-            agents_per_job = num_agents // len(job_list)
-            leftover = num_agents % len(job_list)
-
-            for recipe in job_list:
-                for _ in range(agents_per_job):
-                    agent_cls = agent_for_job(str(recipe))
-                    self._agents.append(
-                        agent_cls(
-                            recipe,
-                            self,
-                            initial_inv=initial_inv,
-                            initial_money=initial_money,
-                        )
-                    )
-
-            for recipe in job_list[:leftover]:
-                agent_cls = agent_for_job(str(recipe))
-                self._agents.append(
-                    agent_cls(
-                        recipe,
-                        self,
-                        initial_inv=initial_inv,
-                        initial_money=initial_money,
-                    )
-                )
+            if recipes:
+                return recipes
+
+        agents_per_job = num_agents // len(job_list)
+        leftover = num_agents % len(job_list)
+
+        for recipe in job_list:
+            recipes.extend([recipe] * agents_per_job)
+
+        recipes.extend(job_list[:leftover])
+        return recipes
 
     def simulate(self, steps=1):
         """Run the market simulation for ``steps`` days."""
-        self._debug_agents()
+        self._trace_agents()
+
+        checkpoints = self._checkpoints
+        if checkpoints is not None and checkpoints.nearest(self.day_number) is None:
+            checkpoints.save(self)
 
         for _ in range(steps):
             self._run_day()
-
-        self._debug_agents()
-
-    def _debug_agents(self) -> None:
-        """Output debug information for all agents."""
+            if checkpoints is not None and checkpoints.is_due(self.day_number):
+                checkpoints.save(self)
+
+        self._trace_agents()
+
+    def state_at(self, day):
+        """Return a market as this one was at the end of ``day``.
+
+        The nearest checkpoint at or before ``day`` is loaded and the days
+        after it are replayed, which reproduces the original run exactly
+        because the market's random number generators are restored with it.
+        Neither the original run nor the replay uses the global ``random``
+        state, so other code drawing from it in between does not matter. The
+        returned market is independent of this one and keeps its history in
+        memory. Orders resting
+        in a ``ContinuousOrderBook`` are not checkpointed, so days replayed
+        with one can differ from the original.
+        """
+        if self._checkpoints is None:
+            raise ValueError("This market does not keep checkpoints")
+        if not 0 <= day <= self.day_number:
+            raise ValueError("Day {} has not been simulated".format(day))
+        start = self._checkpoints.nearest(day)
+        if start is None:
+            raise ValueError("There is no checkpoint before day {}".format(day))
+
+        market = self.load_snapshot(
+            str(self._checkpoints.path(start)),
+            book=type(self._book)(),
+            executor=self._executor,
+        )
+        market.simulate(day - start)
+        return market
+
+    def _trace_agents(self) -> None:
+        """Record the state of every agent in the trace, if there is one."""
+        trace = self._trace
+        if trace is None:
+            return
+        day = self.day_number
         for agent in self._agents:
-            dump_agent(agent)
+            trace.agent(day, agent)
 
     # -- Simulation helpers -------------------------------------------------
 
     def _run_day(self) -> None:
+        if self._perf is not None:
+            self._run_timed_day()
+            return
+
         self._open_day()
         self._collect_orders()
         daily_sd = self._resolve_all_orders()
         self._history.close_day()
         self._process_end_of_day(daily_sd)
 
+    def _run_timed_day(self) -> None:
+        """Run a day like :meth:`_run_day`, timing and counting each phase."""
+        clock = time.perf_counter
+        population = len(self._agents)
+        deaths = len(self._lifespans)
+
+        start = clock()
+        self._open_day()
+        opened = clock()
+        self._collect_orders()
+        collected = clock()
+        orders = [self._book.order_count(good) for good in goods.all()]
+        counted = clock()
+        daily_sd = self._resolve_all_orders()
+        resolved = clock()
+        self._history.close_day()
+        closed = clock()
+        self._process_end_of_day(daily_sd)
+        finished = clock()
+
+        if self._ledger is not None:
+            self._perf.count_ledger(self._ledger)
+        bankruptcies = len(self._lifespans) - deaths
+        self._perf.record_day(
+            (
+                opened - start,
+                collected - opened,
+                resolved - counted,
+                closed - resolved,
+                finished - closed,
+            ),
+            orders,
+            bankruptcies,
+            len(self._agents) - (population - bankruptcies),
+        )
+
+    def _counting_record_trade(self, day, buyer, seller, good, qty, price):
+        self._perf.count_fill(good)
+        self._history.record_trade(day, buyer, seller, good, qty, price)
+
     def _open_day(self) -> None:
         self._history.open_day()
-        self._book.clear_books()
+        self._book.open_day()
+        if self._ledger is not None:
+            self._ledger.clear()
 
     def _collect_orders(self) -> None:
+        if self._pool is not None:
+            self._pool.make_offers(self._book)
+            self._pool.do_production()
+            return
+
         for agent in self._agents:
             self._book.add_orders(agent.make_offers())
             agent.do_production()
 
     def _resolve_all_orders(self):
+        if self._pool is not None:
+            return self._resolve_pool_orders()
+        if self._executor is not None:
+            return self._resolve_all_orders_parallel()
+
         daily_sd = {}
         for good in goods.all():
             trades = self._book.resolve_orders(
                 good,
-                record_trade=self._history.record_trade,
+                record_trade=self._record_trade,
                 day=self._history.day_number,
+                ledger=self._ledger,
+            )
+            self._history.add_trades(good, trades)
+            daily_sd[good] = trades
+        self._settle_ledger()
+        return daily_sd
+
+    def _resolve_all_orders_parallel(self):
+        daily_sd = {}
+        day = self._history.day_number
+        matched = self._book.match_all(goods.all(), self._executor)
+        for good, (trades, fills) in matched:
+            self._book.settle(
+                good,
+                trades,
+                fills,
+                record_trade=self._record_trade,
+                day=day,
+                ledger=self._ledger,
+            )
+            self._history.add_trades(good, trades)
+            daily_sd[good] = trades
+        self._settle_ledger()
+        return daily_sd
+
+    def _resolve_pool_orders(self):
+        daily_sd = {}
+        ledger = self._ledger
+        views = self._pool.views
+        matched = self._book.match_all(goods.all(), self._executor)
+        for good, (trades, fills) in matched:
+            self._pool.settle(good, trades, fills)
+            if self._trace is not None:
+                self._trace.fill_arrays(
+                    self._history.day_number,
+                    good,
+                    views,
+                    fills.buyer,
+                    fills.seller,
+                    fills.qty,
+                    fills.price,
+                )
+            ledger.extend(
+                good,
+                views,
+                fills.buyer,
+                fills.seller,
+                fills.qty,
+                fills.price,
+                fills.unfilled,
+                trades.mean,
             )
             self._history.add_trades(good, trades)
             daily_sd[good] = trades
+        self._history.record_trades(self._history.day_number, ledger)
         return daily_sd
 
+    def _settle_ledger(self) -> None:
+        """Apply every fill recorded in the day's ledger."""
+        ledger = self._ledger
+        if ledger is None:
+            return
+
+        agents = ledger.agents
+        goods_ = ledger.goods
+        for agent_id, (money, bought, sold) in ledger.totals().items():
+            agents[agent_id].settle_trades(
+                money,
+                {goods_[g]: qty for g, qty in bought.items()},
+                {goods_[g]: qty for g, qty in sold.items()},
+            )
+
+        self._update_ledger_beliefs(ledger)
+        self._history.record_trades(self._history.day_number, ledger)
+
+    def _update_ledger_beliefs(self, ledger) -> None:
+        """Apply the belief updates recorded in ``ledger`` a good at a time."""
+        agents = ledger.agents
+        goods_ = ledger.goods
+        matrix = self._beliefs
+
+        if not all(agent.beliefs.matrix is matrix for agent in agents):
+            # Some agents keep their own beliefs; replay them as recorded
+            for buyer, seller, good, qty, price in ledger.trades():
+                buyer.beliefs.update(good, price)
+                seller.beliefs.update(good, price)
+            for agent_id, good_id, price in zip(
+                ledger.miss_agent, ledger.miss_good, ledger.miss_price
+            ):
+                agents[agent_id].beliefs.update(goods_[good_id], price, False)
+            return
+
+        rows = np.array([agent.beliefs.row for agent in agents], dtype=np.int64)
+        buyer, seller, good, qty, price = ledger.columns()
+        miss_agent = np.frombuffer(ledger.miss_agent, dtype=np.int64)
+        miss_good = np.frombuffer(ledger.miss_good, dtype=np.int64)
+        miss_price = np.frombuffer(ledger.miss_price, dtype=np.int64)
+
+        for good_id, good_ in enumerate(goods_):
+            # Every fill updates the buyer then the seller; unfilled orders
+            # are updated afterwards, just like the order books do
+            fills = good == good_id
+            misses = miss_good == good_id
+            traders = np.concatenate(
+                (
+                    np.column_stack((buyer[fills], seller[fills])).ravel(),
+                    miss_agent[misses],
+                )
+            )
+            prices = np.concatenate((np.repeat(price[fills], 2), miss_price[misses]))
+            success = np.arange(len(traders)) < 2 * int(fills.sum())
+            matrix.update(rows[traders], matrix.column(good_), prices, success)
+
     def _process_end_of_day(self, daily_sd) -> None:
+        if self._pool is not None:
+            self._process_pool_end_of_day(daily_sd)
+            return
+
         for agent in self._agents:
             agent.pay_tax(self._daily_tax)
             agent.advance_day()
@@ -162,39 +447,233 @@ class Market(object):
         dead_agents = [agent for agent in self._agents if agent.is_bankrupt]
         for agent in dead_agents:
             self._lifespans.append(agent.age)
+            self._book.cancel_orders(agent)
+            agent.beliefs.release()
 
         agents = [agent for agent in self._agents if not agent.is_bankrupt]
 
-        while len(agents) < len(self._agents):
-            agents.append(self._spawn_agent(daily_sd))
+        recipes = self._choose_recipes(daily_sd, len(self._agents) - len(agents))
+        for recipe in recipes:
+            agents.append(self._spawn_agent(recipe))
 
         self._agents = agents
 
-    def _spawn_agent(self, daily_sd):
-        job_weights = {}
+    def _process_pool_end_of_day(self, daily_sd) -> None:
+        pool = self._pool
+        pool.pay_tax(self._daily_tax)
+        pool.advance_day()
+
+        dead = pool.bankrupt()
+        self._lifespans.extend(pool.age[dead].tolist())
+
+        # Replacements start with the defaults, just like _spawn_agent
+        pool.spawn(
+            dead,
+            self._choose_recipes(daily_sd, len(dead)),
+            initial_inv=INITIAL_INVENTORY,
+            initial_money=INITIAL_MONEY,
+        )
+        self._agents = list(pool.views)
+
+    def _spawn_agent(self, recipe):
+        agent_cls = agent_for_job(str(recipe))
+        return agent_cls(recipe, self)
+
+    def _respawn_weights(self, daily_sd):
+        """Weight every job by how unbalanced the goods it uses or makes are."""
+        job_list = list(jobs.all())
+        index = {job: i for i, job in enumerate(job_list)}
+        weights = np.zeros(len(job_list))
 
         for good, trade in daily_sd.items():
             delta = trade.supply - trade.demand
             if delta > 0:
                 # Oversupply: favour consumers of this good
-                for job in jobs.all():
-                    if any(step.good == good for step in job.inputs):
-                        job_weights[job] = job_weights.get(job, 0) + delta
+                for job in jobs.consumers(good):
+                    weights[index[job]] += delta
             elif delta < 0:
                 # Excess demand: favour producers
-                for job in jobs.all():
-                    if any(step.good == good for step in job.outputs):
-                        job_weights[job] = job_weights.get(job, 0) + (-delta)
-
-        if job_weights:
-            choices = list(job_weights.keys())
-            weights = list(job_weights.values())
-            recipe = random.choices(choices, weights=weights, k=1)[0]
+                for job in jobs.producers(good):
+                    weights[index[job]] -= delta
+
+        return job_list, weights
+
+    def _choose_recipes(self, daily_sd, count):
+        """Pick jobs for ``count`` new agents, favouring unbalanced goods."""
+        if count <= 0:
+            return []
+
+        job_list, weights = self._respawn_weights(daily_sd)
+        if not job_list:
+            return []
+
+        if weights.any():
+            # Weighted draw through the cumulative weights; jobs without
+            # weight are never picked
+            cumulative = np.cumsum(weights)
+            draws = self._rng.random(count) * cumulative[-1]
+            chosen = np.searchsorted(cumulative, draws, side="right")
         else:
-            recipe = random.choice(list(jobs.all()))
+            chosen = self._rng.integers(len(job_list), size=count)
 
-        agent_cls = agent_for_job(str(recipe))
-        return agent_cls(recipe, self)
+        return [job_list[i] for i in chosen.tolist()]
+
+    # -- Snapshots -------------------------------------------------------------
+
+    def save_snapshot(self, path):
+        """Write the complete state of the market to ``path``.
+
+        Agents, inventories, beliefs, trade counters, lifespans, the history
+        window and the state of every random number generator are stored, so
+        a market loaded with :meth:`load_snapshot` continues exactly like
+        this one would. Orders resting in a ``ContinuousOrderBook`` are not
+        part of the snapshot.
+        """
+        if self._pool is not None:
+            agents = self._pool.get_state()
+        else:
+            agents = self._agents_state()
+            agents["beliefs"] = self._beliefs.get_state()
+
+        version, internal, gauss = self.random.getstate()
+        snapshot.write(
+            path,
+            {
+                "goods": [str(good) for good in goods.all()],
+                "jobs": [str(job) for job in jobs.all()],
+                "pool": self._pool is not None,
+                "deferred_settlement": self._ledger is not None,
+                "daily_tax": self._daily_tax,
+                "lifespans": np.array(self._lifespans, dtype=np.int64),
+                "random": [version, np.array(internal, dtype=np.uint64), gauss],
+                "rng": self._rng.bit_generator.state,
+                "history": self._history.get_state(),
+                "agents": agents,
+            },
+        )
+
+    @classmethod
+    def load_snapshot(cls, path, history=None, book=None, executor=None, trace=None):
+        """Create a market from a file written by :meth:`save_snapshot`.
+
+        Parameters
+        ----------
+        path : str
+            Snapshot file to load.
+        history : MarketHistory, optional
+            History backend to continue with, used as it is. By default an
+            in-memory ``MarketHistory`` is restored from the snapshot.
+        book : OrderBook, optional
+            Order book to use, as for :class:`Market`.
+        executor : concurrent.futures.Executor, optional
+            Pool used for parallel matching, as for :class:`Market`.
+        trace : TraceRecorder, optional
+            Event recorder, as for :class:`Market`.
+        """
+        state = snapshot.read(path)
+        if state["goods"] != [str(good) for good in goods.all()] or state["jobs"] != [
+            str(job) for job in jobs.all()
+        ]:
+            raise ValueError("{} was saved with a different catalog".format(path))
+
+        if history is None:
+            history = MarketHistory(max_depth=state["history"]["max_depth"])
+            history.set_state(state["history"])
+
+        market = cls(
+            num_agents=0,
+            history=history,
+            daily_tax=state["daily_tax"],
+            book=book,
+            executor=executor,
+            deferred_settlement=state["deferred_settlement"],
+            pool=state["pool"],
+            trace=trace,
+            # Overwritten below; saves a draw from the random module
+            seed=0,
+        )
+        market._lifespans = state["lifespans"].tolist()
+        if market._pool is not None:
+            market._pool.set_state(state["agents"])
+            market._agents = list(market._pool.views)
+        else:
+            market._restore_agents(state["agents"])
+
+        # Creating the market drew from the generators, so restore them last
+        market._rng.bit_generator.state = state["rng"]
+        version, internal, gauss = state["random"]
+        market.random.setstate((version, tuple(internal.tolist()), gauss))
+        return market
+
+    _AGENT_COLUMNS = ("money", "money_last_round", "initial_money", "age", "row")
+
+    def _agents_state(self):
+        """Gather the state of ``Agent`` objects into per-agent columns."""
+        agents = self._agents
+        job_index = {str(job): i for i, job in enumerate(jobs.all())}
+        shape = (len(agents), goods.count())
+        inventory = np.zeros(shape, dtype=np.int64)
+        bought = np.zeros(shape, dtype=np.int64)
+        sold = np.zeros(shape, dtype=np.int64)
+        tracked = np.zeros(shape, dtype=bool)
+        columns = {name: [] for name in self._AGENT_COLUMNS}
+
+        for i, agent in enumerate(agents):
+            columns["money"].append(agent.money)
+            columns["money_last_round"].append(agent.money - agent.profit)
+            columns["initial_money"].append(agent.money - agent.total_profit)
+            columns["age"].append(agent.age)
+            columns["row"].append(agent.beliefs.row)
+            for good, qty in agent._inventory.items().items():
+                inventory[i, good.id] = qty
+            for good, stats in agent.trade_stats.items():
+                bought[i, good.id] = stats["bought"]
+                sold[i, good.id] = stats["sold"]
+                tracked[i, good.id] = True
+
+        state = {name: np.array(values) for name, values in columns.items()}
+        state.update(
+            job=np.array([job_index[agent.job] for agent in agents], dtype=np.int64),
+            names=snapshot.pack_strings([agent.name for agent in agents]),
+            inventory=inventory,
+            bought=bought,
+            sold=sold,
+            tracked=tracked,
+        )
+        return state
+
+    def _restore_agents(self, state):
+        """Recreate ``Agent`` objects from :meth:`_agents_state` columns."""
+        job_list = list(jobs.all())
+        agents = [self._spawn_agent(job_list[job]) for job in state["job"].tolist()]
+        # Replace the rows the new agents took with the saved matrix
+        self._beliefs.set_state(state["beliefs"])
+
+        columns = {name: state[name].tolist() for name in self._AGENT_COLUMNS}
+        names = snapshot.unpack_strings(state["names"])
+        for i, agent in enumerate(agents):
+            holdings = {
+                goods.by_id(g): int(state["inventory"][i, g])
+                for g in np.flatnonzero(state["inventory"][i]).tolist()
+            }
+            trade_stats = {
+                goods.by_id(g): {
+                    "bought": int(state["bought"][i, g]),
+                    "sold": int(state["sold"][i, g]),
+                }
+                for g in np.flatnonzero(state["tracked"][i]).tolist()
+            }
+            agent.restore(
+                name=names[i],
+                money=columns["money"][i],
+                money_last_round=columns["money_last_round"][i],
+                initial_money=columns["initial_money"][i],
+                age=columns["age"][i],
+                holdings=holdings,
+                trade_stats=trade_stats,
+                beliefs=Beliefs(self._beliefs, columns["row"][i]),
+            )
+        self._agents = agents
 
     def make_charts(self):
         """Generate interactive charts for price and volume using Plotly."""
@@ -263,6 +742,21 @@ class Market(object):
         """Return a copy of the active agents list."""
         return list(self._agents)
 
+    @property
+    def belief_matrix(self):
+        """Belief matrix shared by every agent in the market."""
+        return self._beliefs
+
+    def perf_stats(self):
+        """Return per-phase timings and counters of an instrumented market.
+
+        See :meth:`PerfStats.report`. Returns ``None`` unless the market
+        was created with ``instrument=True``.
+        """
+        if self._perf is None:
+            return None
+        return self._perf.report()
+
     @property
     def day_number(self):
         """Current simulation day number."""
@@ -0,0 +1,313 @@
+from collections import namedtuple
+import logging
+
+import numpy as np
+
+from economy.market.book import OrderBook
+from economy.market.history import Trades
+from economy.offer import Ask, Bid
+
+logger = logging.getLogger(__name__)
+
+
+# Fills produced by matching a single good. ``buyer`` and ``seller`` are agent
+# indices into the book's agent table, ``unfilled`` lists the agents whose
+# orders were left (partially) unfilled once one side of the book ran out.
+Fills = namedtuple("Fills", ["buyer", "seller", "qty", "price", "unfilled"])
+
+
+class _OrderColumns(object):
+    """Growable column store holding one side of the book for one good."""
+
+    __slots__ = ("price", "units", "agent", "size")
+
+    def __init__(self, capacity=16):
+        self.price = np.empty(capacity, dtype=np.int64)
+        self.units = np.empty(capacity, dtype=np.int64)
+        self.agent = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, price, units, agent):
+        if self.size == len(self.price):
+            capacity = max(16, 2 * len(self.price))
+            self.price = np.resize(self.price, capacity)
+            self.units = np.resize(self.units, capacity)
+            self.agent = np.resize(self.agent, capacity)
+
+        self.price[self.size] = price
+        self.units[self.size] = units
+        self.agent[self.size] = agent
+        self.size += 1
+
+    def extend(self, price, units, agent):
+        size = self.size + len(price)
+        if size > len(self.price):
+            capacity = max(16, 2 * size)
+            self.price = np.resize(self.price, capacity)
+            self.units = np.resize(self.units, capacity)
+            self.agent = np.resize(self.agent, capacity)
+
+        self.price[self.size : size] = price
+        self.units[self.size : size] = units
+        self.agent[self.size : size] = agent
+        self.size = size
+
+    def arrays(self):
+        """Return ``(price, units, agent)`` views over the stored orders."""
+        n = self.size
+        return self.price[:n], self.units[:n], self.agent[:n]
+
+
+def match_orders(ask_price, ask_units, bid_price, bid_units, rng):
+    """Match one good's asks against its bids.
+
+    Mirrors :meth:`OrderBook.resolve_orders`: the cheapest ask is paired with
+    the most generous bid until either side runs out, orders with the same
+    price being taken in random order. Instead of popping one pair at a time
+    the fills are read off the merged cumulative unit counts of both sides.
+
+    Returns ``(ask_pos, bid_pos, qty, price, ask_left, bid_left)`` where the
+    positions index into the input arrays.
+    """
+    # A single lexsort handles both the price ordering and the random
+    # tie-break that the pure-Python book gets from shuffling first
+    ask_order = np.lexsort((rng.random(len(ask_price)), ask_price))
+    bid_order = np.lexsort((rng.random(len(bid_price)), -bid_price))
+
+    ask_cum = np.cumsum(ask_units[ask_order])
+    bid_cum = np.cumsum(bid_units[bid_order])
+
+    if not len(ask_cum) or not len(bid_cum):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, ask_order, bid_order
+
+    total = min(ask_cum[-1], bid_cum[-1])
+
+    # Every point at which either an ask or a bid is used up ends a fill
+    ends = np.union1d(ask_cum, bid_cum)
+    ends = ends[ends <= total]
+    starts = np.concatenate(([0], ends[:-1]))
+
+    ask_pos = ask_order[np.searchsorted(ask_cum, starts, side="right")]
+    bid_pos = bid_order[np.searchsorted(bid_cum, starts, side="right")]
+    qty = ends - starts
+    # np.rint rounds halves to even, just like the builtin round()
+    price = np.rint((ask_price[ask_pos] + bid_price[bid_pos]) / 2).astype(np.int64)
+
+    ask_left = ask_order[ask_cum > total]
+    bid_left = bid_order[bid_cum > total]
+
+    return ask_pos, bid_pos, qty, price, ask_left, bid_left
+
+
+def match_arrays(
+    ask_price, ask_units, ask_agent, bid_price, bid_units, bid_agent, seed
+):
+    """Match one good's order arrays and summarise the result.
+
+    Returns a ``(Trades, Fills)`` pair. This only reads its arguments, so it
+    can run on a worker thread or be shipped to a process pool.
+    """
+    rng = np.random.default_rng(seed)
+    ask_pos, bid_pos, qty, price, ask_left, bid_left = match_orders(
+        ask_price, ask_units, bid_price, bid_units, rng
+    )
+
+    units_sold = int(qty.sum())
+    if units_sold > 0:
+        low = int(price.min())
+        high = int(price.max())
+        unit_price = round(int((qty * price).sum()) / units_sold)
+        unfilled = np.concatenate((ask_agent[ask_left], bid_agent[bid_left]))
+    else:
+        low = high = unit_price = None
+        unfilled = np.empty(0, dtype=np.int64)
+
+    trades = Trades(
+        low=low,
+        high=high,
+        volume=units_sold,
+        mean=unit_price,
+        supply=int(ask_units.sum()),
+        demand=int(bid_units.sum()),
+    )
+    fills = Fills(
+        buyer=bid_agent[bid_pos],
+        seller=ask_agent[ask_pos],
+        qty=qty,
+        price=price,
+        unfilled=unfilled,
+    )
+    return trades, fills
+
+
+def _match_task(args):
+    return match_arrays(*args)
+
+
+class NumpyOrderBook(OrderBook):
+    """Order book that matches each good with vectorized NumPy operations.
+
+    Orders are stored per good as parallel price/units/agent-index arrays.
+    Pass an instance to :class:`~economy.market.market.Market` through its
+    ``book`` argument to use it in place of the pure-Python
+    :class:`OrderBook`.
+    """
+
+    def clear_books(self):
+        self._asks = {}
+        self._bids = {}
+        self._agents = []
+        self._agent_ids = {}
+
+    def add_order(self, order):
+        if isinstance(order, Ask):
+            side = self._asks
+        elif isinstance(order, Bid):
+            side = self._bids
+        else:
+            raise ValueError("Order is not an Ask or a Bid")
+
+        try:
+            agent_id = self._agent_ids[order.agent]
+        except KeyError:
+            agent_id = len(self._agents)
+            self._agent_ids[order.agent] = agent_id
+            self._agents.append(order.agent)
+
+        if order.good not in side:
+            side[order.good] = _OrderColumns()
+        side[order.good].append(order.unit_price, order.units, agent_id)
+
+    def add_arrays(self, good, price, units, agent_ids, ask):
+        """Add a batch of orders for ``good`` given as parallel arrays.
+
+        ``agent_ids`` are stored as given rather than through the book's
+        agent table, so fills refer back to whatever ids the caller uses
+        (such as slots in an ``AgentPool``). Do not mix these with
+        :meth:`add_order` on the same day.
+        """
+        side = self._asks if ask else self._bids
+        if good not in side:
+            side[good] = _OrderColumns(max(16, len(price)))
+        side[good].extend(price, units, agent_ids)
+
+    def order_count(self, good):
+        """Return the number of orders for ``good`` in the book."""
+        return sum(side[good].size for side in (self._asks, self._bids) if good in side)
+
+    def agent(self, agent_id):
+        """Return the agent referenced by ``agent_id`` in a set of fills."""
+        return self._agents[agent_id]
+
+    def _columns(self, good):
+        empty = _OrderColumns(0)
+        return (
+            self._asks.get(good, empty).arrays() + self._bids.get(good, empty).arrays()
+        )
+
+    def match(self, good, seed=None):
+        """Match the orders for ``good`` without settling them.
+
+        Returns a ``(Trades, Fills)`` pair. ``seed`` seeds the random
+        tie-break; by default it is drawn from the book's ``random``
+        generator (the market's, or the :mod:`random` module) so seeding
+        that keeps runs reproducible.
+        """
+        if seed is None:
+            seed = self.random.getrandbits(64)
+        return match_arrays(*self._columns(good), seed)
+
+    def match_all(self, goods, executor=None):
+        """Match several goods at once, optionally on an executor.
+
+        The tie-break seeds for every good are drawn up front in the order
+        given, so the returned ``[(good, (Trades, Fills)), ...]`` list is the
+        same whichever executor (and however many workers) does the work.
+        ``executor`` may be any :class:`concurrent.futures.Executor`,
+        including a process pool.
+        """
+        goods = list(goods)
+        tasks = [self._columns(good) + (self.random.getrandbits(64),) for good in goods]
+
+        if executor is None:
+            results = map(_match_task, tasks)
+        else:
+            results = executor.map(_match_task, tasks)
+
+        return list(zip(goods, results))
+
+    def settle(self, good, trades, fills, record_trade=None, day=None, ledger=None):
+        """Apply the side effects of ``fills`` to the agents involved.
+
+        With a ``ledger`` the fills are only appended to it in bulk.
+        """
+        agents = self._agents
+        trace = self.trace
+
+        if ledger is not None:
+            if trace is not None:
+                trace.fill_arrays(
+                    day, good, agents, fills.buyer, fills.seller, fills.qty, fills.price
+                )
+            ledger.extend(
+                good,
+                agents,
+                fills.buyer,
+                fills.seller,
+                fills.qty,
+                fills.price,
+                fills.unfilled,
+                trades.mean,
+            )
+            self._log_summary(good, trades)
+            return
+
+        for buyer_id, seller_id, qty, price in zip(
+            fills.buyer.tolist(),
+            fills.seller.tolist(),
+            fills.qty.tolist(),
+            fills.price.tolist(),
+        ):
+            buyer = agents[buyer_id]
+            seller = agents[seller_id]
+
+            buyer.give_money(qty * price, seller)
+            seller.give_items(good, qty, buyer)
+            buyer.record_purchase(good, qty)
+            seller.record_sale(good, qty)
+
+            if record_trade:
+                if day is not None:
+                    record_trade(day, buyer.name, seller.name, good, qty, price)
+                else:
+                    record_trade(buyer.name, seller.name, good, qty, price)
+
+            buyer.beliefs.update(good, price)
+            seller.beliefs.update(good, price)
+
+            if trace is not None:
+                trace.fill(day, good, buyer, seller, qty, price)
+
+        for agent_id in fills.unfilled.tolist():
+            agents[agent_id].beliefs.update(good, trades.mean, False)
+
+        self._log_summary(good, trades)
+
+    def _log_summary(self, good, trades):
+        if trades.volume > 0:
+            logger.info(
+                "Sold %s %s at an average price of %s",
+                trades.volume,
+                good,
+                trades.mean,
+            )
+        else:
+            logger.info("0 units of %s were traded today", good)
+
+    def resolve_orders(self, good, record_trade=None, day=None, ledger=None):
+        trades, fills = self.match(good)
+        self.settle(
+            good, trades, fills, record_trade=record_trade, day=day, ledger=ledger
+        )
+        return trades
@@ -0,0 +1,123 @@
+"""Per-phase timings and counters for the simulation day loop."""
+
+import numpy as np
+
+from economy import goods
+
+PHASES = ("open", "collect", "resolve", "close", "end_of_day")
+
+
+class PerfStats(object):
+    """Rolling timings of every day phase plus per-good order and fill counts.
+
+    The last ``window`` days are kept in fixed-size arrays, so recording a
+    day costs a handful of array writes and memory does not grow with the
+    number of days. Running totals cover the whole run.
+
+    Parameters
+    ----------
+    window : int
+        Number of recent days used for the percentiles.
+    percentiles : sequence of float
+        Percentiles of the phase timings to report.
+    """
+
+    def __init__(self, window=100, percentiles=(50, 90, 99)):
+        if window < 1:
+            raise ValueError("The window must hold at least one day")
+        self._window = window
+        self._percentiles = tuple(percentiles)
+        count = goods.count()
+        self._seconds = np.zeros((window, len(PHASES)))
+        self._orders = np.zeros((window, count), dtype=np.int64)
+        self._fills = np.zeros((window, count), dtype=np.int64)
+        self._events = np.zeros((window, 2), dtype=np.int64)
+        self._days = 0
+        self._total_seconds = np.zeros(len(PHASES))
+        self._total_orders = np.zeros(count, dtype=np.int64)
+        self._total_fills = np.zeros(count, dtype=np.int64)
+        self._total_events = np.zeros(2, dtype=np.int64)
+        self._day_fills = np.zeros(count, dtype=np.int64)
+
+    @property
+    def days(self):
+        """Number of days recorded."""
+        return self._days
+
+    def count_fill(self, good, count=1):
+        """Count fills of ``good`` for the day being simulated."""
+        self._day_fills[good.id] += count
+
+    def count_ledger(self, ledger):
+        """Count every fill in a ``TradeLedger``."""
+        if not len(ledger):
+            return
+        ids = np.array([good.id for good in ledger.goods], dtype=np.int64)
+        good = np.frombuffer(ledger.good, dtype=np.int64)
+        self._day_fills += np.bincount(ids[good], minlength=len(self._day_fills))
+
+    def record_day(self, seconds, orders, bankruptcies, spawns):
+        """Store one day's phase ``seconds`` and per-good ``orders``.
+
+        Fills counted since the previous day are stored with it.
+        """
+        slot = self._days % self._window
+        events = (bankruptcies, spawns)
+        self._seconds[slot] = seconds
+        self._orders[slot] = orders
+        self._fills[slot] = self._day_fills
+        self._events[slot] = events
+
+        self._total_seconds += seconds
+        self._total_orders += self._orders[slot]
+        self._total_fills += self._day_fills
+        self._total_events += events
+        self._day_fills[:] = 0
+        self._days += 1
+
+    def report(self):
+        """Return the statistics as nested dicts of plain numbers.
+
+        ``phases`` holds the mean, percentiles and total seconds of each
+        phase (and of the whole ``day``) over the recent window, ``goods``
+        the orders and fills per good.
+        """
+        recent = min(self._days, self._window)
+        seconds = self._seconds[:recent]
+        columns = np.column_stack([seconds, seconds.sum(axis=1)])
+        totals = list(self._total_seconds) + [self._total_seconds.sum()]
+
+        phases = {}
+        for i, name in enumerate(PHASES + ("day",)):
+            column = columns[:, i]
+            stats = {"total": float(totals[i])}
+            if recent:
+                stats["mean"] = float(column.mean())
+                for level in self._percentiles:
+                    stats["p{:g}".format(level)] = float(np.percentile(column, level))
+            phases[name] = stats
+
+        orders = self._orders[:recent]
+        fills = self._fills[:recent]
+        goods_stats = {}
+        for good in goods.all():
+            goods_stats[str(good)] = {
+                "orders": int(self._total_orders[good.id]),
+                "fills": int(self._total_fills[good.id]),
+                "orders_per_day": float(orders[:, good.id].mean()) if recent else 0.0,
+                "fills_per_day": float(fills[:, good.id].mean()) if recent else 0.0,
+            }
+
+        day_seconds = columns[:, -1].sum()
+        events = self._events[:recent].mean(axis=0) if recent else (0.0, 0.0)
+        return {
+            "days": self._days,
+            "window": recent,
+            "days_per_second": float(recent / day_seconds) if day_seconds else 0.0,
+            "phases": phases,
+            "goods": goods_stats,
+            "bankruptcies": int(self._total_events[0]),
+            "spawns": int(self._total_events[1]),
+            "bankruptcies_per_day": float(events[0]),
+            "spawns_per_day": float(events[1]),
+        }
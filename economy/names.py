@@ -1,8 +1,30 @@
-import os
-import yaml
+"""Agent name lists, read from ``names.yml`` the first time they are needed."""
 
-with open(os.path.join("data", "names.yml")) as fh:
-    data = yaml.safe_load(fh)
+import random
 
-FIRST_NAMES = data.get("first_names", [])
-LAST_NAMES = data.get("last_names", [])
+from . import catalog
+
+
+def first_names():
+    return catalog.names()["first_names"]
+
+
+def last_names():
+    return catalog.names()["last_names"]
+
+
+def random_name(rng=random):
+    """Return a random "First Last" name for a new agent.
+
+    ``rng`` is the ``random.Random`` to draw from, by default the module.
+    """
+    return f"{rng.choice(first_names())} {rng.choice(last_names())}"
+
+
+def __getattr__(name):
+    # FIRST_NAMES and LAST_NAMES used to be module constants
+    if name == "FIRST_NAMES":
+        return first_names()
+    if name == "LAST_NAMES":
+        return last_names()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,400 @@
+import random
+
+import numpy as np
+
+from . import goods, jobs
+from .agent import Agent
+from .beliefs import BeliefMatrix, Beliefs
+from .market import snapshot
+from .names import random_name
+from .offer import MIN_PRICE
+from config import INITIAL_INVENTORY, INITIAL_MONEY
+
+
+class _JobPlan(object):
+    """A job's recipe expressed as good indices for array operations."""
+
+    __slots__ = ("recipe", "inputs", "outputs", "tools", "limit", "immortal")
+
+    def __init__(self, recipe, good_ids):
+        self.recipe = recipe
+        self.inputs = [(good_ids[s.good], s.qty) for s in recipe.inputs]
+        self.outputs = [(good_ids[s.good], s.qty) for s in recipe.outputs]
+        self.tools = [(good_ids[t.tool], t.qty, t.break_chance) for t in recipe.tools]
+        self.limit = recipe.limit
+        # Mirrors the "harvesters"/"consumers" hack in Agent.is_bankrupt
+        self.immortal = len(recipe.inputs + recipe.outputs) <= 1
+
+
+class AgentPool(object):
+    """Struct-of-arrays population of agents.
+
+    Money, age, job, inventory, beliefs and trade counters live in dense
+    NumPy arrays indexed by agent id, so offers, production, tax and
+    bankruptcy run as array operations per job rather than as method calls
+    per agent. A slot freed by a bankrupt agent is reused by its
+    replacement. :class:`AgentView` objects expose single agents through the
+    usual :class:`~economy.agent.Agent` read API.
+
+    Custom agent classes registered through plugins are not used by the
+    pool; every agent follows the stock :class:`Agent` behaviour.
+    """
+
+    INVENTORY_SIZE = Agent.INVENTORY_SIZE
+
+    def __init__(
+        self,
+        recipes,
+        market,
+        initial_inv=INITIAL_INVENTORY,
+        initial_money=INITIAL_MONEY,
+    ):
+        self._market = market
+        self._initial_inv = initial_inv
+        self._initial_money = initial_money
+        self._random = getattr(market, "random", random)
+        self._rng = np.random.default_rng(self._random.getrandbits(64))
+
+        self._goods = list(goods.all())
+        self._good_ids = {good: i for i, good in enumerate(self._goods)}
+        self._jobs = list(jobs.all())
+        self._job_ids = {job: i for i, job in enumerate(self._jobs)}
+        self._plans = [_JobPlan(job, self._good_ids) for job in self._jobs]
+        self._immortal = np.array([p.immortal for p in self._plans], dtype=bool)
+
+        n = len(recipes)
+        n_goods = len(self._goods)
+        self.money = np.zeros(n, dtype=np.int64)
+        self.money_last_round = np.zeros(n, dtype=np.int64)
+        self.initial_money = np.zeros(n, dtype=np.int64)
+        self.age = np.zeros(n, dtype=np.int64)
+        self.job = np.zeros(n, dtype=np.int64)
+        self.inventory = np.zeros((n, n_goods), dtype=np.int64)
+        self.beliefs = BeliefMatrix(rows=n, source=self._random)
+        self.bought = np.zeros((n, n_goods), dtype=np.int64)
+        self.sold = np.zeros((n, n_goods), dtype=np.int64)
+        self.names = [None] * n
+        self.views = [None] * n
+
+        self.spawn(np.arange(n), recipes)
+
+    def __len__(self):
+        return len(self.money)
+
+    # -- Population management ----------------------------------------------
+
+    def spawn(self, ids, recipes, initial_inv=None, initial_money=None):
+        """Fill the slots ``ids`` with brand new agents doing ``recipes``."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if initial_inv is None:
+            initial_inv = self._initial_inv
+        if initial_money is None:
+            initial_money = self._initial_money
+
+        self.money[ids] = initial_money
+        self.money_last_round[ids] = initial_money
+        self.initial_money[ids] = initial_money
+        self.age[ids] = 0
+        self.inventory[ids] = 0
+        self.bought[ids] = 0
+        self.sold[ids] = 0
+
+        self.beliefs.reset(ids)
+
+        for agent_id, recipe in zip(ids.tolist(), recipes):
+            self.job[agent_id] = self._job_ids[recipe]
+            self.names[agent_id] = random_name(self._random)
+            self.views[agent_id] = AgentView(self, agent_id)
+
+        for job_id, plan in enumerate(self._plans):
+            members = ids[self.job[ids] == job_id]
+            if not len(members):
+                continue
+            steps = plan.inputs + plan.outputs
+            qty = round(initial_inv / len(steps))
+            for good_id, _ in steps:
+                self.inventory[members, good_id] = qty
+            for good_id, tool_qty, _ in plan.tools:
+                self.inventory[members, good_id] = tool_qty
+            if self.inventory[members[0]].sum() > self.INVENTORY_SIZE:
+                raise ValueError("Not enough room in inventory for starting stock")
+
+    def members(self):
+        """Yield ``(plan, agent_ids)`` for every job with agents."""
+        order = np.argsort(self.job, kind="stable")
+        bounds = np.searchsorted(self.job[order], np.arange(len(self._plans) + 1))
+        for job_id, plan in enumerate(self._plans):
+            ids = order[bounds[job_id] : bounds[job_id + 1]]
+            if len(ids):
+                yield plan, ids
+
+    def free_space(self, ids):
+        return self.INVENTORY_SIZE - self.inventory[ids].sum(axis=1)
+
+    # -- Snapshots -------------------------------------------------------------
+
+    _STATE_ARRAYS = (
+        "money",
+        "money_last_round",
+        "initial_money",
+        "age",
+        "job",
+        "inventory",
+        "bought",
+        "sold",
+    )
+
+    def get_state(self):
+        """Return the whole population as arrays and plain values."""
+        state = {name: getattr(self, name) for name in self._STATE_ARRAYS}
+        state.update(
+            goods=[str(good) for good in self._goods],
+            jobs=[str(job) for job in self._jobs],
+            names=snapshot.pack_strings(self.names),
+            beliefs=self.beliefs.get_state(),
+            rng=self._rng.bit_generator.state,
+        )
+        return state
+
+    def set_state(self, state):
+        """Replace the whole population with a :meth:`get_state` result."""
+        if state["goods"] != [str(good) for good in self._goods] or state["jobs"] != [
+            str(job) for job in self._jobs
+        ]:
+            raise ValueError("The state was saved with a different catalog")
+
+        for name in self._STATE_ARRAYS:
+            setattr(self, name, np.array(state[name]))
+        self.names = snapshot.unpack_strings(state["names"])
+        self.views = [AgentView(self, agent_id) for agent_id in range(len(self))]
+        self.beliefs.set_state(state["beliefs"])
+        self._rng.bit_generator.state = state["rng"]
+
+    # -- Daily phases --------------------------------------------------------
+
+    def make_offers(self, book):
+        """Place every agent's asks and bids on a ``NumpyOrderBook``."""
+        self.money_last_round[:] = self.money
+
+        ratios = {}
+        for good_id, good in enumerate(self._goods):
+            ratios[good_id] = self._market.aggregate(good)[3]
+
+        for plan, ids in self.members():
+            space = self.free_space(ids)
+
+            for good_id, _ in plan.inputs:
+                qty = self._trade_quantity(ratios[good_id], space, buying=True)
+                self._offer(book, good_id, ids, qty, ask=False)
+
+            for good_id, _ in plan.outputs:
+                qty = self._trade_quantity(
+                    ratios[good_id], self.inventory[ids, good_id]
+                )
+                self._offer(book, good_id, ids, qty, ask=True)
+
+            for good_id, tool_qty, _ in plan.tools:
+                qty = np.maximum(tool_qty - self.inventory[ids, good_id], 0)
+                self._offer(book, good_id, ids, qty, ask=False)
+
+    def _trade_quantity(self, ratio, base_qty, buying=False):
+        if ratio is None:
+            ratio = 0.75
+        elif buying:
+            ratio = 1 - ratio
+
+        qty = np.maximum(1, np.rint(base_qty * ratio)).astype(np.int64)
+        return np.where(base_qty > 0, qty, 0)
+
+    def _offer(self, book, good_id, ids, qty, ask):
+        placed = qty > 0
+        ids = ids[placed]
+        if not len(ids):
+            return
+        price = self.choose_prices(ids, good_id)
+        book.add_arrays(self._goods[good_id], price, qty[placed], ids, ask=ask)
+
+    def choose_prices(self, ids, good_id):
+        price = self.beliefs.choose_prices(
+            ids, self.beliefs.column(self._goods[good_id])
+        )
+        return np.maximum(price, MIN_PRICE)
+
+    def do_production(self):
+        for plan, ids in self.members():
+            runs = 0
+            while len(ids) and (plan.limit is None or runs < plan.limit):
+                ids = ids[self._can_produce(plan, ids)]
+                for good_id, qty in plan.inputs:
+                    self.inventory[ids, good_id] -= qty
+                for good_id, qty in plan.outputs:
+                    self.inventory[ids, good_id] += qty
+                for good_id, _, chance in plan.tools:
+                    broken = self._rng.random(len(ids)) < chance
+                    self.inventory[ids[broken], good_id] -= 1
+                runs += 1
+
+    def _can_produce(self, plan, ids):
+        space = self.free_space(ids)
+        ok = np.ones(len(ids), dtype=bool)
+
+        for good_id, qty in plan.inputs:
+            ok &= self.inventory[ids, good_id] >= qty
+            space += qty
+
+        for good_id, qty in plan.outputs:
+            space -= qty
+        ok &= space >= 0
+
+        for good_id, qty, _ in plan.tools:
+            ok &= self.inventory[ids, good_id] >= qty
+
+        return ok
+
+    def settle(self, good, trades, fills):
+        """Apply the fills for ``good`` from a ``NumpyOrderBook`` match."""
+        good_id = self._good_ids[good]
+        buyer, seller, qty = fills.buyer, fills.seller, fills.qty
+        value = qty * fills.price
+
+        np.add.at(self.money, seller, value)
+        np.subtract.at(self.money, buyer, value)
+        np.add.at(self.inventory[:, good_id], buyer, qty)
+        np.subtract.at(self.inventory[:, good_id], seller, qty)
+        np.add.at(self.bought[:, good_id], buyer, qty)
+        np.add.at(self.sold[:, good_id], seller, qty)
+
+        # Buyer then seller for every fill, then the unfilled orders, just
+        # like the order books
+        traders = np.concatenate(
+            (np.column_stack((buyer, seller)).ravel(), fills.unfilled)
+        )
+        prices = np.concatenate(
+            (np.repeat(fills.price, 2), np.full(len(fills.unfilled), trades.mean or 0))
+        )
+        success = np.arange(len(traders)) < 2 * len(qty)
+        self.beliefs.update(traders, self.beliefs.column(good), prices, success)
+
+    def pay_tax(self, amount):
+        self.money -= amount
+
+    def advance_day(self):
+        self.age += 1
+
+    def bankrupt(self):
+        """Return the ids of agents that have run out of money."""
+        return np.flatnonzero((self.money <= 0) & ~self._immortal[self.job])
+
+    # -- Views ----------------------------------------------------------------
+
+    def recipe(self, agent_id):
+        return self._jobs[self.job[agent_id]]
+
+    def good(self, good_id):
+        return self._goods[good_id]
+
+    def good_id(self, good):
+        return self._good_ids[good]
+
+
+class _InventoryView(object):
+    """Read-only stand-in for an agent's :class:`Inventory`."""
+
+    __slots__ = ("_pool", "_id")
+
+    def __init__(self, pool, agent_id):
+        self._pool = pool
+        self._id = agent_id
+
+    @property
+    def _items(self):
+        return self.items()
+
+    def items(self):
+        row = self._pool.inventory[self._id]
+        return {self._pool.good(g): int(row[g]) for g in np.flatnonzero(row).tolist()}
+
+    def query_inventory(self, item=None):
+        row = self._pool.inventory[self._id]
+        if item is None:
+            return int(row.sum())
+        return int(row[self._pool.good_id(item)])
+
+    def available_space(self):
+        return self._pool.INVENTORY_SIZE - self.query_inventory()
+
+
+class AgentView(object):
+    """Thin read-only view of a single agent stored in an :class:`AgentPool`."""
+
+    __slots__ = ("_pool", "_id", "__weakref__")
+
+    def __init__(self, pool, agent_id):
+        self._pool = pool
+        self._id = agent_id
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def job(self):
+        return str(self._pool.recipe(self._id))
+
+    @property
+    def name(self):
+        return self._pool.names[self._id]
+
+    @property
+    def money(self):
+        return int(self._pool.money[self._id])
+
+    @property
+    def age(self):
+        return int(self._pool.age[self._id])
+
+    @property
+    def total_profit(self):
+        return self.money - int(self._pool.initial_money[self._id])
+
+    @property
+    def profit(self):
+        return self.money - int(self._pool.money_last_round[self._id])
+
+    @property
+    def is_bankrupt(self):
+        pool = self._pool
+        if pool._immortal[pool.job[self._id]]:
+            return False
+        return bool(pool.money[self._id] <= 0)
+
+    @property
+    def beliefs(self):
+        return Beliefs(self._pool.beliefs, self._id)
+
+    @property
+    def _inventory(self):
+        return _InventoryView(self._pool, self._id)
+
+    def holding(self, good):
+        return self._inventory.query_inventory(good)
+
+    def free_space(self):
+        return self._inventory.available_space()
+
+    @property
+    def trade_stats(self):
+        bought = self._pool.bought[self._id]
+        sold = self._pool.sold[self._id]
+        return {
+            self._pool.good(g): {"bought": int(bought[g]), "sold": int(sold[g])}
+            for g in np.flatnonzero(bought + sold).tolist()
+        }
+
+    @property
+    def trade_totals(self):
+        """Return total units bought and sold across all goods."""
+        return {
+            "bought": int(self._pool.bought[self._id].sum()),
+            "sold": int(self._pool.sold[self._id].sum()),
+        }
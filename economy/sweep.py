@@ -0,0 +1,269 @@
+"""Parameter sweeps over the market configuration.
+
+A sweep runs one seeded market per point of a grid (:func:`grid`) or of a
+random search (:func:`random_points`) on a process pool. Each finished point
+is appended to a :class:`ResultsStore`, a JSON lines file, and points already
+in the store are skipped, so an interrupted sweep picks up where it stopped.
+"""
+
+import concurrent.futures
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .agent import Agent
+from .market.history import MarketHistory
+from .pool import AgentPool
+
+logger = logging.getLogger(__name__)
+
+# Market settings a sweep can vary
+PARAMETERS = (
+    "initial_money",
+    "initial_inv",
+    "inventory_size",
+    "daily_tax",
+    "job_counts",
+)
+
+
+def grid(**values):
+    """Return every combination of the given parameter values.
+
+    ``grid(daily_tax=[0, 1], initial_money=[50, 100])`` gives four points.
+    """
+    _check_names(values)
+    names = sorted(values)
+    return [
+        dict(zip(names, combination))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+def random_points(count, seed=None, **ranges):
+    """Return ``count`` random points.
+
+    Each range is either a ``(low, high)`` tuple of integers, drawn
+    uniformly with both ends included, or a list of values to choose from
+    (e.g. several ``job_counts`` mappings).
+    """
+    _check_names(ranges)
+    rng = random.Random(seed)
+    points = []
+    for _ in range(count):
+        point = {}
+        for name in sorted(ranges):
+            spec = ranges[name]
+            if isinstance(spec, tuple):
+                point[name] = rng.randint(*spec)
+            else:
+                point[name] = rng.choice(spec)
+        points.append(point)
+    return points
+
+
+def _check_names(values):
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError("Unknown sweep parameters: {}".format(sorted(unknown)))
+
+
+def point_key(point, seed):
+    """Return a string identifying a run of ``point`` with ``seed``."""
+    return json.dumps({"point": point, "seed": seed}, sort_keys=True)
+
+
+class ResultsStore(object):
+    """Append-only JSON lines file of finished sweep points.
+
+    A last line cut short by an interruption is ignored when reading and cut
+    off before the next record is appended.
+
+    Parameters
+    ----------
+    path : str
+        File to append to. Created when the first result is added.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._repaired = False
+
+    def records(self):
+        """Return every stored record, oldest first."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path) as fh:
+            for number, line in enumerate(fh, 1):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping damaged line %s of %s", number, self.path)
+        return records
+
+    def completed(self):
+        """Return the keys of the runs already stored."""
+        return {point_key(r["point"], r["seed"]) for r in self.records()}
+
+    def add(self, record):
+        if not self._repaired:
+            self._drop_partial_line()
+            self._repaired = True
+        with open(self.path, "a") as fh:
+            fh.write(json.dumps(record) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _drop_partial_line(self):
+        """Truncate the file after its last newline."""
+        try:
+            fh = open(self.path, "rb+")
+        except FileNotFoundError:
+            return
+        with fh:
+            end = pos = fh.seek(0, os.SEEK_END)
+            while pos > 0:
+                size = min(4096, pos)
+                pos -= size
+                fh.seek(pos)
+                chunk = fh.read(size)
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    break
+            else:
+                newline = -1
+            keep = pos + newline + 1
+            if keep < end:
+                logger.warning("Dropping an incomplete record from %s", self.path)
+                fh.truncate(keep)
+
+
+@contextmanager
+def _inventory_size(size):
+    """Temporarily change the inventory capacity of every agent."""
+    saved = Agent.INVENTORY_SIZE, AgentPool.INVENTORY_SIZE
+    if size is not None:
+        Agent.INVENTORY_SIZE = AgentPool.INVENTORY_SIZE = size
+    try:
+        yield
+    finally:
+        Agent.INVENTORY_SIZE, AgentPool.INVENTORY_SIZE = saved
+
+
+def run_point(point, days, seed=0, market_kwargs=None):
+    """Simulate one sweep point and return its record.
+
+    Settings the market rejects (e.g. a starting inventory that does not fit
+    ``inventory_size``) give a record with an ``error`` instead of results.
+    """
+    from .market.market import Market
+
+    kwargs = dict(market_kwargs or {})
+    kwargs.setdefault("history", MarketHistory())
+    kwargs.update((k, v) for k, v in point.items() if k != "inventory_size")
+    record = {"point": point, "seed": seed, "days": days, "worker": os.getpid()}
+
+    saved = random.getstate()
+    random.seed(seed)
+    start = time.perf_counter()
+    volume = 0
+    try:
+        with _inventory_size(point.get("inventory_size")):
+            market = Market(**kwargs)
+            for _ in range(days):
+                market.simulate(1)
+                volume += sum(
+                    np.nan_to_num(view.array[-1, 0])
+                    for view in market.history(1).values()
+                )
+    except ValueError as exc:
+        record.update(seconds=time.perf_counter() - start, error=str(exc))
+        return record
+    finally:
+        random.setstate(saved)
+    record["seconds"] = time.perf_counter() - start
+
+    money = [agent.money for agent in market.agents]
+    record["results"] = dict(
+        market.overview_stats(),
+        mean_money=float(np.mean(money)) if money else 0.0,
+        total_volume=int(volume),
+    )
+    return record
+
+
+def run_sweep(points, days, store, seed=0, workers=None, **market_kwargs):
+    """Run every point not yet in ``store`` and return per-worker throughput.
+
+    Parameters
+    ----------
+    points : list of dict
+        Points from :func:`grid` or :func:`random_points`.
+    days : int
+        Number of days to simulate per point.
+    store : ResultsStore
+        Where finished points are recorded as soon as they complete.
+    seed : int
+        Seed used for every point, so points differ only in their settings.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs; ``0``
+        runs every point in the calling process.
+    **market_kwargs
+        Passed on to :class:`Market`, e.g. ``num_agents``.
+
+    Returns
+    -------
+    dict
+        ``{worker pid: {"points": n, "days": d, "seconds": s,
+        "days_per_second": r}}`` for the points run by this call. Failed
+        points count towards ``points`` and ``seconds`` only.
+    """
+    done = store.completed()
+    todo = [point for point in points if point_key(point, seed) not in done]
+    if len(todo) < len(points):
+        logger.info("Skipping %s completed points", len(points) - len(todo))
+
+    throughput = {}
+
+    def record(result):
+        store.add(result)
+        stats = throughput.setdefault(
+            result["worker"], {"points": 0, "days": 0, "seconds": 0.0}
+        )
+        stats["points"] += 1
+        stats["seconds"] += result["seconds"]
+        if "error" in result:
+            logger.warning("Point %s failed: %s", result["point"], result["error"])
+        else:
+            stats["days"] += result["days"]
+
+    if workers == 0:
+        for point in todo:
+            record(run_point(point, days, seed, market_kwargs))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(run_point, point, days, seed, market_kwargs)
+                for point in todo
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                record(future.result())
+
+    for worker, stats in sorted(throughput.items()):
+        seconds = stats["seconds"]
+        stats["days_per_second"] = stats["days"] / seconds if seconds else 0.0
+        logger.info(
+            "Worker %s: %s points, %.1f days/s",
+            worker,
+            stats["points"],
+            stats["days_per_second"],
+        )
+    return throughput
@@ -0,0 +1,180 @@
+"""Structured event tracing for the simulation.
+
+A :class:`TraceRecorder` stores typed events (fills, agent states and their
+holdings) as rows of integers in a preallocated ring buffer, so recording an
+event is a few array writes and nothing is formatted. Each kind of event can
+be sampled at its own rate. Hand a recorder to ``Market(trace=...)``; without
+one no events are built at all.
+
+Agents are referenced by an index into a table of their names, given out per
+agent rather than per name as generated names repeat, and goods by their
+catalog id. :meth:`TraceRecorder.dump` writes the events and both tables to a
+compact binary file (see :mod:`economy.market.snapshot`) that
+:func:`load_trace` reads back.
+"""
+
+import random
+import weakref
+
+import numpy as np
+
+from . import goods
+from .market import snapshot
+
+KINDS = ("fill", "agent", "holding")
+FILL, AGENT, HOLDING = range(len(KINDS))
+
+# Meaning of the columns for each kind:
+#   fill:    agent = buyer, other = seller, qty and price of the fill
+#   agent:   other = job index, qty = age, price = money
+#   holding: good and qty held by the agent
+COLUMNS = ("kind", "day", "good", "agent", "other", "qty", "price")
+
+
+class TraceRecorder(object):
+    """Ring buffer of simulation events.
+
+    Once ``capacity`` events have been recorded the oldest are overwritten.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of events kept.
+    sample_rates : dict, optional
+        Fraction of events to keep per kind, e.g. ``{"fill": 0.01}``.
+        Kinds not listed are always recorded; a rate of 0 disables a kind.
+    seed : int, optional
+        Seed for sampling. Sampling never touches the global ``random``
+        state, so tracing does not change the simulation.
+    """
+
+    def __init__(self, capacity=65536, sample_rates=None, seed=None):
+        if capacity < 1:
+            raise ValueError("The trace must hold at least one event")
+        rates = dict.fromkeys(KINDS, 1.0)
+        for kind, rate in (sample_rates or {}).items():
+            if kind not in rates:
+                raise ValueError("Unknown event kind {!r}".format(kind))
+            if not 0 <= rate <= 1:
+                raise ValueError("Sample rates must be between 0 and 1")
+            rates[kind] = float(rate)
+        self._rates = [rates[kind] for kind in KINDS]
+        self._random = random.Random(seed)
+        self._events = np.zeros((capacity, len(COLUMNS)), dtype=np.int64)
+        self._recorded = 0
+        self._names = []
+        # Weak, so dead agents are not kept alive by the trace
+        self._agent_ids = weakref.WeakKeyDictionary()
+        self._job_ids = {}
+
+    def __len__(self):
+        return min(self._recorded, len(self._events))
+
+    @property
+    def recorded(self):
+        """Number of events recorded, including any overwritten since."""
+        return self._recorded
+
+    def wants(self, kind):
+        """Return whether events of ``kind`` are recorded at all."""
+        return self._rates[kind] > 0
+
+    def sample(self, kind):
+        """Decide whether to record one event of ``kind``."""
+        rate = self._rates[kind]
+        return rate >= 1 or (rate > 0 and self._random.random() < rate)
+
+    def record(self, kind, day, good=-1, agent=-1, other=-1, qty=0, price=0):
+        """Store one event unconditionally."""
+        row = self._events[self._recorded % len(self._events)]
+        row[:] = (kind, day, good, agent, other, qty, price)
+        self._recorded += 1
+
+    def agent_id(self, agent):
+        """Return the index of ``agent`` in the name table.
+
+        Every agent gets its own index, even when its name is taken.
+        """
+        try:
+            return self._agent_ids[agent]
+        except KeyError:
+            agent_id = self._agent_ids[agent] = len(self._names)
+            self._names.append(agent.name)
+            return agent_id
+
+    def fill(self, day, good, buyer, seller, qty, price):
+        """Record a fill between two agents if it is sampled."""
+        if self.sample(FILL):
+            self.record(
+                FILL,
+                -1 if day is None else day,
+                good.id,
+                self.agent_id(buyer),
+                self.agent_id(seller),
+                qty,
+                price,
+            )
+
+    def fill_arrays(self, day, good, agents, buyer, seller, qty, price):
+        """Record sampled fills given as arrays indexing into ``agents``."""
+        if not self.wants(FILL):
+            return
+        for buyer_id, seller_id, units, unit_price in zip(
+            buyer.tolist(), seller.tolist(), qty.tolist(), price.tolist()
+        ):
+            self.fill(day, good, agents[buyer_id], agents[seller_id], units, unit_price)
+
+    def agent(self, day, agent):
+        """Record an agent's state and holdings if it is sampled."""
+        if not self.sample(AGENT):
+            return
+        agent_id = self.agent_id(agent)
+        try:
+            job = self._job_ids[agent.job]
+        except KeyError:
+            job = self._job_ids[agent.job] = len(self._job_ids)
+        self.record(AGENT, day, -1, agent_id, job, agent.age, round(agent.money))
+        if self._rates[HOLDING] > 0:
+            for item, qty in agent._inventory.items().items():
+                good = getattr(item, "id", -1)
+                if self.sample(HOLDING):
+                    self.record(HOLDING, day, good, agent_id, -1, qty)
+
+    def events(self):
+        """Return the kept events, oldest first, as an ``events x columns`` array."""
+        capacity = len(self._events)
+        if self._recorded <= capacity:
+            return self._events[: self._recorded].copy()
+        start = self._recorded % capacity
+        return np.concatenate([self._events[start:], self._events[:start]])
+
+    def clear(self):
+        """Forget every event, keeping the name tables."""
+        self._recorded = 0
+
+    def dump(self, path):
+        """Write the kept events and lookup tables to ``path``."""
+        snapshot.write(
+            path,
+            {
+                "kinds": list(KINDS),
+                "columns": list(COLUMNS),
+                "recorded": self._recorded,
+                "goods": [str(good) for good in goods.all()],
+                "jobs": list(self._job_ids),
+                "agents": snapshot.pack_strings(self._names),
+                "events": self.events(),
+            },
+        )
+
+
+def load_trace(path):
+    """Read a file written by :meth:`TraceRecorder.dump`.
+
+    Returns a dict with the ``events`` array (memory-mapped), the
+    ``columns``, ``kinds``, ``goods`` and ``jobs`` tables, the list of
+    ``agents`` names and the total number of events ``recorded``.
+    """
+    trace = snapshot.read(path)
+    trace["agents"] = snapshot.unpack_strings(trace["agents"])
+    return trace
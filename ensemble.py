@@ -0,0 +1,61 @@
+import argparse
+import json
+import logging
+
+from economy.ensemble import run_ensemble
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run many seeded replicates of one market configuration"
+    )
+    parser.add_argument(
+        "--replicates", type=int, default=100, help="Number of runs (default: 100)"
+    )
+    parser.add_argument(
+        "--days", type=int, default=30, help="Days per run (default: 30)"
+    )
+    parser.add_argument(
+        "--num-agents", type=int, default=15, help="Agents per market (default: 15)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first run")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes (default: one per CPU, 0 runs in this process)",
+    )
+    parser.add_argument(
+        "--pool", action="store_true", help="Store agents in an AgentPool"
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=float,
+        nargs="+",
+        default=[5, 50, 95],
+        help="Percentile bands to report (default: 5 50 95)",
+    )
+    parser.add_argument(
+        "--output", default="ensemble.json", help="JSON file for the results"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    ensemble = run_ensemble(
+        args.replicates,
+        args.days,
+        seed=args.seed,
+        workers=args.workers,
+        percentiles=args.percentiles,
+        num_agents=args.num_agents,
+        pool=args.pool,
+    )
+    with open(args.output, "w") as fh:
+        json.dump(ensemble.to_dict(), fh)
+    logger.info("Wrote %s replicates to %s.", ensemble.count, args.output)
+
+
+if __name__ == "__main__":
+    main()
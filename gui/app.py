@@ -1,12 +1,40 @@
-from flask import Flask, Blueprint, render_template, request, jsonify
+import base64
+import json
+import threading
+import time
+
+from flask import (
+    Flask,
+    Blueprint,
+    Response,
+    g,
+    render_template,
+    request,
+    jsonify,
+    url_for,
+)
 
-from .schemas import ma, SimulationResultSchema, OverviewSchema, AgentDetailSchema
+from .schemas import (
+    ma,
+    SimulationResultSchema,
+    OverviewSchema,
+    AgentDetailSchema,
+    HistoryPageSchema,
+)
 
 from .forms import SimulationForm
+from . import metrics, tasks
 
 from economy.db import init_app as init_db
 
-from config import DB_PATH, INITIAL_MONEY, INITIAL_INVENTORY
+from config import (
+    DB_PATH,
+    INITIAL_MONEY,
+    INITIAL_INVENTORY,
+    CHECKPOINT_EVERY,
+    TASK_WORKERS,
+    TASK_MAX_SECONDS,
+)
 
 # Ensure the project root is on the Python path when running this module
 # directly (e.g. `python gui/app.py`). This allows imports like
@@ -20,19 +48,60 @@ if __package__ is None:  # pragma: no cover - executed only when run directly
     if str(project_root) not in sys.path:
         sys.path.insert(0, str(project_root))
 
-from economy import Market, SQLiteHistory, jobs, rebuild_database
+from economy import Market, SQLiteHistory, goods, jobs, rebuild_database
+from economy.market import Checkpoints
 
 # Blueprint for all routes
 bp = Blueprint("market", __name__)
 
 # Persistent simulation support
-_history = SQLiteHistory(DB_PATH)
+_history = SQLiteHistory(DB_PATH, write_observer=metrics.db_writes.observe)
+# Checkpoints of an earlier process belong to a different population
+_checkpoints = Checkpoints(DB_PATH + ".checkpoints", every=CHECKPOINT_EVERY)
+_checkpoints.clear()
 _persistent_market = Market(
     num_agents=9,
     history=_history,
     initial_inv=INITIAL_INVENTORY,
     initial_money=INITIAL_MONEY,
+    checkpoints=_checkpoints,
+    instrument=True,
 )
+# Held while the persistent market simulates a day or is replaced
+_market_lock = threading.Lock()
+_tasks = tasks.TaskQueue(workers=TASK_WORKERS, max_seconds=TASK_MAX_SECONDS or None)
+# Merge key of the task stepping the persistent market
+STEP = "step"
+# Daily summaries per page of GET /history
+HISTORY_PAGE = 1000
+HISTORY_MAX_PAGE = 10000
+
+
+@bp.before_app_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@bp.after_app_request
+def _record_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        metrics.requests.observe(
+            time.perf_counter() - start,
+            request.endpoint or "unknown",
+            request.method,
+            response.status_code,
+        )
+    return response
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Expose operational metrics in the Prometheus text format."""
+    return Response(
+        metrics.render(_persistent_market),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
 
 @bp.route("/", methods=["GET", "POST"])
@@ -50,6 +119,11 @@ def index():
             initial_money = int(data.get("initial_money", INITIAL_MONEY))
             initial_inv = int(data.get("initial_inv", INITIAL_INVENTORY))
             job_counts = data.get("job_counts", {})
+            background = bool(data.get("background", False))
+            try:
+                max_seconds = _max_seconds(data)
+            except ValueError as exc:
+                return (str(exc), 400)
         else:
             form.process(request.form)
             if form.validate():
@@ -63,15 +137,23 @@ def index():
                     count = getattr(form, f"job_{slug}").data
                     if count and count > 0:
                         job_counts[j] = count
+                background = False
             else:
                 return render_template("index.html", form=form, job_fields=job_fields)
 
-        market = Market(
-            num_agents=num_agents,
-            job_counts=job_counts,
-            initial_inv=initial_inv,
-            initial_money=initial_money,
-        )
+        def build():
+            return Market(
+                num_agents=num_agents,
+                job_counts=job_counts,
+                initial_inv=initial_inv,
+                initial_money=initial_money,
+            )
+
+        if background:
+            task = _tasks.submit(build, days, _compile_results, max_seconds)
+            return _task_accepted(task)
+
+        market = build()
         market.simulate(days)
 
         data = _compile_results(market)
@@ -84,7 +166,10 @@ def index():
             return schema.jsonify(data)
         data = schema.dump(data)
         return render_template(
-            "results.html", results=data["results"], days=data["days"], agents=data["agents"]
+            "results.html",
+            results=data["results"],
+            days=data["days"],
+            agents=data["agents"],
         )
 
     return render_template("index.html", form=form, job_fields=job_fields)
@@ -114,6 +199,65 @@ def _compile_results(market):
     return {"days": days, "results": results, "agents": agent_stats}
 
 
+def _encode_cursor(day, good):
+    raw = json.dumps([day, str(good)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        day, good = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(day), str(good)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+@bp.route("/history", methods=["GET"])
+def history_page():
+    """Page through the daily summaries of the persistent market.
+
+    Unlike the results of ``/step`` this reads the database, so it reaches
+    every day rather than the most recent ones and only returns what was
+    asked for. Query parameters: ``since_day`` (only later days) or
+    ``start`` and ``end`` (inclusive), ``good`` (repeatable), ``limit`` and
+    the ``cursor`` returned with the previous page. ``next_cursor`` is null
+    on the last page.
+    """
+    args = request.args
+    day_number = _persistent_market.day_number
+    try:
+        start = int(args.get("start", 1))
+        if "since_day" in args:
+            start = max(start, int(args["since_day"]) + 1)
+        end = int(args["end"]) if "end" in args else day_number
+        limit = int(args.get("limit", HISTORY_PAGE))
+        if not 1 <= limit <= HISTORY_MAX_PAGE:
+            raise ValueError("limit must be between 1 and {}".format(HISTORY_MAX_PAGE))
+        try:
+            only = [goods.by_name(name) for name in args.getlist("good")] or None
+        except KeyError as exc:
+            raise ValueError("Unknown good {}".format(exc))
+        after = _decode_cursor(args["cursor"]) if "cursor" in args else None
+    except ValueError as exc:
+        return (str(exc), 400)
+
+    # One extra row tells whether another page follows
+    page = _history.fetch_page(start, end, only, after, limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = _encode_cursor(page[-1][0], page[-1][1])
+    data = {
+        "day_number": day_number,
+        "rows": [
+            dict(trades._asdict(), day=day, good=str(good))
+            for day, good, trades in page
+        ],
+        "next_cursor": next_cursor,
+    }
+    return HistoryPageSchema().jsonify(data)
+
+
 @bp.route("/overview", methods=["GET"])
 def overview():
     """Return high level market overview for the persistent market."""
@@ -129,11 +273,25 @@ def overview():
 
 @bp.route("/agent/<path:name>", methods=["GET"])
 def agent_detail(name):
-    """Show detailed statistics for a single agent."""
-    agent = next((a for a in _persistent_market.agents if a.name == name), None)
+    """Show detailed statistics for a single agent.
+
+    A ``day`` query parameter shows the agent as it was at the end of that
+    day, rebuilt from the nearest checkpoint.
+    """
+    market = _persistent_market
+    day = request.args.get("day", type=int)
+    if day is not None and day != market.day_number:
+        # A step of the live market may be writing the checkpoint to replay
+        # from
+        with _market_lock:
+            try:
+                market = market.state_at(day)
+            except ValueError as exc:
+                return (str(exc), 404)
+    agent = next((a for a in market.agents if a.name == name), None)
     if agent is None:
         return ("Agent not found", 404)
-    inventory = {str(g): qty for g, qty in agent._inventory._items.items()}
+    inventory = {str(g): qty for g, qty in agent._inventory.items().items()}
     data = {
         "name": agent.name,
         "job": agent.job,
@@ -154,15 +312,39 @@ def agent_detail(name):
 
 @bp.route("/step", methods=["POST"])
 def step():
-    """Advance the persistent simulation by N days."""
+    """Advance the persistent simulation by N days.
+
+    The days are simulated by the task queue. Steps requested while an
+    earlier one is still queued or running are added to it, so overlapping
+    requests never race; each of them gets the results once the merged task
+    stops. With ``"background": true`` the task is returned right away.
+    """
     if request.is_json:
         data = request.get_json()
         days = int(data.get("days", 1))
+        background = bool(data.get("background", False))
+        try:
+            max_seconds = _max_seconds(data)
+        except ValueError as exc:
+            return (str(exc), 400)
     else:
         days = int(request.form.get("days", 1))
-    global _persistent_market
-    _persistent_market.simulate(days)
-    data = _compile_results(_persistent_market)
+        background = False
+        max_seconds = None
+    task = _tasks.submit(
+        lambda: _persistent_market,
+        days,
+        _compile_results,
+        max_seconds,
+        lock=_market_lock,
+        merge_key=STEP,
+    )
+    if background:
+        return _task_accepted(task)
+    task.wait()
+    if task.status == tasks.FAILED:
+        return (task.error, 500)
+    data = task.result
     schema = SimulationResultSchema()
     if (
         request.is_json
@@ -182,13 +364,18 @@ def reset():
     else:
         num_agents = int(request.form.get("num_agents", 9))
     global _history, _persistent_market
-    _history.reset()
-    _persistent_market = Market(
-        num_agents=num_agents,
-        history=_history,
-        initial_inv=INITIAL_INVENTORY,
-        initial_money=INITIAL_MONEY,
-    )
+    _tasks.cancel_merged(STEP)
+    with _market_lock:
+        _history.reset()
+        _checkpoints.clear()
+        _persistent_market = Market(
+            num_agents=num_agents,
+            history=_history,
+            initial_inv=INITIAL_INVENTORY,
+            initial_money=INITIAL_MONEY,
+            checkpoints=_checkpoints,
+            instrument=True,
+        )
     data = _compile_results(_persistent_market)
     schema = SimulationResultSchema()
     if (
@@ -203,17 +390,23 @@ def reset():
 @bp.route("/load", methods=["GET"])
 def load():
     """Load an existing simulation database."""
-    global _history, _persistent_market, DB_PATH
+    global _history, _checkpoints, _persistent_market, DB_PATH
     db = request.args.get("db", DB_PATH)
     num_agents = int(request.args.get("num_agents", 9))
     DB_PATH = db
-    _history = SQLiteHistory(DB_PATH)
-    _persistent_market = Market(
-        num_agents=num_agents,
-        history=_history,
-        initial_inv=INITIAL_INVENTORY,
-        initial_money=INITIAL_MONEY,
-    )
+    _tasks.cancel_merged(STEP)
+    with _market_lock:
+        _history = SQLiteHistory(DB_PATH, write_observer=metrics.db_writes.observe)
+        _checkpoints = Checkpoints(DB_PATH + ".checkpoints", every=CHECKPOINT_EVERY)
+        _checkpoints.clear()
+        _persistent_market = Market(
+            num_agents=num_agents,
+            history=_history,
+            initial_inv=INITIAL_INVENTORY,
+            initial_money=INITIAL_MONEY,
+            checkpoints=_checkpoints,
+            instrument=True,
+        )
     data = _compile_results(_persistent_market)
     schema = SimulationResultSchema()
     if (
@@ -234,13 +427,18 @@ def rebuild():
         num_agents = int(request.form.get("num_agents", 9))
     rebuild_database()
     global _history, _persistent_market
-    _history.reset()
-    _persistent_market = Market(
-        num_agents=num_agents,
-        history=_history,
-        initial_inv=INITIAL_INVENTORY,
-        initial_money=INITIAL_MONEY,
-    )
+    _tasks.cancel_merged(STEP)
+    with _market_lock:
+        _history.reset()
+        _checkpoints.clear()
+        _persistent_market = Market(
+            num_agents=num_agents,
+            history=_history,
+            initial_inv=INITIAL_INVENTORY,
+            initial_money=INITIAL_MONEY,
+            checkpoints=_checkpoints,
+            instrument=True,
+        )
     data = _compile_results(_persistent_market)
     schema = SimulationResultSchema()
     if (
@@ -252,6 +450,53 @@ def rebuild():
     return render_template("results.html", **schema.dump(data))
 
 
+def _max_seconds(data):
+    """Return the wall-time budget requested in JSON ``data``, if any."""
+    value = data.get("max_seconds")
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("max_seconds must be a number")
+    if not seconds >= 0:
+        raise ValueError("max_seconds cannot be negative")
+    return seconds
+
+
+def _task_accepted(task):
+    data = task.to_dict()
+    data["url"] = url_for("market.task_status", task_id=task.id)
+    return jsonify(data), 202
+
+
+@bp.route("/tasks", methods=["GET"])
+def task_list():
+    """List the queued, running and recently stopped simulation tasks."""
+    return jsonify([task.to_dict() for task in _tasks.tasks()])
+
+
+@bp.route("/tasks/<task_id>", methods=["GET"])
+def task_status(task_id):
+    """Report the progress of a task, with its results once it stopped."""
+    task = _tasks.get(task_id)
+    if task is None:
+        return ("Task not found", 404)
+    data = task.to_dict()
+    if task.status in tasks.FINISHED and task.result is not None:
+        data["result"] = SimulationResultSchema().dump(task.result)
+    return jsonify(data)
+
+
+@bp.route("/tasks/<task_id>/cancel", methods=["POST"])
+def task_cancel(task_id):
+    """Stop a task after the day it is simulating."""
+    task = _tasks.cancel(task_id)
+    if task is None:
+        return ("Task not found", 404)
+    return jsonify(task.to_dict()), 202
+
+
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "dev"
 init_db(app)
@@ -0,0 +1,181 @@
+"""In-process metrics rendered in the Prometheus text format."""
+
+import os
+import sys
+import threading
+from bisect import bisect_left
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# Default latency buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(name, _escape(value)) for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Histogram(object):
+    """Thread-safe cumulative histogram with one series per label set.
+
+    Parameters
+    ----------
+    name : str
+        Metric name.
+    help : str
+        Description shown in the ``# HELP`` line.
+    label_names : tuple of str
+        Names of the labels passed to :meth:`observe`.
+    buckets : sequence of float
+        Upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, name, help, label_names=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(k, (list(c), n, total)) for k, (c, n, total) in series]
+        for labels, (counts, count, total) in series:
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        self.name,
+                        _format_labels(pairs + [("le", repr(float(bound)))]),
+                        cumulative,
+                    )
+                )
+            lines.append(
+                "{}_bucket{} {}".format(
+                    self.name, _format_labels(pairs + [("le", "+Inf")]), count
+                )
+            )
+            lines.append(
+                "{}_sum{} {!r}".format(self.name, _format_labels(pairs), total)
+            )
+            lines.append(
+                "{}_count{} {}".format(self.name, _format_labels(pairs), count)
+            )
+        return lines
+
+
+def gauge(name, help, samples):
+    """Render a gauge from ``[(labels, value), ...]``."""
+    lines = ["# HELP {} {}".format(name, help), "# TYPE {} gauge".format(name)]
+    for labels, value in samples:
+        lines.append("{}{} {!r}".format(name, _format_labels(labels), float(value)))
+    return lines
+
+
+def _resident_memory_bytes():
+    """Return the current resident set size, or ``None`` if unknown."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_memory_bytes():
+    """Return the peak resident set size, or ``None`` if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+requests = Histogram(
+    "star_trader_http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ("endpoint", "method", "status"),
+)
+db_writes = Histogram(
+    "star_trader_history_write_duration_seconds",
+    "Time spent writing one simulated day to the history database.",
+)
+
+
+def _phase_summary(stats):
+    """Render the day loop phases as a summary over the recent window."""
+    name = "star_trader_day_phase_seconds"
+    lines = [
+        "# HELP {} Duration of each phase of the simulated day.".format(name),
+        "# TYPE {} summary".format(name),
+    ]
+    for phase, values in stats["phases"].items():
+        for stat, value in values.items():
+            if stat.startswith("p"):
+                labels = [("phase", phase), ("quantile", float(stat[1:]) / 100)]
+                lines.append("{}{} {!r}".format(name, _format_labels(labels), value))
+        labels = _format_labels([("phase", phase)])
+        lines.append("{}_sum{} {!r}".format(name, labels, values["total"]))
+        lines.append("{}_count{} {}".format(name, labels, stats["days"]))
+    return lines
+
+
+def render(market):
+    """Return every metric, including those of ``market``, as text."""
+    lines = requests.render() + db_writes.render()
+
+    stats = market.perf_stats()
+    if stats is not None:
+        lines += gauge(
+            "star_trader_days_per_second",
+            "Simulated days per second over the recent window.",
+            [((), stats["days_per_second"])],
+        )
+        lines += _phase_summary(stats)
+
+    overview = market.overview_stats()
+    lines += gauge(
+        "star_trader_agents", "Active agents.", [((), overview["active_agents"])]
+    )
+    lines += gauge(
+        "star_trader_day", "Current simulation day.", [((), overview["days_elapsed"])]
+    )
+
+    memory = []
+    for kind, value in (
+        ("peak", _peak_memory_bytes()),
+        ("resident", _resident_memory_bytes()),
+    ):
+        if value is not None:
+            memory.append(((("kind", kind),), value))
+    if memory:
+        lines += gauge("star_trader_process_memory_bytes", "Process memory.", memory)
+    return "\n".join(lines) + "\n"
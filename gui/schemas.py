@@ -3,6 +3,7 @@ from marshmallow import fields
 
 ma = Marshmallow()
 
+
 class AgentStatsSchema(ma.Schema):
     name = fields.String()
     job = fields.String()
@@ -46,3 +47,20 @@ class AgentDetailSchema(ma.Schema):
     age = fields.Integer()
     inventory = fields.Dict(keys=fields.String(), values=fields.Integer())
     trades = fields.Dict(keys=fields.String(), values=fields.Integer())
+
+
+class HistoryRowSchema(ma.Schema):
+    day = fields.Integer()
+    good = fields.String()
+    volume = fields.Integer(allow_none=True)
+    low = fields.Integer(allow_none=True)
+    high = fields.Integer(allow_none=True)
+    mean = fields.Integer(allow_none=True)
+    supply = fields.Integer(allow_none=True)
+    demand = fields.Integer(allow_none=True)
+
+
+class HistoryPageSchema(ma.Schema):
+    day_number = fields.Integer()
+    rows = fields.List(fields.Nested(HistoryRowSchema))
+    next_cursor = fields.String(allow_none=True)
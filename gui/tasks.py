@@ -0,0 +1,246 @@
+"""Background simulation runs for the GUI.
+
+Long runs are submitted to a :class:`TaskQueue` instead of being simulated in
+the request thread. Submitting returns a :class:`Task` right away; a thread
+pool simulates it one day at a time, so its progress can be polled and it
+stops cleanly between days when it is cancelled or runs out of wall time.
+Once the task has stopped its result is kept until it is fetched or pushed
+out by newer tasks.
+
+("Task" rather than "job", as jobs are the professions of agents.)
+"""
+
+import concurrent.futures
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+# States a task can be in; the last four are final
+QUEUED, RUNNING, DONE, CANCELLED, TIMED_OUT, FAILED = (
+    "queued",
+    "running",
+    "done",
+    "cancelled",
+    "timed_out",
+    "failed",
+)
+FINISHED = (DONE, CANCELLED, TIMED_OUT, FAILED)
+
+
+class Task(object):
+    """One simulation run handled by a :class:`TaskQueue`.
+
+    Parameters
+    ----------
+    task_id : str
+        Identifier handed back to the client.
+    days : int
+        Number of days to simulate. Merged submissions add to it.
+    max_seconds : float, optional
+        Wall-time budget. The task stops as ``timed_out`` after the first
+        day that ends past it.
+    """
+
+    def __init__(self, task_id, days, max_seconds=None):
+        self.id = task_id
+        self.days = days
+        self.max_seconds = max_seconds
+        self.days_done = 0
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._open = True
+        self._cancel = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def cancelled(self):
+        """Whether cancellation has been requested."""
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the task to stop after the day it is simulating."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the task has stopped; return whether it has."""
+        return self._stopped.wait(timeout)
+
+    def over_budget(self):
+        return (
+            self.max_seconds is not None
+            and time.time() - self.started > self.max_seconds
+        )
+
+    def to_dict(self):
+        """Return the state of the task, without its result."""
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "days": self.days,
+            "days_done": self.days_done,
+            "progress": self.days_done / self.days if self.days else 1.0,
+            "max_seconds": self.max_seconds,
+            "elapsed": end - self.started if self.started else 0.0,
+            "error": self.error,
+        }
+
+
+class TaskQueue(object):
+    """Thread pool running simulation tasks.
+
+    Parameters
+    ----------
+    workers : int
+        Number of tasks simulated at the same time.
+    keep : int
+        Number of stopped tasks kept for their results; the oldest are
+        forgotten first.
+    max_seconds : float, optional
+        Default wall-time budget of a task.
+    """
+
+    def __init__(self, workers=2, keep=100, max_seconds=None):
+        if workers < 1:
+            raise ValueError("The queue needs at least one worker")
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            workers, thread_name_prefix="simulation"
+        )
+        self._keep = keep
+        self.max_seconds = max_seconds
+        self._ids = itertools.count(1)
+        self._tasks = OrderedDict()
+        self._merge = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self, market, days, compile, max_seconds=None, lock=None, merge_key=None
+    ):
+        """Queue ``days`` of simulation and return the :class:`Task`.
+
+        Parameters
+        ----------
+        market : callable
+            Called by the worker to get the market to simulate, so building
+            it happens off the request thread too.
+        days : int
+            Number of days to simulate.
+        compile : callable
+            Called with the market once the task stops; its return value is
+            the task's result.
+        max_seconds : float, optional
+            Wall-time budget, defaulting to the queue's.
+        lock : threading.Lock, optional
+            Held while each day is simulated, for markets shared with other
+            code.
+        merge_key : hashable, optional
+            Submissions with the same key while a task for it has not
+            finished are added to that task instead of starting a new one.
+        """
+        if days < 0:
+            raise ValueError("Cannot simulate a negative number of days")
+        if max_seconds is None:
+            max_seconds = self.max_seconds
+        elif not max_seconds >= 0:
+            raise ValueError("The wall-time budget cannot be negative")
+        with self._lock:
+            task = self._merge.get(merge_key)
+            if task is not None and task._open and not task.cancelled:
+                task.days += days
+                logger.info("Merged %s days into task %s", days, task.id)
+                return task
+            task = Task(str(next(self._ids)), days, max_seconds)
+            self._tasks[task.id] = task
+            if merge_key is not None:
+                self._merge[merge_key] = task
+            self._forget_stopped()
+        self._executor.submit(self._run, task, market, compile, lock)
+        return task
+
+    def get(self, task_id):
+        """Return the task with ``task_id`` or ``None``."""
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def tasks(self):
+        """Return the known tasks, oldest first."""
+        with self._lock:
+            return list(self._tasks.values())
+
+    def cancel(self, task_id):
+        """Request cancellation of a task and return it, or ``None``."""
+        task = self.get(task_id)
+        if task is not None:
+            task.cancel()
+        return task
+
+    def cancel_merged(self, merge_key):
+        """Cancel the unfinished task for ``merge_key`` and wait for it."""
+        with self._lock:
+            task = self._merge.pop(merge_key, None)
+        if task is not None:
+            task.cancel()
+            task.wait()
+
+    def shutdown(self):
+        """Cancel every task and wait for the workers to stop."""
+        for task in self.tasks():
+            task.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _forget_stopped(self):
+        stopped = [t.id for t in self._tasks.values() if t.status in FINISHED]
+        for task_id in stopped[: max(0, len(self._tasks) - self._keep)]:
+            del self._tasks[task_id]
+
+    def _run(self, task, market, compile, lock):
+        lock = lock or nullcontext()
+        task.started = time.time()
+        try:
+            market = market()
+            task.status = RUNNING
+            while True:
+                with self._lock:
+                    # Decided under the lock so no merge slips in meanwhile
+                    if task.cancelled:
+                        outcome = CANCELLED
+                    elif task.days_done >= task.days:
+                        outcome = DONE
+                    elif task.over_budget():
+                        outcome = TIMED_OUT
+                    else:
+                        outcome = None
+                    if outcome is not None:
+                        task._open = False
+                        break
+                with lock:
+                    market.simulate(1)
+                task.days_done += 1
+            # Stopped tasks still report the days they got through
+            with lock:
+                task.result = compile(market)
+            task.status = outcome
+        except Exception as exc:
+            logger.exception("Task %s failed", task.id)
+            task.status = FAILED
+            task.error = str(exc)
+        finally:
+            task._open = False
+            task.finished = time.time()
+            task._stopped.set()
+            logger.info(
+                "Task %s %s after %s of %s days",
+                task.id,
+                task.status,
+                task.days_done,
+                task.days,
+            )
@@ -1,8 +1,11 @@
 import argparse
 import logging
+import os
 
 from economy.market.market import Market
 from economy.market.history import SQLiteHistory
+from economy.trace import TraceRecorder
+from config import HISTORY_FIDELITY
 
 logger = logging.getLogger(__name__)
 
@@ -24,20 +27,42 @@ def main():
         help="Number of agents when starting a new simulation",
     )
     parser.add_argument("--db", default="sim.db", help="SQLite database file")
+    parser.add_argument(
+        "--fidelity",
+        choices=SQLiteHistory.FIDELITY_LEVELS,
+        default=HISTORY_FIDELITY,
+        help="How much trade history to store (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="Market snapshot to continue from (if it exists) and save to",
+    )
+    parser.add_argument("--trace", help="Write a binary event trace of the run here")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
 
-    history = SQLiteHistory(db_path=args.db)
+    history = SQLiteHistory(db_path=args.db, fidelity=args.fidelity, write_behind=True)
 
-    if args.reset:
-        history.reset()
-        logger.info("Simulation reset.")
-        return
+    with history:
+        if args.reset:
+            history.reset()
+            if args.snapshot and os.path.exists(args.snapshot):
+                os.remove(args.snapshot)
+            logger.info("Simulation reset.")
+            return
 
-    market = Market(num_agents=args.num_agents, history=history)
-    market.simulate(args.step)
-    logger.info("Simulated up to day %s.", history.day_number)
+        trace = TraceRecorder() if args.trace else None
+        if args.snapshot and os.path.exists(args.snapshot):
+            market = Market.load_snapshot(args.snapshot, history=history, trace=trace)
+        else:
+            market = Market(num_agents=args.num_agents, history=history, trace=trace)
+        market.simulate(args.step)
+        if trace is not None:
+            trace.dump(args.trace)
+        if args.snapshot:
+            market.save_snapshot(args.snapshot)
+        logger.info("Simulated up to day %s.", history.day_number)
 
 
 if __name__ == "__main__":
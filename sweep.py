@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+
+from economy.sweep import PARAMETERS, ResultsStore, grid, random_points, run_sweep
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_values(text):
+    """Parse ``name=v1,v2`` (grid) or ``name=low:high`` (random range)."""
+    name, _, values = text.partition("=")
+    if name not in PARAMETERS or name == "job_counts":
+        raise argparse.ArgumentTypeError("Unknown parameter {!r}".format(name))
+    if ":" in values:
+        low, high = values.split(":")
+        return name, (int(low), int(high))
+    return name, [int(value) for value in values.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the market configuration over a grid or at random"
+    )
+    parser.add_argument(
+        "--param",
+        type=_parse_values,
+        action="append",
+        default=[],
+        metavar="NAME=VALUES",
+        help="Values to sweep: a list (daily_tax=0,1,2) for a grid or a range "
+        "(initial_money=50:200) for --random",
+    )
+    parser.add_argument(
+        "--job-counts",
+        type=json.loads,
+        action="append",
+        metavar="JSON",
+        help='Job mix to try, e.g. \'{"Farmer": 3, "Miner": 2}\'; repeatable',
+    )
+    parser.add_argument(
+        "--random", type=int, metavar="N", help="Draw N random points instead"
+    )
+    parser.add_argument("--days", type=int, default=30, help="Days per point")
+    parser.add_argument("--num-agents", type=int, default=15, help="Agents per market")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for every point")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes (default: one per CPU, 0 runs in this process)",
+    )
+    parser.add_argument(
+        "--results",
+        default="sweep.jsonl",
+        help="Results file; completed points in it are skipped",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    values = dict(args.param)
+    if args.job_counts:
+        values["job_counts"] = args.job_counts
+    if args.random:
+        points = random_points(args.random, seed=args.seed, **values)
+    else:
+        points = grid(**values)
+
+    run_sweep(
+        points,
+        args.days,
+        ResultsStore(args.results),
+        seed=args.seed,
+        workers=args.workers,
+        num_agents=args.num_agents,
+    )
+    logger.info("Results are in %s.", args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import unittest
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods, jobs
+from economy.agent import Agent
+
+
+class TestAgentProduction(unittest.TestCase):
+    def setUp(self):
+        self.sand = goods.by_name("Sand")
+        self.glass = goods.by_name("Glass")
+        self.blower = goods.by_name("Blower")
+
+    def _glass_maker(self):
+        agent = Agent(jobs.by_name("Glass Maker"), None)
+        agent._inventory.set_qty(self.glass, 0)
+        agent._inventory.set_qty(self.sand, 9)
+        agent._inventory.set_qty(self.blower, 1)
+        return agent
+
+    def test_production_stops_when_inputs_or_tools_run_out(self):
+        random.seed(3)
+        for _ in range(50):
+            agent = self._glass_maker()
+            agent.do_production()
+            made = agent.holding(self.glass)
+            self.assertEqual(agent.holding(self.sand), 9 - 2 * made)
+            if agent.holding(self.blower):
+                self.assertEqual(made, 4)
+            else:
+                self.assertGreaterEqual(made, 1)
+
+    def test_tool_breakage_matches_run_by_run_odds(self):
+        random.seed(4)
+        made = []
+        for _ in range(4000):
+            agent = self._glass_maker()
+            agent.do_production()
+            made.append(agent.holding(self.glass))
+
+        # Each run happens only if the blower survived every earlier one
+        expected = sum(0.9**run for run in range(4))
+        self.assertAlmostEqual(sum(made) / len(made), expected, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import json
 import unittest
+from unittest import mock
 from pathlib import Path
 import sys
 from urllib.parse import quote
@@ -7,7 +8,8 @@ from urllib.parse import quote
 # Ensure project root is on path
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from gui.app import app
+from gui import metrics
+from gui.app import app, _market_lock, _tasks
 
 
 class TestSimulationAPI(unittest.TestCase):
@@ -91,6 +93,147 @@ class TestSimulationAPI(unittest.TestCase):
         self.assertEqual(detail["name"], agent_name)
         self.assertIn("inventory", detail)
 
+    def test_agent_detail_at_past_day(self):
+        resp = self.client.post("/reset", json={"num_agents": 1})
+        agent_name = resp.get_json()["agents"][0]["name"]
+        url = "/agent/" + quote(agent_name)
+        headers = {"Accept": "application/json"}
+        before = self.client.get(url, headers=headers).get_json()
+
+        self.client.post("/step", json={"days": 3})
+        resp = self.client.get(url + "?day=0", headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json(), before)
+
+        resp = self.client.get(url + "?day=99", headers=headers)
+        self.assertEqual(resp.status_code, 404)
+
+    def test_metrics_endpoint(self):
+        self.client.post("/reset", json={"num_agents": 2})
+        self.client.post("/step", json={"days": 2})
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith("text/plain"))
+        text = resp.get_data(as_text=True)
+        self.assertIn(
+            'star_trader_http_request_duration_seconds_count{endpoint="market.step",'
+            'method="POST",status="200"}',
+            text,
+        )
+        self.assertIn("star_trader_history_write_duration_seconds_count", text)
+        self.assertIn('star_trader_day_phase_seconds_count{phase="resolve"} 2', text)
+        self.assertIn("star_trader_agents 2.0", text)
+        self.assertIn('star_trader_process_memory_bytes{kind="peak"}', text)
+
+        # Without the resource module (Windows) the peak is left out
+        with mock.patch.object(metrics, "resource", None):
+            text = self.client.get("/metrics").get_data(as_text=True)
+        self.assertNotIn('star_trader_process_memory_bytes{kind="peak"}', text)
+
+    def test_background_task(self):
+        resp = self.client.post(
+            "/", json={"num_agents": 3, "days": 2, "background": True}
+        )
+        self.assertEqual(resp.status_code, 202)
+        task = resp.get_json()
+        self.assertIn(task["status"], ("queued", "running", "done"))
+
+        _tasks.get(task["id"]).wait(30)
+        resp = self.client.get(task["url"])
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["days_done"], 2)
+        self.assertEqual(data["progress"], 1.0)
+        self.assertEqual(data["result"]["days"], 2)
+        self.assertEqual(len(data["result"]["agents"]), 3)
+
+        self.assertEqual(self.client.get("/tasks/nope").status_code, 404)
+
+    def test_cancel_and_budget(self):
+        resp = self.client.post(
+            "/", json={"num_agents": 2, "days": 100000, "background": True}
+        )
+        task_id = resp.get_json()["id"]
+        resp = self.client.post("/tasks/{}/cancel".format(task_id))
+        self.assertEqual(resp.status_code, 202)
+        _tasks.get(task_id).wait(30)
+        data = self.client.get("/tasks/" + task_id).get_json()
+        self.assertEqual(data["status"], "cancelled")
+        self.assertLess(data["days_done"], 100000)
+        self.assertIn("result", data)
+
+        resp = self.client.post(
+            "/",
+            json={
+                "num_agents": 2,
+                "days": 100000,
+                "background": True,
+                "max_seconds": 0,
+            },
+        )
+        task = _tasks.get(resp.get_json()["id"])
+        task.wait(30)
+        self.assertEqual(task.status, "timed_out")
+
+    def test_invalid_budget_is_rejected(self):
+        for value in ("soon", -1, [5]):
+            for url in ("/", "/step"):
+                resp = self.client.post(
+                    url, json={"days": 1, "background": True, "max_seconds": value}
+                )
+                self.assertEqual(resp.status_code, 400, (url, value))
+
+    def test_overlapping_steps_merge(self):
+        self.client.post("/reset", json={"num_agents": 2})
+        # Hold the market so the first step cannot finish before the others
+        with _market_lock:
+            first = self.client.post(
+                "/step", json={"days": 2, "background": True}
+            ).get_json()
+            second = self.client.post(
+                "/step", json={"days": 3, "background": True}
+            ).get_json()
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(second["days"], 5)
+
+        # A blocking step waits for the merged task and sees all its days
+        resp = self.client.post("/step", json={"days": 1})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["days"], 6)
+
+    def test_history_pages(self):
+        self.client.post("/reset", json={"num_agents": 2})
+        self.client.post("/step", json={"days": 40})
+
+        # Every day is reachable, not only the ones kept in memory
+        rows = []
+        url = "/history?good=Sand&good=Glass&limit=7"
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            data = resp.get_json()
+            self.assertEqual(data["day_number"], 40)
+            rows.extend(data["rows"])
+            cursor = data["next_cursor"]
+            url = cursor and "/history?good=Sand&good=Glass&limit=7&cursor=" + cursor
+        self.assertEqual(
+            [(row["day"], row["good"]) for row in rows],
+            [(day, good) for day in range(1, 41) for good in ("Glass", "Sand")],
+        )
+
+        data = self.client.get("/history?since_day=38&good=Sand").get_json()
+        self.assertEqual([row["day"] for row in data["rows"]], [39, 40])
+        self.assertEqual(data["rows"][-1], rows[-1])
+        self.assertIsNone(data["next_cursor"])
+
+        data = self.client.get("/history?start=3&end=4").get_json()
+        self.assertEqual({row["day"] for row in data["rows"]}, {3, 4})
+
+        for query in ("good=Nothing", "limit=0", "cursor=bogus", "start=x"):
+            resp = self.client.get("/history?" + query)
+            self.assertEqual(resp.status_code, 400, query)
+
 
 if __name__ == "__main__":
     unittest.main()
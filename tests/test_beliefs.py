@@ -0,0 +1,81 @@
+import unittest
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods
+from economy.beliefs import BeliefMatrix, Beliefs
+
+
+class TestBeliefMatrix(unittest.TestCase):
+    def test_beliefs_are_views_over_shared_matrix(self):
+        sand = goods.by_name("Sand")
+        matrix = BeliefMatrix()
+        a = Beliefs(matrix)
+        b = Beliefs(matrix)
+        self.assertNotEqual(a.row, b.row)
+
+        a.update(sand, 50, False)
+        col = matrix.column(sand)
+        self.assertEqual(
+            a.get_belief(sand),
+            [matrix.belief[a.row, col], matrix.confidence[a.row, col]],
+        )
+
+        a.release()
+        self.assertEqual(Beliefs(matrix).row, a.row)
+
+    def test_batched_update_matches_sequential_updates(self):
+        random.seed(7)
+        sand = goods.by_name("Sand")
+        matrix = BeliefMatrix()
+        batched = [Beliefs(matrix) for _ in range(3)]
+        sequential = [Beliefs() for _ in range(3)]
+        for b, s in zip(batched, sequential):
+            s.matrix.set(s.row, sand, *b.get_belief(sand))
+
+        who = [0, 1, 0, 2, 0, 1]
+        prices = [3, 40, 25, 2, 1, 18]
+        success = [True, False, False, True, False, True]
+        matrix.update(
+            [batched[i].row for i in who], matrix.column(sand), prices, success
+        )
+        for i, price, ok in zip(who, prices, success):
+            sequential[i].update(sand, price, ok)
+
+        for b, s in zip(batched, sequential):
+            self.assertEqual(b.get_belief(sand), s.get_belief(sand))
+
+    def test_choose_prices_initialises_unknown_cells(self):
+        matrix = BeliefMatrix(rows=4)
+        col = matrix.column(goods.by_name("Glass"))
+        prices = matrix.choose_prices([0, 1, 2, 3], col)
+        self.assertTrue(matrix.known[:4, col].all())
+        # Beliefs start in [10, 20] with a confidence of at most 10
+        self.assertTrue(((prices >= 0) & (prices <= 30)).all())
+
+    def test_cells_start_alike_whichever_path_reads_them(self):
+        sand = goods.by_name("Sand")
+        random.seed(5)
+        single = BeliefMatrix(rows=1)
+        random.seed(5)
+        bulk = BeliefMatrix(rows=1)
+        col = bulk.column(sand)
+
+        state = random.getstate()
+        first = single.get(0, sand)
+        # Seeding a cell draws from the matrix's generator only
+        self.assertEqual(random.getstate(), state)
+        bulk.choose_prices([0], col)
+        self.assertEqual(bulk.get(0, sand), first)
+
+    def test_private_matrix_has_a_single_row(self):
+        beliefs = Beliefs()
+        self.assertEqual(len(beliefs.matrix), 1)
+        self.assertEqual(len(beliefs.matrix.belief), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
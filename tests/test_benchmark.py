@@ -0,0 +1,43 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import benchmark
+
+
+def _report(days_per_second, peak_memory_mb):
+    return {
+        "results": [
+            {
+                "name": benchmark.case_name(10, "memory"),
+                "days_per_second": days_per_second,
+                "peak_memory_mb": peak_memory_mb,
+            }
+        ]
+    }
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_case(self):
+        result = benchmark.run_case(5, "sqlite-memory", 2)
+        self.assertEqual(result["days"], 2)
+        self.assertFalse(result["pool"])
+        self.assertGreater(result["days_per_second"], 0)
+        self.assertGreater(result["peak_memory_mb"], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = _report(100.0, 50.0)
+        self.assertEqual(benchmark.compare(_report(95.0, 52.0), baseline), [])
+
+        regressions = benchmark.compare(_report(80.0, 60.0), baseline)
+        self.assertEqual(len(regressions), 2)
+
+    def test_compare_ignores_new_cases(self):
+        report = _report(1.0, 1.0)
+        self.assertEqual(benchmark.compare(report, {"results": []}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
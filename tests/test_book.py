@@ -0,0 +1,128 @@
+import unittest
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods, jobs
+from economy.agent import Agent
+from economy.market.book import OrderBook
+from economy.market.continuous_book import ContinuousOrderBook
+from economy.market.numpy_book import NumpyOrderBook
+from economy.offer import Ask, Bid
+
+
+def _orders():
+    """Build a fresh set of sand orders with distinct prices."""
+    sand = goods.by_name("Sand")
+    sellers = [Agent(jobs.by_name("Sand Digger"), None) for _ in range(3)]
+    buyers = [Agent(jobs.by_name("Glass Maker"), None) for _ in range(3)]
+    orders = [
+        Ask(sand, 3, 10, sellers[0]),
+        Ask(sand, 2, 12, sellers[1]),
+        Ask(sand, 4, 15, sellers[2]),
+        Bid(sand, 1, 20, buyers[0]),
+        Bid(sand, 3, 17, buyers[1]),
+        Bid(sand, 2, 11, buyers[2]),
+    ]
+    return sand, sellers, buyers, orders
+
+
+class TestNumpyOrderBook(unittest.TestCase):
+    def test_matches_pure_python_book(self):
+        random.seed(0)
+        sand, py_sellers, py_buyers, orders = _orders()
+        book = OrderBook()
+        book.add_orders(orders)
+        expected = book.resolve_orders(sand)
+
+        sand, np_sellers, np_buyers, orders = _orders()
+        book = NumpyOrderBook()
+        book.add_orders(orders)
+        trades = book.resolve_orders(sand)
+
+        self.assertEqual(trades, expected)
+        for py_agent, np_agent in zip(py_sellers + py_buyers, np_sellers + np_buyers):
+            self.assertEqual(py_agent.money, np_agent.money)
+            self.assertEqual(py_agent.trade_stats, np_agent.trade_stats)
+
+    def test_match_returns_fill_arrays(self):
+        sand, sellers, buyers, orders = _orders()
+        book = NumpyOrderBook()
+        book.add_orders(orders)
+        trades, fills = book.match(sand)
+
+        self.assertEqual(trades.volume, 6)
+        self.assertEqual(trades.supply, 9)
+        self.assertEqual(trades.demand, 6)
+        self.assertEqual(fills.qty.tolist(), [1, 2, 1, 1, 1])
+        self.assertEqual(fills.price.tolist(), [15, 14, 14, 12, 13])
+        self.assertEqual(book.agent(fills.buyer[0]), buyers[0])
+        self.assertEqual(book.agent(fills.seller[-1]), sellers[2])
+        # Only the priciest seller is left with units and gets a failed update
+        self.assertEqual([book.agent(i) for i in fills.unfilled.tolist()], [sellers[2]])
+
+    def test_empty_side_trades_nothing(self):
+        sand, sellers, buyers, orders = _orders()
+        book = NumpyOrderBook()
+        book.add_orders(o for o in orders if isinstance(o, Ask))
+        trades = book.resolve_orders(sand)
+        self.assertEqual(trades.volume, 0)
+        self.assertIsNone(trades.mean)
+        self.assertEqual(trades.supply, 9)
+
+
+class TestContinuousOrderBook(unittest.TestCase):
+    def test_only_crossing_orders_trade_and_rest_overnight(self):
+        sand, sellers, buyers, orders = _orders()
+        book = ContinuousOrderBook(ttl=3)
+        book.open_day()
+        book.add_orders(orders)
+        trades = book.resolve_orders(sand)
+
+        # 10 and 12 asks cross the 20 and 17 bids, the 15 ask only the 20 bid
+        self.assertEqual(trades.volume, 4)
+        self.assertEqual(trades.supply, 9)
+        self.assertEqual(trades.demand, 6)
+        self.assertEqual(book.resting_orders(sand), (2, 1))
+
+        book.open_day()
+        book.add_order(Bid(sand, 2, 16, buyers[2]))
+        trades = book.resolve_orders(sand)
+        # The amended bid now crosses both remaining asks
+        self.assertEqual(trades.volume, 2)
+        self.assertEqual(trades.mean, 15)
+        self.assertEqual(book.resting_orders(sand), (1, 0))
+
+    def test_orders_are_amended_not_duplicated(self):
+        sand, sellers, buyers, orders = _orders()
+        book = ContinuousOrderBook()
+        book.open_day()
+        book.add_order(Bid(sand, 1, 5, buyers[0]))
+        book.add_order(Bid(sand, 2, 6, buyers[0]))
+        self.assertEqual(book.resting_orders(sand), (0, 1))
+
+        book.add_order(Ask(sand, 1, 6, sellers[0]))
+        trades = book.resolve_orders(sand)
+        self.assertEqual(trades.demand, 2)
+        self.assertEqual(trades.volume, 1)
+
+    def test_orders_expire_and_are_cancelled(self):
+        sand, sellers, buyers, orders = _orders()
+        book = ContinuousOrderBook(ttl=2)
+        book.open_day()
+        book.add_order(Ask(sand, 1, 30, sellers[0]))
+        book.add_order(Ask(sand, 1, 30, sellers[1]))
+        book.open_day()
+        book.add_order(Ask(sand, 1, 31, sellers[1]))
+        self.assertEqual(book.resting_orders(sand), (2, 0))
+
+        book.open_day()
+        self.assertEqual(book.resting_orders(sand), (1, 0))
+        book.cancel_orders(sellers[1])
+        self.assertEqual(book.resting_orders(sand), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from economy import catalog, goods, names
+
+
+class TestCatalog(unittest.TestCase):
+    def _run(self, code):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.strip()
+
+    def test_snapshot_avoids_database_libraries(self):
+        code = (
+            "import sys\n"
+            "from economy import goods, jobs, names\n"
+            "assert 'sqlalchemy' not in sys.modules\n"
+            "print(len(list(jobs.all())), names.random_name() != '')\n"
+            "print('sqlalchemy' in sys.modules, 'yaml' in sys.modules)\n"
+        )
+        # The first run writes the snapshot if it is missing or stale
+        self._run(code)
+        jobs_count, loaded = self._run(code).splitlines()
+        self.assertGreater(int(jobs_count.split()[0]), 0)
+        self.assertEqual(loaded, "False False")
+
+    def test_fingerprint_follows_catalog_tables(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "catalog.db"
+        self.assertIsNone(catalog._fingerprint(path))
+
+        with sqlite3.connect(path) as conn:
+            for table in catalog._TABLES:
+                conn.execute("CREATE TABLE {}(name TEXT, value)".format(table))
+            conn.execute("INSERT INTO goods VALUES ('Sand', 1)")
+            conn.execute("INSERT INTO jobs VALUES ('Digger', NULL)")
+        before = catalog._fingerprint(path)
+        self.assertIsNotNone(before)
+
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE goods SET value = 2")
+        self.assertNotEqual(catalog._fingerprint(path), before)
+
+    def test_other_threads_wait_for_a_complete_catalog(self):
+        seen, total = self._run(
+            "import threading, time\n"
+            "from economy import goods, jobs\n"
+            "from economy.jobs import Job\n"
+            "init = Job.__init__\n"
+            "def slow(self, *args, **kwargs):\n"
+            "    time.sleep(0.01)\n"
+            "    init(self, *args, **kwargs)\n"
+            "Job.__init__ = slow\n"
+            "loader = threading.Thread(target=goods.count)\n"
+            "loader.start()\n"
+            "while not goods._goods:\n"
+            "    time.sleep(0.001)\n"
+            "seen = len(list(jobs.all()))\n"
+            "loader.join()\n"
+            "print(seen, len(list(jobs.all())))\n"
+        ).split()
+        self.assertEqual(seen, total)
+
+    def test_catalog_loads_on_first_use(self):
+        self.assertEqual(goods.by_id(goods.by_name("Sand").id).name, "Sand")
+        self.assertEqual(names.FIRST_NAMES, names.first_names())
+        self.assertTrue(names.LAST_NAMES)
+
+
+if __name__ == "__main__":
+    unittest.main()
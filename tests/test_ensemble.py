@@ -0,0 +1,59 @@
+import random
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy.ensemble import Ensemble, run_ensemble, run_replicate, summary_columns
+
+
+class TestEnsemble(unittest.TestCase):
+    def test_statistics_match_numpy(self):
+        rng = np.random.default_rng(1)
+        runs = rng.normal(size=(20, 4, 3))
+        runs[3, 1, 2] = np.nan
+
+        ensemble = Ensemble(4, ["a", "b", "c"], percentiles=(10, 50))
+        for run in runs:
+            ensemble.add(run)
+
+        self.assertEqual(ensemble.count, 20)
+        np.testing.assert_allclose(ensemble.mean(), np.nanmean(runs, axis=0))
+        percentiles = ensemble.percentiles()
+        np.testing.assert_allclose(percentiles[10], np.nanpercentile(runs, 10, axis=0))
+
+    def test_reservoir_bounds_memory(self):
+        ensemble = Ensemble(2, ["a"], reservoir=5, seed=0)
+        for value in range(100):
+            ensemble.add(np.full((2, 1), float(value)))
+        self.assertEqual(len(ensemble._reservoir), 5)
+        self.assertAlmostEqual(ensemble.mean()[0, 0], 49.5)
+        self.assertEqual(set(ensemble.percentiles()), {5, 50, 95})
+
+    def test_rejects_wrong_shape(self):
+        ensemble = Ensemble(2, ["a"])
+        with self.assertRaises(ValueError):
+            ensemble.add(np.zeros((3, 1)))
+
+
+class TestRunEnsemble(unittest.TestCase):
+    def test_replicate_is_seeded(self):
+        state = random.getstate()
+        first = run_replicate(7, 3, {"num_agents": 6})
+        second = run_replicate(7, 3, {"num_agents": 6})
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(first.shape, (3, len(summary_columns())))
+        self.assertEqual(random.getstate(), state)
+
+    def test_workers_do_not_change_results(self):
+        serial = run_ensemble(4, 3, seed=5, workers=0, num_agents=6)
+        parallel = run_ensemble(4, 3, seed=5, workers=2, num_agents=6)
+        np.testing.assert_allclose(serial.mean(), parallel.mean())
+        self.assertEqual(serial.to_dict()["replicates"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
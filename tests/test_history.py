@@ -0,0 +1,251 @@
+import unittest
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods
+from economy.market.history import MarketHistory, SQLiteHistory, Trades
+
+
+def _random_trades(rng):
+    if rng.random() < 0.3:
+        return Trades(volume=0, low=None, high=None, mean=None, supply=3, demand=2)
+    low = rng.randint(1, 20)
+    high = low + rng.randint(0, 10)
+    return Trades(
+        volume=rng.randint(1, 9),
+        low=low,
+        high=high,
+        mean=rng.randint(low, high),
+        supply=10,
+        demand=10,
+    )
+
+
+def _run_days(history, days, rng, record=None):
+    for _ in range(days):
+        history.open_day()
+        for good in goods.all():
+            trades = _random_trades(rng)
+            history.add_trades(good, trades)
+            if record is not None:
+                record.setdefault(good, []).append(trades)
+        history.close_day()
+
+
+def _scan(days):
+    traded = [t for t in days if t.volume]
+    if not traded:
+        return (None, None, None, None)
+    low = min(t.low for t in traded)
+    high = max(t.high for t in traded)
+    current = traded[-1].mean
+    ratio = 0.5 if high == low else (current - low) / (high - low)
+    return (low, high, current, ratio)
+
+
+class TestMarketHistory(unittest.TestCase):
+    def test_rolling_aggregate_matches_full_scan(self):
+        rng = random.Random(2)
+        history = MarketHistory(max_depth=5)
+        record = {}
+        for _ in range(40):
+            _run_days(history, 1, rng, record)
+            for good in goods.all():
+                self.assertEqual(history.aggregate(good), _scan(record[good][-5:]))
+                self.assertEqual(history.aggregate(good, 3), _scan(record[good][-3:]))
+
+    def test_history_is_a_view_of_the_last_days(self):
+        history = MarketHistory(max_depth=4)
+        record = {}
+        _run_days(history, 6, random.Random(3), record)
+
+        hist = history.history()
+        for good in goods.all():
+            self.assertEqual(hist[good], record[good][-4:])
+            self.assertEqual(list(history.history(2)[good]), record[good][-2:])
+        self.assertEqual(len(hist[goods.by_name("Sand")].array), 4)
+        self.assertEqual(history._buffer.shape[1], 8)
+
+    def test_aggregates_are_per_instance(self):
+        sand = goods.by_name("Sand")
+        first, second = MarketHistory(), MarketHistory()
+        first_days, second_days = {}, {}
+        _run_days(first, 3, random.Random(1), first_days)
+        _run_days(second, 3, random.Random(9), second_days)
+        self.assertEqual(first.aggregate(sand, 2), _scan(first_days[sand][-2:]))
+        self.assertEqual(second.aggregate(sand, 2), _scan(second_days[sand][-2:]))
+        self.assertNotEqual(first.aggregate(sand), second.aggregate(sand))
+
+    def test_open_day_is_warned_about_once_per_day(self):
+        sand = goods.by_name("Sand")
+        history = MarketHistory(max_depth=5)
+        _run_days(history, 2, random.Random(4))
+        with self.assertLogs("economy.market.history", "WARNING") as logs:
+            for _ in range(3):
+                history.open_day()
+                for depth in (None, 2, 3):
+                    history.aggregate(sand, depth)
+                history.history()
+                history.close_day()
+        self.assertEqual(len(logs.records), 3)
+
+    def test_sqlite_history_rebuilds_aggregates_on_load(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "sim.db"
+
+        history = SQLiteHistory(db_path=str(path), max_depth=4)
+        _run_days(history, 7, random.Random(5))
+        expected = {good: history.aggregate(good) for good in goods.all()}
+        days = {good: list(trades) for good, trades in history.history().items()}
+        history._conn.close()
+
+        reloaded = SQLiteHistory(db_path=str(path), max_depth=4)
+        self.addCleanup(reloaded._conn.close)
+        for good in goods.all():
+            self.assertEqual(reloaded.aggregate(good), expected[good])
+        self.assertEqual(reloaded.history(), days)
+
+
+class TestSQLiteHistory(unittest.TestCase):
+    def _counts(self, history):
+        with history._lock:
+            trades = history._conn.execute("SELECT COUNT(*) FROM trades").fetchone()
+            log = history._conn.execute("SELECT COUNT(*) FROM trade_log").fetchone()
+        return trades[0], log[0]
+
+    def _trade_day(self, history):
+        sand = goods.by_name("Sand")
+        history.open_day()
+        for good in goods.all():
+            history.add_trades(good, _random_trades(random.Random(1)))
+        history.record_trade(history.day_number, "Ann", "Bob", sand, 2, 10)
+        history.record_trade(history.day_number, "Bob", "Ann", sand, 1, 11)
+
+    def test_trades_are_written_when_the_day_closes(self):
+        history = SQLiteHistory(db_path=":memory:")
+        self._trade_day(history)
+        self.assertEqual(self._counts(history), (0, 0))
+        history.close_day()
+        self.assertEqual(self._counts(history), (goods.count(), 2))
+
+    def test_fidelity_levels(self):
+        expected = {"full": (goods.count(), 2), "summary": (goods.count(), 0)}
+        expected["none"] = (0, 0)
+        for fidelity, counts in expected.items():
+            history = SQLiteHistory(db_path=":memory:", fidelity=fidelity)
+            self._trade_day(history)
+            history.close_day()
+            self.assertEqual(self._counts(history), counts)
+            self.assertEqual(history.day_number, 1)
+
+        with self.assertRaises(ValueError):
+            SQLiteHistory(db_path=":memory:", fidelity="some")
+
+    def test_sqlite_settings(self):
+        history = SQLiteHistory(
+            db_path=":memory:", synchronous="off", journal_mode="memory"
+        )
+        with history._lock:
+            sync = history._conn.execute("PRAGMA synchronous").fetchone()[0]
+            journal = history._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual((sync, journal), (0, "memory"))
+
+        with self.assertRaises(ValueError):
+            SQLiteHistory(db_path=":memory:", synchronous="sometimes")
+
+    def test_write_behind_flushes_and_closes(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = str(Path(tmp.name) / "sim.db")
+
+        with SQLiteHistory(db_path=path, write_behind=True, queue_size=1) as history:
+            for _ in range(5):
+                self._trade_day(history)
+                history.close_day()
+            history.flush()
+            self.assertEqual(self._counts(history), (5 * goods.count(), 10))
+        self.assertIsNone(history._writer)
+
+        reloaded = SQLiteHistory(db_path=path)
+        self.addCleanup(reloaded.close)
+        self.assertEqual(self._counts(reloaded), (5 * goods.count(), 10))
+
+    def test_write_behind_errors_are_raised(self):
+        class FailingHistory(SQLiteHistory):
+            def _write(self, summaries, log):
+                raise sqlite3.OperationalError("disk I/O error")
+
+        history = FailingHistory(db_path=":memory:", write_behind=True)
+        self._trade_day(history)
+        history.close_day()
+        with self.assertRaises(RuntimeError):
+            history.flush()
+        with self.assertRaises(RuntimeError):
+            history.close()
+        self.assertIsNone(history._writer)
+
+    def test_loads_recent_days_and_fetches_older_ones(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = str(Path(tmp.name) / "sim.db")
+        sand = goods.by_name("Sand")
+
+        record = {}
+        with SQLiteHistory(db_path=path, max_depth=3) as history:
+            _run_days(history, 8, random.Random(6), record)
+
+        reloaded = SQLiteHistory(db_path=path, max_depth=3)
+        self.addCleanup(reloaded.close)
+        self.assertEqual(reloaded.day_number, 8)
+        self.assertEqual(reloaded.history()[sand], record[sand][-3:])
+
+        older = reloaded.fetch_history(2, 4, good=sand)
+        self.assertEqual(older, {sand: list(zip((2, 3, 4), record[sand][1:4]))})
+        self.assertEqual(len(reloaded.fetch_history()[sand]), 8)
+
+        with reloaded._lock:
+            plan = reloaded._conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM trades WHERE good = ? AND day > ?",
+                ("Sand", 2),
+            ).fetchall()
+        self.assertIn("trades_good_day", str(plan))
+
+    def test_fetch_page_resumes_after_cursor(self):
+        history = SQLiteHistory(db_path=":memory:", max_depth=3)
+        self.addCleanup(history.close)
+        record = {}
+        _run_days(history, 6, random.Random(8), record)
+        sand, glass = goods.by_name("Sand"), goods.by_name("Glass")
+
+        rows = []
+        after = None
+        while True:
+            page = history.fetch_page(2, 5, only=[sand, glass], after=after, limit=3)
+            rows.extend(page)
+            if len(page) < 3:
+                break
+            after = (page[-1][0], str(page[-1][1]))
+        self.assertEqual(
+            [(day, good) for day, good, _ in rows],
+            [(day, good) for day in range(2, 6) for good in (glass, sand)],
+        )
+        self.assertEqual(rows[-1][2], record[sand][4])
+        self.assertEqual(len(history.fetch_page(5)), 2 * goods.count())
+
+        with history._lock:
+            plan = history._conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM trades WHERE day BETWEEN ? AND ?"
+                " AND (day, good) > (?, ?) ORDER BY day, good LIMIT 5",
+                (2, 5, 2, "Sand"),
+            ).fetchall()
+        self.assertIn("trades_day_good", str(plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
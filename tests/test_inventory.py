@@ -7,6 +7,7 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+from economy import goods
 from economy.inventory import Inventory
 
 
@@ -37,6 +38,27 @@ class TestInventory(unittest.TestCase):
         self.assertEqual(inv.query_inventory("banana"), 0)
         self.assertEqual(inv.available_space(), 4)
 
+    def test_goods_are_indexed_by_id(self):
+        sand, glass = goods.by_name("Sand"), goods.by_name("Glass")
+        self.assertIs(goods.by_id(sand.id), sand)
+
+        inv = Inventory(capacity=5)
+        inv.add_item(sand, 2)
+        inv.add_item(glass, 1)
+        inv.add_item("apple", 1)
+        self.assertEqual(inv.query_inventory(sand), 2)
+        self.assertEqual(inv.query_inventory(), 4)
+        self.assertEqual(inv.items(), {sand: 2, glass: 1, "apple": 1})
+
+    def test_failed_set_qty_keeps_old_quantity(self):
+        sand = goods.by_name("Sand")
+        inv = Inventory(capacity=3)
+        inv.add_item(sand, 2)
+        with self.assertRaises(ValueError):
+            inv.set_qty(sand, 4)
+        self.assertEqual(inv.query_inventory(sand), 2)
+        self.assertEqual(inv.available_space(), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
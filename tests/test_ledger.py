@@ -0,0 +1,61 @@
+import unittest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy.market.ledger import TradeLedger
+
+
+class TestTradeLedger(unittest.TestCase):
+    def test_totals_net_fills_per_agent(self):
+        ledger = TradeLedger()
+        ledger.append("alice", "bob", "sand", 2, 10)
+        ledger.append("carol", "bob", "sand", 1, 12)
+        ledger.append("bob", "alice", "glass", 1, 30)
+        ledger.append_miss("carol", "glass", 30)
+
+        self.assertEqual(len(ledger), 3)
+        totals = {
+            ledger.agents[agent_id]: value
+            for agent_id, value in ledger.totals().items()
+        }
+        sand, glass = ledger.good_id("sand"), ledger.good_id("glass")
+        self.assertEqual(totals["alice"], (10, {sand: 2}, {glass: 1}))
+        self.assertEqual(totals["bob"], (2, {glass: 1}, {sand: 3}))
+        self.assertEqual(totals["carol"], (-12, {sand: 1}, {}))
+        self.assertEqual(list(ledger.miss_agent), [ledger.agent_id("carol")])
+
+    def test_extend_maps_book_agents(self):
+        ledger = TradeLedger()
+        ledger.append("zed", "yan", "ore", 1, 5)
+        book_agents = ["yan", "xia", "zed"]
+        ledger.extend(
+            "sand",
+            book_agents,
+            np.array([1, 2]),
+            np.array([0, 0]),
+            np.array([3, 1]),
+            np.array([7, 8]),
+            np.array([2]),
+            7,
+        )
+        self.assertEqual(
+            list(ledger.trades()),
+            [
+                ("zed", "yan", "ore", 1, 5),
+                ("xia", "yan", "sand", 3, 7),
+                ("zed", "yan", "sand", 1, 8),
+            ],
+        )
+        self.assertEqual(list(ledger.miss_price), [7])
+
+        ledger.clear()
+        self.assertEqual(len(ledger), 0)
+        self.assertEqual(ledger.totals(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,16 @@
 import unittest
+import random
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
+from economy import goods, jobs
 from economy.market.market import Market
-from economy.market.history import SQLiteHistory
+from economy.market.continuous_book import ContinuousOrderBook
+from economy.market.history import MarketHistory, SQLiteHistory, Trades
+from economy.market.numpy_book import NumpyOrderBook
 
 
 class TestMarketSimulation(unittest.TestCase):
@@ -14,6 +19,57 @@ class TestMarketSimulation(unittest.TestCase):
         market.simulate(5)
         self.assertEqual(len(market.agent_stats()), 4)
 
+    def test_simulation_with_numpy_book(self):
+        history = SQLiteHistory(db_path=":memory:")
+        market = Market(num_agents=8, history=history, book=NumpyOrderBook())
+        market.simulate(5)
+        self.assertEqual(len(market.agent_stats()), 8)
+        self.assertEqual(market.day_number, 5)
+
+    def test_simulation_with_continuous_book(self):
+        history = SQLiteHistory(db_path=":memory:")
+        market = Market(num_agents=8, history=history, book=ContinuousOrderBook())
+        market.simulate(5)
+        self.assertEqual(len(market.agent_stats()), 8)
+
+    def test_deferred_settlement_matches_immediate(self):
+        results = []
+        for deferred in (False, True):
+            random.seed(99)
+            history = SQLiteHistory(db_path=":memory:")
+            market = Market(
+                num_agents=12, history=history, deferred_settlement=deferred
+            )
+            market.simulate(3)
+            with history._lock:
+                cur = history._conn.execute(
+                    "SELECT day, good, qty, price, buyer, seller FROM trade_log ORDER BY id"
+                )
+                log = cur.fetchall()
+            results.append((market.agent_stats(), log))
+        self.assertGreater(len(results[0][1]), 0)
+        self.assertEqual(results[0], results[1])
+
+    def _parallel_run(self, executor):
+        random.seed(1234)
+        with executor:
+            market = Market(
+                num_agents=12,
+                history=SQLiteHistory(db_path=":memory:"),
+                executor=executor,
+            )
+            market.simulate(3)
+        return market.agent_stats(), market.history()
+
+    def test_parallel_matching_is_reproducible(self):
+        expected = self._parallel_run(ThreadPoolExecutor(max_workers=1))
+        self.assertEqual(
+            self._parallel_run(ThreadPoolExecutor(max_workers=4)), expected
+        )
+        self.assertEqual(
+            self._parallel_run(ProcessPoolExecutor(max_workers=2)), expected
+        )
+
     def test_daily_tax_causes_bankruptcy(self):
         market = Market(
             num_agents=1,
@@ -38,6 +94,53 @@ class TestMarketSimulation(unittest.TestCase):
         self.assertGreater(count, 0)
         self.assertEqual(first_day, 1)
 
+    def test_respawn_favours_jobs_for_unbalanced_goods(self):
+        sand = goods.by_name("Sand")
+        self.assertIn(jobs.by_name("Glass Maker"), jobs.consumers(sand))
+        self.assertIn(jobs.by_name("Sand Digger"), jobs.producers(sand))
+
+        random.seed(8)
+        market = Market(num_agents=0, history=MarketHistory())
+        balanced = Trades(volume=1, low=1, high=1, mean=1, supply=5, demand=5)
+        daily_sd = {good: balanced for good in goods.all()}
+
+        daily_sd[sand] = balanced._replace(supply=9)
+        recipes = market._choose_recipes(daily_sd, 500)
+        self.assertEqual(len(recipes), 500)
+        self.assertLessEqual(set(recipes), set(jobs.consumers(sand)))
+
+        daily_sd[sand] = balanced._replace(demand=9)
+        recipes = market._choose_recipes(daily_sd, 50)
+        self.assertLessEqual(set(recipes), set(jobs.producers(sand)))
+
+        daily_sd[sand] = balanced
+        self.assertGreater(len(set(market._choose_recipes(daily_sd, 500))), 1)
+
+    def test_perf_stats(self):
+        results = []
+        for deferred in (False, True):
+            random.seed(12)
+            market = Market(
+                num_agents=20,
+                history=MarketHistory(),
+                deferred_settlement=deferred,
+                instrument=True,
+            )
+            market.simulate(6)
+            results.append(market.perf_stats())
+
+        immediate, deferred = results
+        self.assertEqual(immediate["days"], 6)
+        self.assertEqual(
+            set(immediate["phases"]["resolve"]), {"total", "mean", "p50", "p90", "p99"}
+        )
+        # Both settlement modes see the same fills
+        self.assertEqual(immediate["goods"], deferred["goods"])
+        self.assertEqual(immediate["bankruptcies"], immediate["spawns"])
+        self.assertGreater(sum(g["fills"] for g in immediate["goods"].values()), 0)
+
+        self.assertIsNone(Market(num_agents=2, history=MarketHistory()).perf_stats())
+
 
 if __name__ == "__main__":
     unittest.main()
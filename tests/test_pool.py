@@ -0,0 +1,70 @@
+import unittest
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods, jobs
+from economy.agent import Agent
+from economy.market.market import Market
+from economy.market.history import MarketHistory
+from economy.pool import AgentPool
+
+
+class TestAgentPool(unittest.TestCase):
+    def setUp(self):
+        self.market = Market(num_agents=0, history=MarketHistory())
+        self.glass_maker = jobs.by_name("Glass Maker")
+        self.digger = jobs.by_name("Sand Digger")
+
+    def test_starting_state_matches_agent(self):
+        pool = AgentPool([self.glass_maker, self.digger], self.market)
+        for view, recipe in zip(pool.views, [self.glass_maker, self.digger]):
+            agent = Agent(recipe, self.market)
+            self.assertEqual(view.job, agent.job)
+            self.assertEqual(view.money, agent.money)
+            self.assertEqual(view._inventory._items, agent._inventory._items)
+            self.assertEqual(view.free_space(), agent.free_space())
+            self.assertEqual(view.trade_stats, {})
+
+    def test_production_matches_agent(self):
+        random.seed(5)
+        pool = AgentPool([self.glass_maker, self.digger], self.market)
+        pool.inventory[0, pool.good_id(goods.by_name("Blower"))] = 0
+        pool.do_production()
+        sand = goods.by_name("Sand")
+        # No blower means no glass; the digger fills its inventory with sand
+        self.assertEqual(pool.views[0].holding(sand), 5)
+        self.assertEqual(pool.views[1].holding(sand), Agent.INVENTORY_SIZE)
+
+    def test_bankrupt_agents_are_respawned_in_place(self):
+        market = Market(
+            num_agents=1,
+            history=MarketHistory(),
+            job_counts={"Glass Maker": 1},
+            initial_inv=0,
+            initial_money=2,
+            daily_tax=1,
+            pool=True,
+        )
+        first = market.agents[0]
+        market.simulate(2)
+        self.assertEqual(len(market.agents), 1)
+        self.assertIsNot(market.agents[0], first)
+        self.assertGreater(market.overview_stats()["average_lifespan"], 0)
+
+    def test_pool_market_simulation(self):
+        market = Market(num_agents=30, history=MarketHistory(), pool=True)
+        market.simulate(3)
+        stats = market.agent_stats()
+        self.assertEqual(len(stats), 30)
+        self.assertEqual(market.day_number, 3)
+        self.assertTrue(any(s["trade_totals"]["bought"] for s in stats))
+        self.assertTrue(np.all(market._pool.inventory >= 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
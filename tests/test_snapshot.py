@@ -0,0 +1,175 @@
+import copy
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy.market import snapshot
+from economy.market.checkpoints import Checkpoints
+from economy.market.history import MarketHistory
+from economy.market.market import Market
+
+
+class TestSnapshotFile(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        state = {
+            "name": "test",
+            "big": 2**63 + 1,
+            "nested": {"values": np.arange(12).reshape(3, 4), "empty": np.zeros(0)},
+            "list": [1, np.array([True, False])],
+        }
+        snapshot.write(self.path, state)
+        loaded = snapshot.read(self.path)
+
+        self.assertEqual(loaded["name"], "test")
+        self.assertEqual(loaded["big"], 2**63 + 1)
+        np.testing.assert_array_equal(
+            loaded["nested"]["values"], np.arange(12).reshape(3, 4)
+        )
+        self.assertEqual(loaded["nested"]["empty"].shape, (0,))
+        np.testing.assert_array_equal(loaded["list"][1], [True, False])
+        self.assertFalse(loaded["nested"]["values"].flags.writeable)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as fh:
+            fh.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            snapshot.read(self.path)
+
+    def test_strings(self):
+        names = ["Ann Smith", "Bo Li"]
+        self.assertEqual(snapshot.unpack_strings(snapshot.pack_strings(names)), names)
+        self.assertEqual(snapshot.unpack_strings(snapshot.pack_strings([])), [])
+
+
+class TestMarketSnapshot(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _state(self, market):
+        history = {good: list(trades) for good, trades in market.history().items()}
+        return market.agent_stats(), market.overview_stats(), history
+
+    def _check_continuation(self, pool):
+        random.seed(42)
+        market = Market(num_agents=20, history=MarketHistory(), pool=pool)
+        market.simulate(4)
+        market.save_snapshot(self.path)
+
+        loaded = Market.load_snapshot(self.path)
+        self.assertEqual(self._state(loaded), self._state(market))
+
+        # Both markets draw from the global generator, so give each the same
+        # starting point
+        seed_state = random.getstate()
+        market.simulate(4)
+        random.setstate(seed_state)
+        loaded.simulate(4)
+        self.assertEqual(self._state(loaded), self._state(market))
+        self.assertEqual(loaded.day_number, 8)
+
+    def test_agent_objects_continue_identically(self):
+        self._check_continuation(pool=False)
+
+    def test_pool_continues_identically(self):
+        self._check_continuation(pool=True)
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_state_at_reproduces_past_days(self):
+        random.seed(3)
+        checkpoints = Checkpoints(self.directory, every=3)
+        market = Market(num_agents=12, history=MarketHistory(), checkpoints=checkpoints)
+        # Agents keep updating the trade stats dicts they hand out
+        stats = [copy.deepcopy(market.agent_stats())]
+        for _ in range(7):
+            market.simulate(1)
+            stats.append(copy.deepcopy(market.agent_stats()))
+        self.assertEqual(checkpoints.days(), [0, 3, 6])
+
+        seed_state = random.getstate()
+        for day, expected in enumerate(stats):
+            past = market.state_at(day)
+            self.assertEqual(past.day_number, day)
+            self.assertEqual(past.agent_stats(), expected)
+        self.assertEqual(random.getstate(), seed_state)
+
+    def test_state_at_ignores_other_users_of_random(self):
+        for pool in (False, True):
+            shutil.rmtree(self.directory)
+            random.seed(3)
+            market = Market(
+                num_agents=12,
+                history=MarketHistory(),
+                checkpoints=Checkpoints(self.directory, every=3),
+                pool=pool,
+            )
+            stats = [copy.deepcopy(market.agent_stats())]
+            for _ in range(7):
+                # Anything else in the process, e.g. another market
+                random.random()
+                market.simulate(1)
+                stats.append(copy.deepcopy(market.agent_stats()))
+
+            for day, expected in enumerate(stats):
+                random.random()
+                self.assertEqual(market.state_at(day).agent_stats(), expected)
+
+    def test_days_are_listed_from_disk_once(self):
+        checkpoints = Checkpoints(self.directory, every=2)
+        market = Market(num_agents=4, history=MarketHistory(), checkpoints=checkpoints)
+        with mock.patch.object(
+            Path, "glob", autospec=True, side_effect=Path.glob
+        ) as glob:
+            market.simulate(5)
+            self.assertEqual(checkpoints.nearest(3), 2)
+        self.assertEqual(glob.call_count, 1)
+        self.assertEqual(checkpoints.days(), [0, 2, 4])
+        self.assertEqual(Checkpoints(self.directory).days(), [0, 2, 4])
+
+        checkpoints.clear()
+        self.assertEqual(checkpoints.days(), [])
+        self.assertEqual(Checkpoints(self.directory).days(), [])
+
+    def test_state_at_rejects_unknown_days(self):
+        market = Market(num_agents=2, history=MarketHistory())
+        with self.assertRaises(ValueError):
+            market.state_at(0)
+
+        market = Market(
+            num_agents=2,
+            history=MarketHistory(),
+            checkpoints=Checkpoints(self.directory),
+        )
+        market.simulate(1)
+        with self.assertRaises(ValueError):
+            market.state_at(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy.agent import Agent
+from economy.sweep import ResultsStore, grid, random_points, run_point, run_sweep
+
+
+class TestPoints(unittest.TestCase):
+    def test_grid(self):
+        points = grid(daily_tax=[0, 1], initial_money=[50, 100, 150])
+        self.assertEqual(len(points), 6)
+        self.assertIn({"daily_tax": 1, "initial_money": 150}, points)
+
+    def test_random_points(self):
+        points = random_points(
+            20, seed=1, initial_money=(50, 60), job_counts=[{"a": 1}, {"b": 2}]
+        )
+        self.assertEqual(
+            points,
+            random_points(
+                20, seed=1, initial_money=(50, 60), job_counts=[{"a": 1}, {"b": 2}]
+            ),
+        )
+        self.assertTrue(all(50 <= p["initial_money"] <= 60 for p in points))
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            grid(tax=[1])
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.directory, "results.jsonl"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_inventory_size_is_restored(self):
+        size = Agent.INVENTORY_SIZE
+        record = run_point({"inventory_size": 40}, 2, market_kwargs={"num_agents": 4})
+        self.assertEqual(Agent.INVENTORY_SIZE, size)
+        self.assertEqual(record["results"]["days_elapsed"], 2)
+
+    def test_rejected_settings_are_recorded(self):
+        record = run_point({"inventory_size": 1}, 2, market_kwargs={"num_agents": 4})
+        self.assertIn("error", record)
+
+    def test_sweep_resumes(self):
+        points = grid(daily_tax=[0, 1])
+        run_sweep(points[:1], 2, self.store, workers=0, num_agents=4)
+        throughput = run_sweep(points, 2, self.store, workers=0, num_agents=4)
+
+        self.assertEqual(sum(s["points"] for s in throughput.values()), 1)
+        stored = [record["point"] for record in self.store.records()]
+        self.assertEqual(stored, points)
+
+    def test_resume_after_a_torn_record(self):
+        points = grid(daily_tax=[0, 1, 2])
+        run_sweep(points[:2], 2, self.store, workers=0, num_agents=4)
+        with open(self.store.path, "rb+") as fh:
+            # Cut the second record off halfway
+            size = fh.seek(0, os.SEEK_END)
+            fh.truncate(size - 20)
+
+        store = ResultsStore(self.store.path)
+        self.assertEqual([r["point"] for r in store.records()], points[:1])
+        run_sweep(points[:2], 2, store, workers=0, num_agents=4)
+        run_sweep(points, 2, ResultsStore(self.store.path), workers=0, num_agents=4)
+
+        stored = [record["point"] for record in store.records()]
+        self.assertEqual(stored, points)
+        with open(self.store.path) as fh:
+            self.assertEqual(len(fh.readlines()), 3)
+
+    def test_sweep_on_process_pool(self):
+        points = grid(initial_money=[80, 120])
+        throughput = run_sweep(points, 2, self.store, workers=2, num_agents=4)
+        self.assertEqual(sum(s["days"] for s in throughput.values()), 4)
+        self.assertEqual(len(self.store.records()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
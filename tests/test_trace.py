@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from economy import goods
+from economy.market.history import MarketHistory
+from economy.market.market import Market
+from economy.trace import AGENT, FILL, HOLDING, TraceRecorder, load_trace
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def test_ring_buffer_keeps_latest_events(self):
+        trace = TraceRecorder(capacity=3)
+        for day in range(5):
+            trace.record(FILL, day)
+        self.assertEqual(len(trace), 3)
+        self.assertEqual(trace.recorded, 5)
+        self.assertEqual(trace.events()[:, 1].tolist(), [2, 3, 4])
+
+    def test_sampling(self):
+        trace = TraceRecorder(sample_rates={"fill": 0.25, "agent": 0}, seed=1)
+        kept = sum(trace.sample(FILL) for _ in range(4000))
+        self.assertAlmostEqual(kept / 4000, 0.25, delta=0.03)
+        self.assertFalse(trace.wants(AGENT))
+        with self.assertRaises(ValueError):
+            TraceRecorder(sample_rates={"trade": 1})
+
+    def test_agents_sharing_a_name_get_their_own_ids(self):
+        market = Market(num_agents=2, history=MarketHistory())
+        first, second = market.agents
+        second._name = first.name
+        trace = TraceRecorder()
+        trace.fill(1, goods.by_name("Sand"), first, second, 1, 10)
+        trace.agent(1, second)
+
+        first_id, second_id = trace.events()[:2, 3].tolist()
+        self.assertNotEqual(first_id, second_id)
+        self.assertEqual(trace.events()[0, 4], second_id)
+        self.assertEqual(trace.agent_id(first), first_id)
+
+
+class TestMarketTrace(unittest.TestCase):
+    def _run(self, trace, **kwargs):
+        random.seed(21)
+        market = Market(num_agents=12, history=MarketHistory(), trace=trace, **kwargs)
+        market.simulate(4)
+        return market
+
+    def test_tracing_does_not_change_the_run(self):
+        plain = self._run(None)
+        traced = self._run(TraceRecorder(sample_rates={"fill": 0.5}))
+        self.assertEqual(plain.agent_stats(), traced.agent_stats())
+
+    def test_fills_and_agents_are_recorded(self):
+        for kwargs in ({}, {"pool": True}):
+            trace = TraceRecorder()
+            market = self._run(trace, instrument=True, **kwargs)
+            events = trace.events()
+
+            fills = events[events[:, 0] == FILL]
+            stats = market.perf_stats()
+            expected = sum(good["fills"] for good in stats["goods"].values())
+            self.assertEqual(len(fills), expected)
+
+            # Every agent is recorded before and after the run
+            agents = events[events[:, 0] == AGENT]
+            self.assertEqual(len(agents), 24)
+            self.assertEqual(sorted(set(agents[:, 1].tolist())), [0, 4])
+            self.assertTrue((events[events[:, 0] == HOLDING][:, 5] > 0).all())
+
+    def test_dump_and_load(self):
+        trace = TraceRecorder()
+        self._run(trace)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            trace.dump(path)
+            loaded = load_trace(path)
+        finally:
+            os.remove(path)
+
+        np.testing.assert_array_equal(loaded["events"], trace.events())
+        self.assertEqual(loaded["goods"], [str(good) for good in goods.all()])
+        fill = loaded["events"][loaded["events"][:, 0] == FILL][0]
+        self.assertIsInstance(loaded["agents"][fill[3]], str)
+
+
+if __name__ == "__main__":
+    unittest.main()